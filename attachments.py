@@ -0,0 +1,130 @@
+"""Attest/eAU als Anhang: Handyfotos verkleinern, neu komprimieren und zu einem kompakten PDF packen.
+
+Die Arbeit läuft in einem eigenen Prozess (``ProcessPoolExecutor``), die GUI fragt das
+Ergebnis mit ``after()`` ab und bleibt bedienbar. Eingabedateien werden nie ganz in den
+Speicher gelesen: der Inhalts-Hash entsteht blockweise, und JPEGs werden über
+``Image.draft`` gleich in verkleinerter Auflösung dekodiert.
+
+Ergebnisse liegen unter ``ANHANG_CACHE_DIR/<hash>/`` – der Hash umfasst Inhalt aller
+Eingaben und die Einstellungen. Wer dasselbe Attest noch einmal schickt, bekommt das fertige
+PDF ohne erneute Verarbeitung. PDFs werden unverändert mitgeschickt. Pillow wird erst im
+Arbeitsprozess geladen; fehlt es, werden Bilder unverändert angehängt.
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+ANHANG_CACHE_DIR = ".krankomat_anhaenge"
+ANHANG_NAME = "Attest.pdf"
+# Längste Bildkante in Pixeln (ca. A4 mit 150 dpi) und JPEG-Qualität im PDF
+MAX_PX = 1754
+JPEG_QUALITY = 60
+PDF_DPI = 150
+CHUNK = 1 << 20
+BILD_ENDUNGEN = (".jpg", ".jpeg", ".png", ".heic", ".webp", ".tif", ".tiff", ".bmp", ".gif")
+
+_executor = None
+
+
+def file_digest(path, digest=None):
+    """SHA-256 einer Datei, blockweise gelesen."""
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest
+
+
+def cache_key(paths, max_px=MAX_PX, quality=JPEG_QUALITY):
+    digest = hashlib.sha256(f"{max_px}|{quality}|{PDF_DPI}".encode("ascii"))
+    for path in paths:
+        file_digest(path, digest)
+    return digest.hexdigest()[:32]
+
+
+def _is_image(path):
+    return path.lower().endswith(BILD_ENDUNGEN)
+
+
+def _load_page(path, max_px):
+    from PIL import Image, ImageOps
+    img = Image.open(path)
+    # JPEG: schon beim Dekodieren verkleinern (1/2, 1/4, 1/8) – spart Zeit und Speicher
+    img.draft("RGB", (max_px, max_px))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.thumbnail((max_px, max_px), Image.LANCZOS)
+    return img
+
+
+def build(paths, cache_dir=ANHANG_CACHE_DIR, max_px=MAX_PX, quality=JPEG_QUALITY):
+    """Erzeugt die Anhänge zu ``paths`` (läuft im Arbeitsprozess); liefert die fertigen Pfade.
+
+    Alle Bilder landen als Seiten in einem PDF, PDFs und andere Dateien bleiben, wie sie sind.
+    """
+    paths = [os.path.abspath(p) for p in paths]
+    bilder = [p for p in paths if _is_image(p)]
+    andere = [p for p in paths if not _is_image(p)]
+    if not bilder:
+        return andere
+    target_dir = os.path.join(cache_dir, cache_key(bilder, max_px, quality))
+    target = os.path.join(target_dir, ANHANG_NAME)
+    if os.path.exists(target):
+        return [os.path.abspath(target)] + andere
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        # Ohne Pillow lieber groß als gar nicht
+        return bilder + andere
+
+    os.makedirs(target_dir, exist_ok=True)
+    pages = [_load_page(p, max_px) for p in bilder]
+    # Erst in eine temporäre Datei, dann umbenennen: ein abgebrochener Lauf hinterlässt keinen halben Cache-Eintrag
+    fd, tmp = tempfile.mkstemp(suffix=".pdf", dir=target_dir)
+    os.close(fd)
+    try:
+        pages[0].save(tmp, "PDF", save_all=True, append_images=pages[1:], resolution=PDF_DPI, quality=quality)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return [os.path.abspath(target)] + andere
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=min(2, os.cpu_count() or 1))
+    return _executor
+
+
+def submit(paths):
+    """Startet die Aufbereitung im Hintergrundprozess; liefert ein ``Future`` mit den fertigen Pfaden."""
+    instrumentation.count("attachment_jobs")
+    return _pool().submit(build, list(paths))
+
+
+def describe(paths):
+    """Kurzbeschreibung für die GUI, z. B. ``Attest.pdf (182 KB)``."""
+    parts = []
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        parts.append(f"{os.path.basename(path)} ({max(1, round(size / 1024))} KB)")
+    return ", ".join(parts)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,235 @@
+"""Stapelbetrieb ohne Fenster: viele Meldungen aus einer CSV-Datei rendern.
+
+Eingabe ist eine Semikolon-CSV wie Empfaenger.txt, eine Meldung pro Zeile::
+
+    Vorname;Nachname;Matrikelnummer;DatumKrank;DatumGesund;Art;Attest;eAU;GKV;Unfall;Pruefungstag;Bemerkung;Empfaenger
+
+``Empfaenger`` enthält durch Komma getrennte Empfänger-IDs, Anreden oder E-Mail-Adressen
+aus Empfaenger.txt. Ja/Nein-Spalten akzeptieren ja/x/1/true. Ist ``Pruefungstag`` leer und
+gibt es einen Semesterkalender, wird die Spalte aus dem Kalender abgeleitet; die Tagesarten
+des Zeitraums stehen dann unter ``tagesarten`` in der Ausgabe. Ausgabe ist JSON Lines
+(eine Nachricht mit to, cc, subject und body pro Eingabezeile, in Eingabereihenfolge),
+die laufend geschrieben wird – der Speicherbedarf hängt nicht von der Dateigröße ab.
+
+Aufruf::
+
+    python main.py batch eingabe.csv -o ausgabe.jsonl [--workers 4] [--chunk-size 500]
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from empfaenger import RecipientDirectory
+from meldung import DEFAULT_SUBJECT, prepare_message
+from semesterkalender import PRUEFUNG, load_semesterkalender, parse_datum
+from template_engine import load_template
+
+TEMPLATE_BODY_PATH = "template.txt"
+TEMPLATE_SUBJECT_PATH = "template-subject.txt"
+EMPFAENGER_PATH = "Empfaenger.txt"
+USER_STUDIENGANG_PATH = "Mein_Studiengang.txt"
+SEMESTERKALENDER_PATH = "Semesterkalender.txt"
+
+# CSV-Spalte -> Feld der Meldung (siehe meldung.REPORT_DEFAULTS)
+COLUMNS = {
+    "Vorname": "vorname",
+    "Nachname": "nachname",
+    "Matrikelnummer": "matrikelnummer",
+    "Studiengang": "studiengang",
+    "DatumKrank": "datum",
+    "DatumGesund": "datum_gesund",
+    "Art": "art",
+    "Attest": "attest",
+    "eAU": "eau",
+    "GKV": "gkv",
+    "Unfall": "unfall",
+    "Pruefungstag": "pruefungstag",
+    "Bemerkung": "bemerkung",
+}
+FLAG_FIELDS = {"attest", "eau", "gkv", "unfall", "pruefungstag"}
+TRUE_VALUES = {"ja", "x", "1", "true", "wahr", "yes"}
+
+
+def parse_flag(text):
+    """Ja/Nein-Spalte: ``ja``, ``x``, ``1``, ``true`` … sind wahr, alles andere (auch leer) falsch."""
+    return text.strip().lower() in TRUE_VALUES
+
+
+def parse_row(row, studiengang=""):
+    """Macht aus einer CSV-Zeile (dict) eine Meldung und die Liste der Empfänger-Angaben."""
+    report = {"studiengang": studiengang}
+    for column, field in COLUMNS.items():
+        value = (row.get(column) or "").strip()
+        if field in FLAG_FIELDS:
+            report[field] = parse_flag(value)
+        elif value:
+            report[field] = value
+    tokens = [t.strip() for t in (row.get("Empfaenger") or "").split(",") if t.strip()]
+    return report, tokens
+
+
+def iter_rows(path):
+    """Liest die Eingabe zeilenweise: liefert ``(zeilennummer, csv_dict)``; ``-`` steht für stdin."""
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        reader = csv.DictReader(f, delimiter=";")
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class Renderer:
+    """Hält Vorlagen und Empfängerverzeichnis und rendert Meldungen nach den Regeln der GUI."""
+
+    def __init__(self, body_path=TEMPLATE_BODY_PATH, subject_path=TEMPLATE_SUBJECT_PATH,
+                 empfaenger_path=EMPFAENGER_PATH, studiengang=None, kalender_path=SEMESTERKALENDER_PATH):
+        self.template_body = load_template(body_path, default="")
+        self.template_subject = load_template(subject_path, default=DEFAULT_SUBJECT)
+        self.directory = RecipientDirectory.load(empfaenger_path)
+        self.kalender = load_semesterkalender(kalender_path) if kalender_path else None
+        if studiengang is None:
+            try:
+                with open(USER_STUDIENGANG_PATH, encoding="utf-8") as f:
+                    studiengang = f.read().strip()
+            except OSError:
+                studiengang = ""
+        self.studiengang = studiengang
+
+    def resolve(self, tokens):
+        """Empfänger-Angaben auflösen; liefert (Einträge in Dateireihenfolge, unbekannte Angaben)."""
+        ids, unknown = [], []
+        for token in tokens:
+            found = self.directory.lookup(token)
+            if found:
+                ids.extend(item.id for item in found)
+            else:
+                unknown.append(token)
+        return self.directory.resolve(dict.fromkeys(ids)), unknown
+
+    def tagesarten(self, report, pruefungstag_ableiten=True):
+        """Tagesarten des Krankheitszeitraums laut Semesterkalender (sortiert) oder None.
+
+        None auch, wenn der Zeitraum nicht im Kalender liegt. Mit ``pruefungstag_ableiten`` wird
+        ``report["pruefungstag"]`` aus dem Kalender gesetzt.
+        """
+        start = parse_datum(report.get("datum"))
+        if self.kalender is None or start is None:
+            return None
+        ende = parse_datum(report.get("datum_gesund"))
+        if not self.kalender.umfasst(start, ende):
+            return None
+        arten = self.kalender.arten_im_zeitraum(start, ende)
+        if pruefungstag_ableiten:
+            report["pruefungstag"] = PRUEFUNG in arten
+        return sorted(arten)
+
+    def render_report(self, report, tokens, pruefungstag_ableiten=True):
+        """Nachricht zu einer Meldung (dict wie ``meldung.REPORT_DEFAULTS``) und Empfänger-Angaben."""
+        items, unknown = self.resolve(tokens)
+        result = {}
+        tagesarten = self.tagesarten(report, pruefungstag_ableiten)
+        if tagesarten is not None:
+            result["tagesarten"] = tagesarten
+        result.update(prepare_message(report, items, self.template_body, self.template_subject))
+        if unknown:
+            result["unbekannt"] = unknown
+        return result
+
+    def render(self, line_no, row):
+        report, tokens = parse_row(row, self.studiengang)
+        result = {"zeile": line_no}
+        result.update(self.render_report(report, tokens, not (row.get("Pruefungstag") or "").strip()))
+        return result
+
+
+# Ein Renderer pro Worker-Prozess, einmal im Initializer angelegt
+_renderer = None
+
+
+def _init_worker(kwargs):
+    global _renderer
+    _renderer = Renderer(**kwargs)
+
+
+def _render_chunk(chunk):
+    lines = []
+    for line_no, row in chunk:
+        try:
+            result = _renderer.render(line_no, row)
+        except Exception as e:
+            result = {"zeile": line_no, "fehler": str(e)}
+        lines.append(json.dumps(result, ensure_ascii=False))
+    return lines
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_rows(rows, workers=None, chunk_size=500, renderer_kwargs=None):
+    """Rendert ``(zeilennummer, csv_dict)``-Paare und liefert JSON-Zeilen in Eingabereihenfolge.
+
+    Mit mehreren Workern verteilt ein Prozess-Pool die Arbeit; es sind höchstens
+    ``2 * workers`` Blöcke gleichzeitig unterwegs, damit der Speicher konstant bleibt.
+    """
+    renderer_kwargs = renderer_kwargs or {}
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1:
+        _init_worker(renderer_kwargs)
+        for chunk in _chunks(rows, chunk_size):
+            yield from _render_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(renderer_kwargs,)) as pool:
+        pending = deque()
+        for chunk in _chunks(rows, chunk_size):
+            pending.append(pool.submit(_render_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="krankomat batch", description="Meldungen aus einer CSV-Datei rendern.")
+    parser.add_argument("eingabe", help="Semikolon-CSV mit einer Meldung pro Zeile ('-' für stdin)")
+    parser.add_argument("-o", "--ausgabe", default="-", help="JSON-Lines-Datei ('-' für stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: CPU-Kerne)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Zeilen pro Arbeitspaket")
+    parser.add_argument("--template", default=TEMPLATE_BODY_PATH)
+    parser.add_argument("--subject", default=TEMPLATE_SUBJECT_PATH)
+    parser.add_argument("--empfaenger", default=EMPFAENGER_PATH)
+    parser.add_argument("--kalender", default=SEMESTERKALENDER_PATH, help="Semesterkalender ('' für keinen)")
+    args = parser.parse_args(argv)
+
+    renderer_kwargs = {"body_path": args.template, "subject_path": args.subject, "empfaenger_path": args.empfaenger,
+                       "kalender_path": args.kalender}
+    out = sys.stdout if args.ausgabe == "-" else open(args.ausgabe, "w", encoding="utf-8", buffering=1 << 16)
+    count = 0
+    try:
+        for line in render_rows(iter_rows(args.eingabe), args.workers, args.chunk_size, renderer_kwargs):
+            out.write(line)
+            out.write("\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{count} Meldungen gerendert.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
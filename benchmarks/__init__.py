@@ -0,0 +1 @@
+"""Benchmarks für die heißen Pfade des Krankomaten (siehe run.py)."""
@@ -0,0 +1,267 @@
+"""Misst die heißen Pfade auf synthetischen Daten und schreibt die Ergebnisse als JSON.
+
+Aufruf (aus dem Projektordner)::
+
+    python -m benchmarks.run --scales 10,1000,100000 -o bench_results.json
+    python -m benchmarks.run --compare alt.json neu.json
+
+Gemessen werden render_template, das Einlesen von Empfaenger.txt (inkl. parse_email_cell),
+die Stundenplan-Auswahl, der Kontextaufbau und – sofern ein (virtuelles) Display verfügbar
+ist – Start, Tastendruck und komplette Vorschau der GUI. Ohne DISPLAY wird Xvfb gestartet,
+falls installiert; sonst werden die GUI-Messungen als übersprungen vermerkt.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import REPO_DIR, create_dataset
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import meldung  # noqa: E402
+import stundenplan  # noqa: E402
+import template_engine  # noqa: E402
+from empfaenger import RecipientDirectory, RecipientSelection, parse_email_cell  # noqa: E402
+
+DEFAULT_SCALES = (10, 100, 1000, 10000, 100000)
+# Ein Werktag, damit der Stundenplan Treffer liefert
+BENCH_DATE = datetime.date(2026, 2, 2)
+# Krank bis Donnerstag der Folgewoche: alle Wochentage in A- und B-Woche
+BENCH_END = datetime.date(2026, 2, 12)
+
+
+def measure(fn, repeat=5, min_run=0.02):
+    """Zeit pro Aufruf: Schleifenzahl so wählen, dass ein Lauf mindestens ``min_run`` Sekunden dauert."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_run or loops >= 1_000_000:
+            break
+        loops *= 10
+    runs = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - start) / loops)
+    return {"loops": loops, "min_us": min(runs) * 1e6, "median_us": statistics.median(runs) * 1e6}
+
+
+def _reset_caches():
+    template_engine._file_cache.clear()
+    template_engine.compile_template.cache_clear()
+    stundenplan._cache.clear()
+
+
+def sample_report(items):
+    return {
+        "vorname": "Max", "nachname": "Mustermann", "matrikelnummer": "0123456", "studiengang": "EGov25",
+        "datum": BENCH_DATE.strftime("%d.%m.%Y"), "art": "Krankmeldung", "bemerkung": "vsl. 3 Tage",
+        "attest": True, "gkv": True,
+    }, items
+
+
+def bench_core(workdir, repeat):
+    """Heiße Pfade ohne GUI."""
+    results = {}
+    empfaenger_path = os.path.join(workdir, "Empfaenger.txt")
+    plan_path = os.path.join(workdir, "Stundenplan.txt")
+    body_path = os.path.join(workdir, "template.txt")
+
+    results["read_empfaenger"] = measure(lambda: RecipientDirectory.load(empfaenger_path), repeat)
+    directory = RecipientDirectory.load(empfaenger_path)
+
+    with open(empfaenger_path, encoding="utf-8") as f:
+        cells = [line.rsplit(";", 1)[-1].strip() for line in f][1:]
+    results["parse_email_cell"] = measure(lambda: [parse_email_cell(c) for c in cells], repeat)
+
+    with open(body_path, encoding="utf-8") as f:
+        body_source = f.read().strip()
+    results["compile_template"] = measure(lambda: template_engine.CompiledTemplate(body_source), repeat)
+    body = template_engine.compile_template(body_source)
+
+    report, items = sample_report(directory.items[:3])
+    ctx = meldung.build_context(report, items)
+    results["render_template"] = measure(lambda: template_engine.render_template(body, ctx), repeat)
+    results["gather_context"] = measure(lambda: meldung.build_context(report, items), repeat)
+
+    def stundenplan_index():
+        with open(plan_path, encoding="utf-8") as f:
+            plan = stundenplan.Stundenplan.parse(f)
+        return plan.index_directory(directory)
+
+    results["stundenplan_index"] = measure(stundenplan_index, repeat)
+    index = stundenplan_index()
+
+    def auto_select():
+        selection = RecipientSelection(directory)
+        for rid in stundenplan.ids_im_zeitraum(index, BENCH_DATE, BENCH_END):
+            selection.set(rid, True)
+        return selection.items()
+
+    results["auto_select"] = measure(auto_select, repeat)
+    return results
+
+
+@contextlib.contextmanager
+def virtual_display():
+    """Liefert True, wenn ein Display da ist (ggf. frisch gestartetes Xvfb), sonst False."""
+    if os.environ.get("DISPLAY") or sys.platform.startswith("win") or sys.platform == "darwin":
+        yield True
+        return
+    xvfb = shutil.which("Xvfb")
+    if not xvfb:
+        yield False
+        return
+    display = ":97"
+    proc = subprocess.Popen([xvfb, display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    os.environ["DISPLAY"] = display
+    try:
+        yield True
+    finally:
+        del os.environ["DISPLAY"]
+        proc.terminate()
+        proc.wait()
+
+
+def bench_gui(workdir, repeat):
+    """Start, Tastendruck und komplette Vorschau in der echten GUI."""
+    import main
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import snapshot
+
+        def cold():
+            if os.path.exists(snapshot.SNAPSHOT_PATH):
+                os.remove(snapshot.SNAPSHOT_PATH)
+            _reset_caches()
+            app = main.KrankmeldungApp()
+            app.update()
+            app.destroy()
+
+        def warm():
+            _reset_caches()
+            app = main.KrankmeldungApp()
+            app.update()
+            app.destroy()
+
+        results["gui_startup_cold"] = measure(cold, repeat=min(repeat, 3), min_run=0)
+        results["gui_startup_warm"] = measure(warm, repeat=min(repeat, 3), min_run=0)
+
+        app = main.KrankmeldungApp()
+        app.update()
+        app.entry_datum.delete(0, "end")
+        app.entry_datum.insert(0, BENCH_DATE.strftime("%d.%m.%Y"))
+        app._auto_select_by_stundenplan()
+        app.update()
+
+        state = {"n": 0}
+
+        def keystroke():
+            state["n"] += 1
+            app.entry_vorname.delete(0, "end")
+            app.entry_vorname.insert(0, f"Max{state['n'] % 10}")
+            app._schedule_preview("vorname")
+            app._preview.flush()
+
+        results["gui_keystroke"] = measure(keystroke, repeat)
+        results["gui_update_preview"] = measure(app._update_preview, repeat)
+        results["gui_gather_context"] = measure(app._gather_context, repeat)
+        def gui_auto_select():
+            app._auto_tage = None
+            app._auto_select_by_stundenplan()
+
+        results["gui_auto_select"] = measure(gui_auto_select, repeat)
+        app.destroy()
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales, repeat, gui):
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": [],
+        "skipped": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="krankomat-bench-") as tmp, virtual_display() as has_display:
+        for scale in scales:
+            workdir = create_dataset(os.path.join(tmp, str(scale)), scale)
+            timings = bench_core(workdir, repeat)
+            if gui and has_display:
+                timings.update(bench_gui(workdir, repeat))
+            elif gui:
+                report["skipped"].append({"scale": scale, "group": "gui", "grund": "kein Display und kein Xvfb"})
+            for name, values in timings.items():
+                report["results"].append(dict(name=name, scale=scale, **values))
+                print(f"{name:<22} {scale:>7}  {values['median_us']:>12.1f} µs", file=sys.stderr)
+    return report
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["name"], r["scale"]): r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    print(f"{'Messung':<22} {'Größe':>7} {'alt µs':>12} {'neu µs':>12} {'Faktor':>8}")
+    for r in new:
+        before = old.get((r["name"], r["scale"]))
+        if before is None:
+            continue
+        ratio = r["median_us"] / before["median_us"] if before["median_us"] else float("inf")
+        print(f"{r['name']:<22} {r['scale']:>7} {before['median_us']:>12.1f} {r['median_us']:>12.1f} {ratio:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Anzahl Empfänger je Datensatz, durch Komma getrennt")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-gui", action="store_true", help="GUI-Messungen auslassen")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("ALT", "NEU"), help="zwei Ergebnisdateien vergleichen")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    report = run(scales, args.repeat, gui=not args.no_gui)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    print(f"Ergebnisse geschrieben: {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
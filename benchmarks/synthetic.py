@@ -0,0 +1,68 @@
+"""Synthetische Eingabedateien in beliebiger Größe: Empfaenger.txt, Stundenplan.txt und Vorlagen.
+
+Die Daten sind deterministisch (fester Seed), damit Messungen zweier Commits vergleichbar sind.
+"""
+import os
+import random
+import shutil
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAECHER = [
+    "Grundlagen Informatik", "Projektmanagement", "Allgemeines Verwaltungsrecht", "Grundlagen E-Government",
+    "Sozialwissenschaftliche Schlüsselkompetenzen", "Öffentliche Finanzwirtschaft", "Datenschutzrecht",
+    "Prozessmanagement", "Statistik", "Staatsrecht", "Personalmanagement", "IT-Sicherheit",
+    "Verwaltungsinformatik", "Europarecht", "Kommunikation", "Organisationslehre",
+]
+WOCHENTAGE = ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag")
+
+
+def module_names(count, rng):
+    """Modulnamen wie im echten Verzeichnis: Fach, Kohorte und Kürzel."""
+    names = []
+    for i in range(count):
+        fach = rng.choice(FAECHER)
+        names.append(f"{fach} {i // len(FAECHER) + 1} (EGov{20 + i % 8})")
+    return names
+
+
+def write_empfaenger(path, count, seed=1):
+    rng = random.Random(seed)
+    module = module_names(max(1, count // 3), rng)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("Modul;Anrede;Email-Adresse\n")
+        for i in range(count):
+            modul = rng.choice(module)
+            anrede = rng.choice(["sehr geehrte Frau Prof. Dr.", "sehr geehrter Herr Prof. Dr.", "liebe Frau", "lieber Herr"])
+            # ein paar doppelte Anreden, wie bei echten Lehrenden mit mehreren Modulen
+            nachname = f"Muster{i if rng.random() > 0.1 else i // 2}"
+            email = f"{nachname.lower()}.{i}@haw-hamburg.de"
+            cell = f"[{email}](mailto:{email})" if i % 3 == 0 else email
+            f.write(f"{modul};{anrede} {nachname};{cell}\n")
+    return module
+
+
+def write_stundenplan(path, module, per_day, seed=2):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for tag in WOCHENTAGE:
+            # Modulname ohne Kohorte, wie Studierende ihn in den Stundenplan schreiben
+            auswahl = {m.split(" (")[0] for m in rng.sample(module, min(per_day, len(module)))}
+            f.write(f"{tag};{','.join(sorted(auswahl))}\n")
+            # ein Modul im Wechsel nur in A- bzw. B-Wochen
+            woche = rng.choice(("A", "B"))
+            f.write(f"{tag};{rng.choice(module).split(' (')[0]};{woche}\n")
+
+
+def create_dataset(directory, recipients, per_day=None):
+    """Legt einen vollständigen Datensatz für ``recipients`` Empfänger in ``directory`` an."""
+    os.makedirs(directory, exist_ok=True)
+    module = write_empfaenger(os.path.join(directory, "Empfaenger.txt"), recipients)
+    write_stundenplan(os.path.join(directory, "Stundenplan.txt"), module, per_day or max(3, min(40, recipients // 50)))
+    for name in ("template.txt", "template-subject.txt", "Mein_Vorname.txt", "Mein_Nachname.txt",
+                 "Meine_Matrikelnummer.txt", "Meine_E-Mail-Adresse.txt", "Mein_Studiengang.txt",
+                 "icon_save_Windows.png"):
+        src = os.path.join(REPO_DIR, name)
+        if os.path.exists(src):
+            shutil.copy(src, os.path.join(directory, name))
+    return directory
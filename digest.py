@@ -0,0 +1,163 @@
+"""Sammelmodus: viele Meldungen eines Tages zu einer Nachricht pro Empfänger zusammenfassen.
+
+Statt Studierende × Empfänger Einzelmails geht an jeden Empfänger (ZPD, Dozenten, ...) pro
+Tag genau eine Nachricht. Darin steht jede Meldung unverändert so, wie sie mit template.txt
+auch einzeln verschickt worden wäre. Empfänger mit derselben E-Mail-Adresse (z. B. eine
+Dozentin mit mehreren Modulen) werden zusammengelegt.
+
+Aufruf::
+
+    python main.py digest meldungen.csv -o sammel.jsonl
+    python main.py digest --db --tag 2026-02-02 -o sammel.mbox
+    python main.py digest meldungen.csv --senden          # über den eingestellten Versandweg
+"""
+import argparse
+import datetime
+import json
+import sys
+
+from batch import EMPFAENGER_PATH, SEMESTERKALENDER_PATH, TEMPLATE_BODY_PATH, TEMPLATE_SUBJECT_PATH, Renderer
+from meldung import build_context, greeting_for
+from semesterkalender import parse_datum
+from template_engine import compile_template, render_template
+
+DIGEST_SUBJECT = "Sammel-Krankmeldung {Datum}: {Anzahl} Meldung(en)"
+DIGEST_INTRO = ("für den {Datum} liegen {Anzahl} Krank- bzw. Gesundmeldung(en) für Sie vor. "
+                "Jede Meldung folgt unten im gewohnten Format.")
+# Trennzeile vor jeder einzelnen Meldung
+DIGEST_SEPARATOR = "──────── {Nummer}/{Anzahl}: {Vornamen} {Nachname} ({Matrikelnummer}) ────────"
+
+
+class Digest:
+    """Sammelt Meldungen und liefert je (Tag, Empfänger-Adresse) eine Nachricht."""
+
+    def __init__(self, renderer, sender=None):
+        self.renderer = renderer
+        self.sender = sender
+        self._subject = compile_template(DIGEST_SUBJECT)
+        self._intro = compile_template(DIGEST_INTRO)
+        self._separator = compile_template(DIGEST_SEPARATOR)
+        self._groups = {}  # (datum, email) -> [Empfänger, [(schlüssel, meldung)]]
+        self.reports = 0
+        self.single_messages = 0
+        self.unknown = []
+
+    def add(self, key, report, tokens, pruefungstag_ableiten=True):
+        """Nimmt eine Meldung auf (dict wie ``meldung.REPORT_DEFAULTS`` plus Empfänger-Angaben)."""
+        items, unknown = self.renderer.resolve(tokens)
+        if unknown:
+            self.unknown.append((key, unknown))
+        self.renderer.tagesarten(report, pruefungstag_ableiten)
+        self.reports += 1
+        # Mehrere Einträge mit derselben Adresse (z. B. zwei Module einer Dozentin) bekommen die Meldung einmal
+        adressen = {}
+        for item in items:
+            if item.email:
+                adressen.setdefault(item.email.lower(), item)
+        # Einzelversand: eine Mail pro Meldung, an alle Empfänger mit Adresse (TO + CC)
+        self.single_messages += len(adressen)
+        datum = report.get("datum") or ""
+        for email, item in adressen.items():
+            group = self._groups.setdefault((datum, email), [item, []])
+            group[1].append((key, report))
+
+    def messages(self):
+        """Eine Nachricht pro Tag und Empfänger, sortiert nach Datum und Adresse."""
+        def order(entry):
+            datum, email = entry
+            return parse_datum(datum) or datetime.date.min, email
+
+        for datum, email in sorted(self._groups, key=order):
+            item, entries = self._groups[(datum, email)]
+            yield self._message(datum, item, entries)
+
+    def _message(self, datum, item, entries):
+        anzahl = len(entries)
+        head = {"Datum": datum, "Anzahl": anzahl}
+        blocks = [greeting_for([item]) + ",", "", render_template(self._intro, head), ""]
+        for nummer, (_key, report) in enumerate(entries, start=1):
+            # Einzelmeldung wie gewohnt, die Anrede gilt diesem Empfänger
+            ctx = build_context(report, [item])
+            blocks.append(render_template(self._separator, dict(ctx, Nummer=nummer, Anzahl=anzahl)))
+            blocks.append(render_template(self.renderer.template_body, ctx))
+            blocks.append("")
+        message = {
+            "to": [item.email],
+            "cc": [],
+            "subject": render_template(self._subject, head),
+            "body": "\n".join(blocks).rstrip() + "\n",
+            "meldungen": [key for key, _report in entries],
+        }
+        if self.sender:
+            message["sender"] = self.sender
+        return message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="krankomat digest",
+                                     description="Eine Sammelnachricht pro Empfänger und Tag erzeugen.")
+    parser.add_argument("eingabe", nargs="?", help="Stapel-CSV (siehe batch.py); ohne Angabe: --db")
+    parser.add_argument("--db", action="store_true", help="Meldungen aus daten.db statt aus einer CSV")
+    parser.add_argument("--tag", type=datetime.date.fromisoformat, help="nur Meldungen dieses Tages (JJJJ-MM-TT)")
+    parser.add_argument("-o", "--ausgabe", default="-",
+                        help="JSON Lines ('-' für stdout), .mbox-Datei oder Ordner mit --format eml")
+    parser.add_argument("--format", choices=("jsonl", "mbox", "eml"), default=None)
+    parser.add_argument("--senden", action="store_true", help="über den eingestellten Versandweg verschicken")
+    parser.add_argument("--absender", default=None, help="Absender der Sammelnachrichten")
+    parser.add_argument("--template", default=TEMPLATE_BODY_PATH)
+    parser.add_argument("--subject", default=TEMPLATE_SUBJECT_PATH)
+    parser.add_argument("--empfaenger", default=EMPFAENGER_PATH)
+    parser.add_argument("--kalender", default=SEMESTERKALENDER_PATH, help="Semesterkalender ('' für keinen)")
+    args = parser.parse_args(argv)
+    if not args.eingabe and not args.db:
+        parser.error("Eingabe-CSV oder --db angeben.")
+
+    # storage und transport werden nur geladen, wenn die Quelle bzw. der Versand sie braucht
+    import mail_export
+    renderer = Renderer(body_path=args.template, subject_path=args.subject, empfaenger_path=args.empfaenger,
+                        kalender_path=args.kalender)
+    digest = Digest(renderer, sender=args.absender)
+    if args.db:
+        from storage import Storage
+        storage = Storage()
+        try:
+            for key, report, tokens, _extras in mail_export.iter_history(storage, args.tag, args.tag):
+                digest.add(key, report, tokens, pruefungstag_ableiten=False)
+        finally:
+            storage.close()
+    else:
+        for key, report, tokens, _extras in mail_export.iter_batch(args.eingabe, renderer.studiengang):
+            if args.tag is None or parse_datum(report.get("datum")) == args.tag:
+                digest.add(key, report, tokens, pruefungstag_ableiten="pruefungstag" not in report)
+
+    messages = list(digest.messages())
+    if args.senden:
+        from transport import get_transport
+        get_transport().send_many(messages)
+    else:
+        fmt = args.format or ("jsonl" if args.ausgabe == "-" or args.ausgabe.endswith(".jsonl") else None)
+        if fmt == "jsonl":
+            out = sys.stdout if args.ausgabe == "-" else open(args.ausgabe, "w", encoding="utf-8")
+            try:
+                for message in messages:
+                    out.write(json.dumps(message, ensure_ascii=False) + "\n")
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        else:
+            writer = mail_export.open_writer(args.ausgabe, fmt)
+            try:
+                for message in messages:
+                    writer.write("-".join(message["meldungen"][:1] + [message["to"][0]]), message)
+            finally:
+                writer.close()
+
+    for key, unknown in digest.unknown:
+        print(f"Meldung {key}: unbekannte Empfänger {', '.join(unknown)}", file=sys.stderr)
+    print(f"{digest.reports} Meldungen -> {len(messages)} Sammelnachrichten "
+          f"(statt {digest.single_messages} Einzelzustellungen).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
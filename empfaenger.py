@@ -0,0 +1,309 @@
+"""Empfängerverzeichnis aus Empfaenger.txt: feste IDs und Hash-Indizes statt linearer Suche."""
+import hashlib
+import os
+import sys
+
+
+# Spaltennamen in Empfaenger.txt; für die E-Mail gilt die erste vorhandene Spalte
+_SPALTEN = {"anrede": ("Anrede",), "modul": ("Modul",), "email": ("Email-Adresse", "Email")}
+
+
+def iter_empfaenger(path):
+    """Liest Empfaenger.txt zeilenweise und liefert je Zeile einen ``Recipient``.
+
+    Es wird immer nur die aktuelle Zeile gehalten (kein DictReader, keine Zwischenliste);
+    die E-Mail-Zelle wird dabei einmal normalisiert. Fehlt die Datei, kommt nichts.
+    """
+    if not os.path.exists(path):
+        return
+    import csv  # nur beim Kaltstart nötig, nicht beim Laden aus dem Start-Snapshot
+    with open(path, newline='', encoding="utf-8-sig") as csvfile:
+        reader = csv.reader(csvfile, delimiter=';')
+        header = [name.strip() for name in next(reader, [])]
+        spalten = {}
+        for feld, namen in _SPALTEN.items():
+            spalten[feld] = next((header.index(n) for n in namen if n in header), None)
+        i_anrede, i_modul, i_email = spalten["anrede"], spalten["modul"], spalten["email"]
+        for row in reader:
+            if not row:
+                continue
+            n = len(row)
+            anrede = row[i_anrede] if i_anrede is not None and i_anrede < n else ""
+            modul = row[i_modul] if i_modul is not None and i_modul < n else ""
+            email = row[i_email] if i_email is not None and i_email < n else ""
+            yield Recipient(anrede, modul, email)
+
+
+def read_empfaenger(path):
+    """Alle Empfänger als Liste (für Aufrufer, die mehrfach darüber laufen müssen)."""
+    return list(iter_empfaenger(path))
+
+
+def parse_email_cell(cell):
+    if not cell:
+        return ""
+    c = cell.strip()
+    if "](" in c and c.endswith(")"):
+        try:
+            left, right = c.split("](", 1)
+            inner = right.rstrip(")")
+            if inner.startswith("mailto:"):
+                return inner.split("mailto:",1)[1]
+            return inner
+        except Exception:
+            pass
+    if c.startswith("mailto:"):
+        return c.split("mailto:",1)[1]
+    return c
+
+
+def recipient_id(anrede, modul, email):
+    """Stabile ID aus dem Inhalt der Zeile – bleibt gleich, auch wenn sich die Reihenfolge in der Datei ändert."""
+    key = f"{modul.lower()}|{email.lower()}|{anrede}".encode("utf-8")
+    return hashlib.sha1(key).hexdigest()[:10]
+
+
+class Recipient:
+    """Ein Empfänger. ``__slots__`` statt dict: bei zehntausenden Zeilen ein Bruchteil des Speichers.
+
+    Anrede und Modul wiederholen sich oft und werden interniert; die E-Mail liegt
+    bereits normalisiert vor (ohne Markdown-Link und ``mailto:``).
+    """
+
+    __slots__ = ("id", "anrede", "modul", "email")
+
+    def __init__(self, anrede, modul, email, id=None):
+        self.anrede = sys.intern(anrede.strip())
+        self.modul = sys.intern(modul.strip())
+        self.email = parse_email_cell(email).strip()
+        self.id = id
+
+    def __repr__(self):
+        return f"Recipient({self.id!r}, {self.anrede!r}, {self.modul!r}, {self.email!r})"
+
+    def as_dict(self):
+        return {"id": self.id, "anrede": self.anrede, "modul": self.modul, "email": self.email}
+
+
+def _index_add(index, key, item):
+    # Meist gibt es genau einen Treffer je Schlüssel: dann den Eintrag selbst speichern, erst ab dem zweiten eine Liste
+    current = index.get(key)
+    if current is None:
+        index[key] = item
+    elif isinstance(current, list):
+        current.append(item)
+    else:
+        index[key] = [current, item]
+
+
+def _index_get(index, key):
+    found = index.get(key)
+    if found is None:
+        return []
+    return found if isinstance(found, list) else [found]
+
+
+class RecipientDirectory:
+    """Alle Empfänger in Dateireihenfolge, mit Indizes nach ID, Anrede, E-Mail und Modul.
+
+    Jeder Eintrag ist ein ``Recipient``; die Indizes verweisen auf dieselben Objekte.
+    Empfänger mit gleicher Anrede bleiben über ihre ID unterscheidbar.
+    """
+
+    def __init__(self, items=()):
+        self.items = []
+        self._by_id = {}
+        self._position = {}
+        self._by_anrede = {}
+        self._by_email = {}
+        self._by_modul = {}
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    def load(cls, path):
+        return cls(iter_empfaenger(path))
+
+    def add(self, item):
+        """Fügt einen Eintrag hinzu und vergibt bei Bedarf eine ID (doppelte Zeilen bekommen ein Suffix)."""
+        rid = item.id or recipient_id(item.anrede, item.modul, item.email)
+        base, n = rid, 1
+        while rid in self._by_id:
+            n += 1
+            rid = f"{base}-{n}"
+        item.id = rid
+        self._position[rid] = len(self.items)
+        self.items.append(item)
+        self._by_id[rid] = item
+        _index_add(self._by_anrede, item.anrede, item)
+        if item.email:
+            _index_add(self._by_email, item.email.lower(), item)
+        if item.modul:
+            _index_add(self._by_modul, sys.intern(item.modul.lower()), item)
+        return item
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, rid):
+        return rid in self._by_id
+
+    def get(self, rid, default=None):
+        return self._by_id.get(rid, default)
+
+    def position(self, rid):
+        return self._position[rid]
+
+    def by_anrede(self, anrede):
+        return _index_get(self._by_anrede, anrede.strip())
+
+    def by_email(self, email):
+        return _index_get(self._by_email, email.strip().lower())
+
+    def by_modul(self, modul):
+        return _index_get(self._by_modul, modul.strip().lower())
+
+    def module(self):
+        """Alle Modulnamen in Dateireihenfolge, ohne Doppelte (Groß-/Kleinschreibung wie beim ersten Eintrag)."""
+        return [_index_get(self._by_modul, key)[0].modul for key in self._by_modul]
+
+    def resolve(self, ids):
+        """Einträge zu den IDs in Dateireihenfolge; unbekannte IDs werden übersprungen."""
+        found = [rid for rid in ids if rid in self._by_id]
+        found.sort(key=self._position.__getitem__)
+        return [self._by_id[rid] for rid in found]
+
+    def lookup(self, token):
+        """Findet Einträge zu einer gespeicherten Angabe: ID, sonst Anrede, sonst E-Mail."""
+        item = self._by_id.get(token)
+        if item is not None:
+            return [item]
+        return self.by_anrede(token) or self.by_email(token)
+
+
+def split_to_cc(items):
+    """Erster ausgewählter Empfänger ist Hauptempfänger (TO), alle weiteren kommen in CC.
+
+    Jede Adresse kommt nur einmal vor (ohne Groß-/Kleinschreibung), auch wenn mehrere Einträge sie teilen.
+    """
+    emails = []
+    seen = set()
+    for g in items:
+        if g.email and g.email.lower() not in seen:
+            seen.add(g.email.lower())
+            emails.append(g.email)
+    to_list = emails[:1] if items and items[0].email else []
+    cc_list = emails[len(to_list):]
+    return to_list, cc_list
+
+
+class RecipientSelection:
+    """Ausgewählte Empfänger als einfache Menge von IDs (statt einer Tcl-Variable pro Zeile).
+
+    Listener werden bei jeder Änderung ohne Argumente aufgerufen. Innerhalb von ``batch()``
+    werden Änderungen gesammelt und am Ende mit genau einer Benachrichtigung gemeldet; die
+    Sammeloperationen (``update``, ``select_all``, ``select_modul``, ``replace`` ...) laufen
+    immer so und liefern die Menge der tatsächlich geänderten IDs.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._ids = set()
+        self._listeners = []
+        self._batch_depth = 0
+        self._batch_changed = False
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self):
+        if self._batch_depth:
+            self._batch_changed = True
+            return
+        for callback in self._listeners:
+            callback()
+
+    def batch(self):
+        """Kontextmanager: alle Änderungen darin ergeben höchstens eine Benachrichtigung."""
+        return _SelectionBatch(self)
+
+    def __contains__(self, rid):
+        return rid in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def set_directory(self, directory):
+        """Wechselt auf ein neu eingelesenes Verzeichnis; IDs, die es nicht mehr gibt, fallen weg."""
+        self.directory = directory
+        self._ids = {rid for rid in self._ids if rid in directory}
+        self._notify()
+
+    def set(self, rid, value):
+        if rid not in self.directory:
+            return
+        if value and rid not in self._ids:
+            self._ids.add(rid)
+        elif not value and rid in self._ids:
+            self._ids.discard(rid)
+        else:
+            return
+        self._notify()
+
+    def update(self, add=(), remove=()):
+        """Hakt ``add`` an und ``remove`` ab (unbekannte IDs werden übersprungen)."""
+        remove = self._ids.intersection(remove)
+        add = {rid for rid in add if rid not in self._ids and rid in self.directory}
+        if add or remove:
+            self._ids -= remove
+            self._ids |= add
+            self._notify()
+        return add | remove
+
+    def clear(self):
+        changed = set(self._ids)
+        if changed:
+            self._ids.clear()
+            self._notify()
+        return changed
+
+    def select_all(self):
+        return self.update(add=(item.id for item in self.directory))
+
+    def select_modul(self, modul, value=True):
+        """Alle Einträge eines Moduls an- bzw. abhaken."""
+        ids = [item.id for item in self.directory.by_modul(modul)]
+        return self.update(add=ids) if value else self.update(remove=ids)
+
+    def replace(self, ids):
+        """Ersetzt die Auswahl als Ganzes, z. B. durch eine gespeicherte Vorlage."""
+        ids = {rid for rid in ids if rid in self.directory}
+        return self.update(add=ids - self._ids, remove=self._ids - ids)
+
+    def ids(self):
+        """IDs der Auswahl in Dateireihenfolge."""
+        return [item.id for item in self.items()]
+
+    def items(self):
+        """Ausgewählte Einträge in Dateireihenfolge."""
+        return self.directory.resolve(self._ids)
+
+
+class _SelectionBatch:
+    def __init__(self, selection):
+        self.selection = selection
+
+    def __enter__(self):
+        self.selection._batch_depth += 1
+        return self.selection
+
+    def __exit__(self, exc_type, exc, tb):
+        selection = self.selection
+        selection._batch_depth -= 1
+        if selection._batch_depth == 0 and selection._batch_changed:
+            selection._batch_changed = False
+            selection._notify()
+        return False
@@ -0,0 +1,219 @@
+"""Messpunkte für GUI und Versand: Zeitspannen, Zähler und ein rollierendes Latenz-Histogramm.
+
+Eingeschaltet wird über die Umgebungsvariable ``KRANKOMAT_METRICS``:
+
+    KRANKOMAT_METRICS=jsonl:krankomat-metrics.jsonl   # jede Spanne als eigene JSON-Zeile
+    KRANKOMAT_METRICS=prom:krankomat.prom             # Prometheus-Textformat, regelmäßig überschrieben
+
+Ohne die Variable sind ``span`` und ``count`` leere Aufrufe und ``timed`` gibt die
+Funktion unverändert zurück – ausgeschaltet kostet die Instrumentierung praktisch nichts.
+"""
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# So viele letzte Messwerte je Spanne bleiben für Perzentile erhalten
+WINDOW = 1024
+# Zeitfenster für Raten (z. B. Vorschau-Renderings pro Sekunde)
+RATE_WINDOW_S = 10.0
+FLUSH_INTERVAL_S = 2.0
+
+
+class RollingHistogram:
+    """Feste Buckets über die ganze Laufzeit plus die letzten ``WINDOW`` Werte für Perzentile."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Metrics:
+    def __init__(self, fmt, path):
+        self.fmt = fmt
+        self.path = path
+        self.counters = {}      # (name, labels) -> Anzahl
+        self.histograms = {}    # name -> RollingHistogram
+        self.events = {}        # name -> Zeitstempel der letzten Ereignisse (für Raten)
+        self._lock = threading.RLock()
+        self._pending_lines = []
+        self._last_flush = time.monotonic()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        now = time.monotonic()
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.events.setdefault(name, deque(maxlen=WINDOW)).append(now)
+
+    def rate(self, name):
+        """Ereignisse pro Sekunde im letzten ``RATE_WINDOW_S``-Fenster."""
+        now = time.monotonic()
+        with self._lock:
+            stamps = self.events.get(name, ())
+            return sum(1 for t in stamps if now - t <= RATE_WINDOW_S) / RATE_WINDOW_S
+
+    def observe(self, name, seconds, error=None):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = RollingHistogram()
+            hist.observe(seconds)
+            if self.fmt == "jsonl":
+                event = {"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3)}
+                if error is not None:
+                    event["error"] = error
+                self._pending_lines.append(json.dumps(event, ensure_ascii=False))
+        if error is not None:
+            self.count(f"{name}_errors")
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL_S:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            try:
+                if self.fmt == "jsonl":
+                    lines, self._pending_lines = self._pending_lines, []
+                    if lines or self.counters:
+                        lines.append(json.dumps(self._summary(), ensure_ascii=False))
+                        with open(self.path, "a", encoding="utf-8") as f:
+                            f.write("\n".join(lines) + "\n")
+                else:
+                    tmp = self.path + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(self._prometheus_text())
+                    os.replace(tmp, self.path)
+            except OSError as e:
+                print("Messwerte konnten nicht geschrieben werden:", e)
+
+    def _summary(self):
+        """Zähler, Raten und aktuelle Latenz-Perzentile als eine JSON-Zeile."""
+        return {
+            "ts": time.time(),
+            "counters": {name + "".join(f"[{k}={v}]" for k, v in labels): value
+                         for (name, labels), value in sorted(self.counters.items())},
+            "per_second": {name: round(self.rate(name), 3) for name in sorted(self.events)},
+            "latency_ms": {name: {"count": hist.count,
+                                  "p50": round(hist.percentile(0.5) * 1000, 3),
+                                  "p95": round(hist.percentile(0.95) * 1000, 3),
+                                  "p99": round(hist.percentile(0.99) * 1000, 3)}
+                           for name, hist in sorted(self.histograms.items())},
+        }
+
+    def _prometheus_text(self):
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"krankomat_{name}_total{{{label_text}}} {value}" if label_text
+                         else f"krankomat_{name}_total {value}")
+        for name in sorted(self.events):
+            lines.append(f"krankomat_{name}_per_second {self.rate(name):.3f}")
+        for name, hist in sorted(self.histograms.items()):
+            metric = f"krankomat_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist.bucket_counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {hist.count}')
+            lines.append(f"{metric}_sum {hist.total:.6f}")
+            lines.append(f"{metric}_count {hist.count}")
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'{metric}_recent{{quantile="{q}"}} {hist.percentile(q):.6f}')
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _metrics.observe(self.name, time.perf_counter() - self.start,
+                         error=None if exc is None else f"{exc_type.__name__}: {exc}")
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _from_env():
+    spec = os.environ.get("KRANKOMAT_METRICS", "").strip()
+    if not spec:
+        return None
+    fmt, _, path = spec.partition(":")
+    if fmt not in ("jsonl", "prom"):
+        # nur ein Pfad angegeben: Format an der Endung erkennen
+        fmt, path = ("prom" if spec.endswith(".prom") else "jsonl"), spec
+    metrics = Metrics(fmt, path or f"krankomat-metrics.{fmt}")
+    atexit.register(metrics.flush)
+    return metrics
+
+
+_metrics = _from_env()
+enabled = _metrics is not None
+
+
+def span(name):
+    """Kontextmanager, der die Dauer des Blocks als Spanne ``name`` misst (Fehler werden mitgezählt)."""
+    return _Span(name) if _metrics is not None else _NULL_SPAN
+
+
+def count(name, value=1, **labels):
+    if _metrics is not None:
+        _metrics.count(name, value, **labels)
+
+
+def timed(name):
+    """Dekorator: misst jeden Aufruf als Spanne ``name``; ausgeschaltet bleibt die Funktion unverändert."""
+    def decorate(fn):
+        if _metrics is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def flush():
+    if _metrics is not None:
+        _metrics.flush()
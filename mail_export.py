@@ -0,0 +1,195 @@
+"""Fertige Nachrichten gesammelt als mbox oder als Ordner mit .eml-Dateien exportieren.
+
+Quelle ist entweder der Verlauf in daten.db oder eine Stapel-CSV (siehe batch.py). Die
+Meldungen werden einzeln gelesen, gerendert und gepuffert geschrieben; der Speicherbedarf
+hängt nicht von der Anzahl der Meldungen ab.
+
+Aufruf::
+
+    python main.py export -o archiv.mbox                     # Verlauf aus daten.db
+    python main.py export --batch meldungen.csv -o entwuerfe/ --format eml
+    python main.py export --von 2026-03-01 --bis 2026-07-31 -o sommersemester.mbox
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import time
+from email import quoprimime
+from email.header import Header
+from email.utils import format_datetime, formatdate, make_msgid
+
+from batch import (EMPFAENGER_PATH, SEMESTERKALENDER_PATH, TEMPLATE_BODY_PATH, TEMPLATE_SUBJECT_PATH, Renderer,
+                   iter_rows, parse_row)
+
+WRITE_BUFFER = 1 << 20
+# mboxrd: jede Zeile, die (nach beliebig vielen ">") mit "From " beginnt, bekommt ein weiteres ">"
+_FROM_LINE = re.compile(rb"^(>*From )", re.MULTILINE)
+_FLAG_TRUE = {"ja", "x", "1", "true"}
+
+
+def report_from_row(row):
+    """Gespeicherte Zeile aus daten.db -> (Meldung, Empfänger-Angaben)."""
+    report = {}
+    for field in ("vorname", "nachname", "datum", "matrikelnummer", "datum_gesund", "art", "bemerkung",
+                  "studiengang"):
+        if row[field]:
+            report[field] = row[field]
+    for field in ("attest", "eau", "unfall", "pruefungstag"):
+        report[field] = str(row[field] or "").strip().lower() in _FLAG_TRUE
+    tokens = [t for t in (row["empfaenger_list"] or "").split(",") if t.strip()]
+    return report, tokens
+
+
+def _message_date(erstellt_am):
+    try:
+        stamp = datetime.datetime.fromisoformat(erstellt_am)
+    except (TypeError, ValueError):
+        return None
+    return format_datetime(stamp.astimezone())
+
+
+def iter_history(storage, von=None, bis=None):
+    """Meldungen aus daten.db in Speicherreihenfolge: ``(schlüssel, meldung, angaben, extras)``."""
+    for row in storage.iter_reports(von, bis):
+        report, tokens = report_from_row(row)
+        extras = {"sender": row["email"] or None, "date": _message_date(row["erstellt_am"]),
+                  "message_id": f"<krankmeldung-{row['id']}@krankomat.local>"}
+        yield f"{row['id']:06d}", report, tokens, extras
+
+
+def iter_batch(path, studiengang=""):
+    """Meldungen aus einer Stapel-CSV: ``(schlüssel, meldung, angaben, extras)``."""
+    for line_no, row in iter_rows(path):
+        report, tokens = parse_row(row, studiengang)
+        if not (row.get("Pruefungstag") or "").strip():
+            # leer: aus dem Semesterkalender ableiten lassen (wie im Stapelbetrieb)
+            del report["pruefungstag"]
+        yield f"{line_no:06d}", report, tokens, {}
+
+
+def _header(name, value, linesep):
+    if value.isascii():
+        if len(name) + len(value) + 2 <= 78 or ", " not in value:
+            return f"{name}: {value}"
+        # lange Adresslisten an den Kommas umbrechen
+        return f"{name}: " + f",{linesep} ".join(value.split(", "))
+    return f"{name}: " + Header(value, "utf-8", header_name=name).encode(linesep=linesep)
+
+
+def message_bytes(message, linesep="\n"):
+    """Nachrichten-dict -> RFC-5322-Bytes (text/plain, UTF-8, quoted-printable).
+
+    Inhaltlich wie ``transport.build_email``, aber direkt zusammengesetzt: für den Massenexport
+    ist der Umweg über ``EmailMessage`` rund zehnmal langsamer.
+    """
+    headers = []
+    if message.get("sender"):
+        headers.append(("From", message["sender"]))
+    if message.get("to"):
+        headers.append(("To", ", ".join(message["to"])))
+    if message.get("cc"):
+        headers.append(("Cc", ", ".join(message["cc"])))
+    headers.append(("Subject", message.get("subject", "")))
+    headers.append(("Date", message.get("date") or formatdate(localtime=True)))
+    headers.append(("Message-ID", message.get("message_id") or make_msgid(domain="krankomat.local")))
+    if message.get("unbekannt"):
+        headers.append(("X-Krankomat-Unbekannt", ", ".join(message["unbekannt"])))
+    lines = [_header(name, value, linesep) for name, value in headers]
+    lines += ['Content-Type: text/plain; charset="utf-8"', "Content-Transfer-Encoding: quoted-printable",
+              "MIME-Version: 1.0", ""]
+    # quoprimime kodiert Zeichen bis 0xFF: erst nach UTF-8, dann byteweise als latin-1 übergeben
+    body = quoprimime.body_encode(message.get("body", "").encode("utf-8").decode("latin-1"), eol=linesep)
+    return (linesep.join(lines) + linesep + body + linesep).encode("ascii")
+
+
+class MboxWriter:
+    """Hängt Nachrichten im mboxrd-Format an eine Datei an."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab", buffering=WRITE_BUFFER)
+
+    def write(self, key, message):
+        envelope = time.asctime(time.gmtime())
+        self._file.write(f"From krankomat@localhost {envelope}\n".encode("ascii"))
+        self._file.write(_FROM_LINE.sub(rb">\1", message_bytes(message, "\n")))
+        self._file.write(b"\n")
+
+    def close(self):
+        self._file.close()
+
+
+class EmlDirWriter:
+    """Schreibt jede Nachricht als eigene .eml-Datei (CRLF, wie von Mailprogrammen erwartet)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, key, message):
+        path = os.path.join(self.directory, f"{key}.eml")
+        with open(path, "wb") as f:
+            f.write(message_bytes(message, "\r\n"))
+
+    def close(self):
+        pass
+
+
+def open_writer(output, fmt=None):
+    """``mbox`` für eine Datei, ``eml`` für einen Ordner; ohne Angabe an der Endung erkannt."""
+    if fmt is None:
+        fmt = "mbox" if output.lower().endswith(".mbox") or os.path.isfile(output) else "eml"
+    return MboxWriter(output) if fmt == "mbox" else EmlDirWriter(output)
+
+
+def export(source, renderer, writer):
+    """Rendert alle Meldungen aus ``source`` und schreibt sie; liefert die Anzahl."""
+    count = 0
+    for key, report, tokens, extras in source:
+        message = renderer.render_report(report, tokens, pruefungstag_ableiten="pruefungstag" not in report)
+        message.update((k, v) for k, v in extras.items() if v)
+        writer.write(key, message)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="krankomat export", description="Nachrichten als mbox/.eml exportieren.")
+    parser.add_argument("-o", "--ausgabe", required=True, help="mbox-Datei oder Ordner für .eml-Dateien")
+    parser.add_argument("--format", choices=("mbox", "eml"), default=None)
+    parser.add_argument("--batch", metavar="CSV", help="Stapel-CSV statt Verlauf aus daten.db")
+    parser.add_argument("--db", default=None, help="Datenbank (Standard: daten.db)")
+    parser.add_argument("--von", type=datetime.date.fromisoformat, help="nur Meldungen ab Datum (JJJJ-MM-TT)")
+    parser.add_argument("--bis", type=datetime.date.fromisoformat, help="nur Meldungen bis Datum (JJJJ-MM-TT)")
+    parser.add_argument("--template", default=TEMPLATE_BODY_PATH)
+    parser.add_argument("--subject", default=TEMPLATE_SUBJECT_PATH)
+    parser.add_argument("--empfaenger", default=EMPFAENGER_PATH)
+    parser.add_argument("--kalender", default=SEMESTERKALENDER_PATH, help="Semesterkalender ('' für keinen)")
+    args = parser.parse_args(argv)
+
+    renderer = Renderer(body_path=args.template, subject_path=args.subject, empfaenger_path=args.empfaenger,
+                        kalender_path=args.kalender)
+    storage = None
+    if args.batch:
+        source = iter_batch(args.batch, renderer.studiengang)
+    else:
+        from storage import DB_PATH, Storage
+        storage = Storage(args.db or DB_PATH)
+        source = iter_history(storage, args.von, args.bis)
+
+    writer = open_writer(args.ausgabe, args.format)
+    start = time.perf_counter()
+    try:
+        count = export(source, renderer, writer)
+    finally:
+        writer.close()
+        if storage is not None:
+            storage.close()
+    print(f"{count} Nachrichten exportiert nach {args.ausgabe} ({time.perf_counter() - start:.1f} s).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
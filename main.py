@@ -1,11 +1,25 @@
 import tkinter as tk # für GUI
 from tkinter import ttk, messagebox, scrolledtext, filedialog # für GUI bestimmte Funktionen
-from PIL import Image, ImageTk # für Bilder und Icons
 import datetime
-import win32com.client as win32
 import os
-import csv
-import sqlite3
+import sys
+import threading
+# Schwere Module (sqlite3, smtplib/ssl, win32com) werden erst bei Bedarf geladen:
+# storage in KrankmeldungApp.storage, transport in send_mail/create_outlook_mail, outbox in _outbox_worker.
+from template_engine import load_template, render_template
+import attachments
+from empfaenger import RecipientDirectory, RecipientSelection, parse_email_cell, split_to_cc
+from stundenplan import ids_im_zeitraum, load_stundenplan, tage_im_zeitraum
+import semesterkalender
+from profiles import Profile, ProfileIndex, load_profiles
+from snapshot import load_startup_state
+from suche import RecipientSearch
+from textsync import TextSync
+from watcher import FileWatcher
+import instrumentation
+from instrumentation import timed
+import meldung
+from meldung import DEFAULT_SUBJECT, SUBJECT_KEYS, generate_anreden
 
 # ----------------- Dateipfade / User-Config Dateien -----------------
 TEMPLATE_BODY_PATH = "template.txt"
@@ -17,6 +31,35 @@ USER_EMAIL_PATH = "Meine_E-Mail-Adresse.txt"
 USER_MATRIKEL_PATH = "Meine_Matrikelnummer.txt"
 USER_STUDIENGANG_PATH = "Mein_Studiengang.txt"
 USER_STUNDENPLAN_PATH = "Stundenplan.txt"
+USER_SEMESTERKALENDER_PATH = "Semesterkalender.txt"
+
+# Nutzer-Dateien -> Feld (self.user_<feld>)
+USER_FILES = {
+    USER_VORNAME_PATH: "vorname",
+    USER_NACHNAME_PATH: "nachname",
+    USER_MATRIKEL_PATH: "matrikel",
+    USER_EMAIL_PATH: "email",
+    USER_STUDIENGANG_PATH: "studiengang",
+}
+# So oft holt die GUI Meldungen der Dateiüberwachung ab
+FILE_POLL_MS = 250
+# So oft holt die GUI Meldungen des Postausgangs ab (siehe outbox.py)
+OUTBOX_POLL_MS = 1000
+
+# Alles, was beim Start eingelesen wird (siehe snapshot.py)
+STARTUP_PATHS = {
+    "user": {
+        "vorname": USER_VORNAME_PATH,
+        "nachname": USER_NACHNAME_PATH,
+        "matrikel": USER_MATRIKEL_PATH,
+        "email": USER_EMAIL_PATH,
+        "studiengang": USER_STUDIENGANG_PATH,
+    },
+    "body": TEMPLATE_BODY_PATH,
+    "subject": TEMPLATE_SUBJECT_PATH,
+    "empfaenger": EMPFAENGER_PATH,
+    "stundenplan": USER_STUNDENPLAN_PATH,
+}
 
 
 def load_file_text(path, default=None):
@@ -36,53 +79,6 @@ def load_email_from_berufspraxis_txt():
                 return parse_email_cell(email_raw)
     return ""
 
-def read_empfaenger(path):
-    rows = []
-    if not os.path.exists(path):
-        return rows
-    with open(path, newline='', encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=';')
-        for r in reader:
-            rows.append(r)
-    return rows
-
-def parse_email_cell(cell):
-    if not cell:
-        return ""
-    c = cell.strip()
-    if "](" in c and c.endswith(")"):
-        try:
-            left, right = c.split("](", 1)
-            inner = right.rstrip(")")
-            if inner.startswith("mailto:"):
-                return inner.split("mailto:",1)[1]
-            return inner
-        except Exception:
-            pass
-    if c.startswith("mailto:"):
-        return c.split("mailto:",1)[1]
-    return c
-
-def render_template(template, context):
-    try:
-        return template.format(**context)
-    except Exception as e:
-        t = template
-        for k,v in context.items():
-            t = t.replace("{" + k + "}", str(v))
-        return t
-
-def generate_anreden(anrede_list):
-    """Erzeugt die Begrüßungszeilen genau aus der Anrede-Spalte, fügt Komma an falls nötig."""
-    lines = []
-    for a in anrede_list:
-        line = a.strip()
-        # if not line.endswith(","):
-        #     line += ","
-        lines.append(line)
-    return ",\n".join(lines)
-
-
 class ToolTip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -109,42 +105,289 @@ class ToolTip:
             tw.destroy()
 
 
+class VirtualCheckList(ttk.Frame):
+    """Checkbox-Liste, die nur für die sichtbaren Zeilen Widgets anlegt und sie beim Scrollen wiederverwendet.
+
+    ``rows`` ist eine Liste von ``(id, label)``; der Haken-Zustand kommt aus ``is_checked(id)``
+    und Klicks werden über ``on_toggle(id, value)`` gemeldet.
+    """
+
+    def __init__(self, master, rows, is_checked, on_toggle, **kwargs):
+        super().__init__(master, **kwargs)
+        self.rows = rows
+        self.is_checked = is_checked
+        self.on_toggle = on_toggle
+        self.top_index = 0
+        self._slots = []  # (Checkbutton, BooleanVar) – nur so viele wie sichtbar
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.body = ttk.Frame(self)
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        # Zeilenhöhe einmal an einer Muster-Checkbox messen
+        probe = ttk.Checkbutton(self.body, text="Xg")
+        self.row_height = probe.winfo_reqheight() + 4
+        probe.destroy()
+
+        self.body.bind("<Configure>", lambda e: self._layout())
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        widget.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        widget.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def _visible_count(self):
+        return max(1, self.body.winfo_height() // self.row_height + 1)
+
+    def _layout(self):
+        # Pool an die sichtbare Höhe anpassen; überzählige Slots werden nur versteckt
+        while len(self._slots) < self._visible_count():
+            i = len(self._slots)
+            var = tk.BooleanVar()
+            cb = ttk.Checkbutton(self.body, variable=var, command=lambda i=i: self._on_slot_toggle(i))
+            self._bind_wheel(cb)
+            self._slots.append((cb, var))
+        self._clamp_top()
+        self.refresh()
+
+    def _clamp_top(self):
+        self.top_index = max(0, min(self.top_index, len(self.rows) - self._visible_count() + 1))
+
+    def _on_slot_toggle(self, i):
+        row = self.top_index + i
+        if row < len(self.rows):
+            self.on_toggle(self.rows[row][0], self._slots[i][1].get())
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.top_index = 0
+        self.refresh()
+
+    def refresh(self):
+        """Beschriftung und Haken der sichtbaren Slots aus dem Datenmodell übernehmen."""
+        visible = self._visible_count()
+        for i, (cb, var) in enumerate(self._slots):
+            row = self.top_index + i
+            if i < visible and row < len(self.rows):
+                rid, label = self.rows[row]
+                cb.configure(text=label)
+                var.set(self.is_checked(rid))
+                cb.place(x=0, y=i * self.row_height, relwidth=1, height=self.row_height)
+            else:
+                cb.place_forget()
+        total = len(self.rows) or 1
+        self.scrollbar.set(self.top_index / total, min(1.0, (self.top_index + visible - 1) / total))
+
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.top_index = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = self._visible_count() - 1 if args[2] == "pages" else 1
+            self.top_index += int(args[1]) * max(1, step)
+        self._clamp_top()
+        self.refresh()
+
+
+class AutocompletePopup:
+    """Vorschlagsliste unter einem Eingabefeld; ``suggest(text)`` liefert ``[(label, wert)]``.
+
+    Pfeil runter wechselt in die Liste, Enter oder Klick übernimmt, Escape schließt.
+    Gewählt wird über ``on_pick(wert)``.
+    """
+
+    def __init__(self, entry, suggest, on_pick, max_rows=8):
+        self.entry = entry
+        self.suggest = suggest
+        self.on_pick = on_pick
+        self.max_rows = max_rows
+        self._win = None
+        self._listbox = None
+        self._values = []
+        entry.bind("<KeyRelease>", self._on_key, add="+")
+        entry.bind("<Down>", self._focus_list, add="+")
+        entry.bind("<Escape>", lambda e: self.hide(), add="+")
+        # verzögert, damit ein Klick in die Liste noch ankommt
+        entry.bind("<FocusOut>", lambda e: entry.after(150, self._hide_unless_focused), add="+")
+
+    def _on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab", "Shift_L", "Shift_R"):
+            return
+        matches = self.suggest(self.entry.get())
+        if matches:
+            self._show(matches)
+        else:
+            self.hide()
+
+    def _ensure_window(self):
+        if self._win is not None:
+            return
+        self._win = tk.Toplevel(self.entry)
+        self._win.overrideredirect(True)
+        self._win.withdraw()
+        self._listbox = tk.Listbox(self._win, activestyle="dotbox", exportselection=False)
+        self._listbox.pack(fill="both", expand=True)
+        self._listbox.bind("<ButtonRelease-1>", lambda e: self._pick())
+        self._listbox.bind("<Return>", lambda e: self._pick())
+        self._listbox.bind("<Escape>", lambda e: self.hide())
+        self._listbox.bind("<FocusOut>", lambda e: self.entry.after(150, self._hide_unless_focused))
+
+    def _show(self, matches):
+        self._ensure_window()
+        self._values = [value for _, value in matches]
+        self._listbox.delete(0, tk.END)
+        for label, _ in matches:
+            self._listbox.insert(tk.END, label)
+        self._listbox.configure(height=min(len(matches), self.max_rows))
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self._win.geometry(f"+{x}+{y}")
+        self._win.deiconify()
+        self._win.lift()
+
+    def hide(self):
+        if self._win is not None:
+            self._win.withdraw()
+
+    def _hide_unless_focused(self):
+        if self._win is not None and self.entry.focus_get() not in (self.entry, self._listbox):
+            self.hide()
+
+    def _focus_list(self, event=None):
+        if self._win is None or not self._values or self._win.state() == "withdrawn":
+            return
+        self._listbox.focus_set()
+        self._listbox.selection_clear(0, tk.END)
+        self._listbox.selection_set(0)
+        self._listbox.activate(0)
+
+    def _pick(self):
+        selection = self._listbox.curselection()
+        if not selection:
+            return
+        value = self._values[selection[0]]
+        self.hide()
+        self.entry.focus_set()
+        self.on_pick(value)
+
+
+class PreviewEngine:
+    """Bündelt Eingabe-Events und rendert pro Idle-Zyklus nur die betroffenen Teile der Vorschau neu."""
+
+    def __init__(self, widget, sources, sections):
+        self.widget = widget        # liefert after_idle/after_cancel
+        self.sources = sources      # Eingabe -> Funktion, die ihren Teil des Kontexts liefert
+        self.sections = sections    # Abschnitt -> (Menge abhängiger Eingaben, Render-Funktion(ctx))
+        self.context = {}
+        self._dirty = set()
+        self._pending = None
+        self._update_used()
+
+    def _update_used(self):
+        # Eingaben, die kein Abschnitt braucht, werden gar nicht erst eingelesen
+        self._used = set().union(*(deps for deps, render in self.sections.values()))
+
+    def set_section(self, name, deps, render):
+        """Setzt (oder ersetzt) einen Abschnitt, z. B. wenn eine neue Vorlage andere Platzhalter nutzt."""
+        self.sections[name] = (set(deps), render)
+        self._update_used()
+
+    def mark_dirty(self, *inputs):
+        """Markiert Eingaben als geändert (ohne Argumente: alle) und plant genau einen Render-Lauf ein."""
+        self._dirty.update(inputs or self.sources)
+        if self._pending is None:
+            self._pending = self.widget.after_idle(self.flush)
+
+    def flush(self):
+        """Rendert sofort alle Abschnitte, deren Eingaben sich seit dem letzten Lauf geändert haben."""
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+        dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        instrumentation.count("preview_renders")
+        with instrumentation.span("preview_render"):
+            for name in dirty & self._used:
+                self.context.update(self.sources[name]())
+            for deps, render in self.sections.values():
+                if deps & dirty:
+                    render(self.context)
+
+
 class KrankmeldungApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Krankomat – Bereitet eine E-Mail für dich vor, damit du dich schnell krank- oder gesundmelden kannst beim ZAF, HAW-Prüfungsamt und Dozenten.")
         self.geometry("1150x800") # initiale Fenstergröße beim Öffnen
 
-        # User Config laden
-        self.user_vorname = load_file_text(USER_VORNAME_PATH, default="")
-        self.user_nachname = load_file_text(USER_NACHNAME_PATH, default="")
-        self.user_matrikel = load_file_text(USER_MATRIKEL_PATH, default="")
-        self.user_email = load_file_text(USER_EMAIL_PATH, default="")
-        self.user_studiengang = load_file_text(USER_STUDIENGANG_PATH, default="")
+        # User Config, Vorlagen, Empfänger und Stundenplan laden – beim Warmstart aus dem Snapshot
+        state = load_startup_state(STARTUP_PATHS, DEFAULT_SUBJECT)
+        self.user_vorname = state.user["vorname"]
+        self.user_nachname = state.user["nachname"]
+        self.user_matrikel = state.user["matrikel"]
+        self.user_email = state.user["email"]
+        self.user_studiengang = state.user["studiengang"]
 
-        self.template_body = load_file_text(TEMPLATE_BODY_PATH, default="")
-        self.template_subject = load_file_text(TEMPLATE_SUBJECT_PATH, default="Krankmeldung EGOV 2025 {Datum} [{Vornamen} {Nachname}, {Matrikelnummer}]")
+        self.template_body = state.template_body
+        self.template_subject = state.template_subject
 
         # ZPD als Standard-Adressat:
         # self.var_zpd = tk.BooleanVar(value=True)
         # self.var_pruef = tk.BooleanVar(value=False)
 
-        emp_rows = read_empfaenger(EMPFAENGER_PATH)
+        # daten.db: eine Verbindung für die ganze Sitzung, geöffnet beim ersten Zugriff
+        self._storage = None
+        # Postausgang für den Sofortversand, Arbeits-Thread startet beim ersten Bedarf
+        self._outbox = None
+        # Profile für die Autovervollständigung, geladen nach dem ersten Zeichnen
+        self.profiles = None
 
         # Platzhalter-Variable "empfaenger" ersetzen mit "Anrede" aus Empfaenger.txt
-        self.greeting_items = []
-        for r in emp_rows:
-            anrede = (r.get("Anrede") or "").strip()
-            modul = (r.get("Modul") or "").strip()
-            email_raw = (r.get("Email-Adresse") or r.get("Email") or "").strip()
-            email = parse_email_cell(email_raw)
-            self.greeting_items.append({
-                "anrede": anrede,
-                "modul": modul,
-                "email": email
-            })
+        # Verzeichnis einmal aufbauen; Auswahl, Vorschau und Versand lösen über die IDs auf.
+        self.directory = state.directory
+        self._stundenplan_cache = (state.stundenplan, state.stundenplan_index) if state.stundenplan is not None else None
+        self.semesterkalender = semesterkalender.load_semesterkalender(USER_SEMESTERKALENDER_PATH)
+        self._template_body_path = TEMPLATE_BODY_PATH
+        self.greeting_items = self.directory.items
+        # Suchindex für die Empfängerliste, wird nach dem Start im Hintergrund aufgebaut
+        self._search = None
+        self._search_retry = None
+        self._start_search_index()
+        # Haken-Zustand als einfache Menge von IDs
+        self.selection = RecipientSelection(self.directory)
+        self.selection.add_listener(lambda: self._schedule_preview("empfaenger"))
+        # Vom Stundenplan gesetzte Haken und der Zeitraum, für den sie gesetzt wurden
+        self._auto_selected = set()
+        self._auto_tage = None
+        # von Hand geänderte Haken, die die Stundenplan-Auswahl nicht mehr anfasst
+        self._manuell = set()
         # self.gkv_var = tk.BooleanVar()
         self.matrikel_var = tk.StringVar(value=self.user_matrikel)
+        self.matrikel_var.trace_add('write', lambda *args: self._schedule_preview("matrikel"))
+
+        # Vorschau: Events werden gesammelt und einmal pro Idle-Zyklus gerendert.
+        # Jeder Abschnitt wird nur neu gebaut, wenn sich eine seiner Eingaben geändert hat.
+        self._preview = PreviewEngine(self, sources={
+            "vorname": self._ctx_name,
+            "nachname": self._ctx_name,
+            "datum": self._ctx_datum,
+            "datum_2": self._ctx_datum_2,
+            "matrikel": self._ctx_matrikel,
+            "meldung": self._ctx_meldung,
+            "bemerkung": self._ctx_bemerkung,
+            "optionen": self._ctx_optionen,
+            "left": self._ctx_left,
+            "empfaenger": self._ctx_empfaenger,
+        }, sections={
+            "emails": ({"empfaenger"}, self._render_emails),
+        })
+        self._configure_template_sections()
 
         self._build_top_panel()
         self._build_left_panel()
@@ -167,24 +410,130 @@ class KrankmeldungApp(tk.Tk):
 
 
         # Setze Standardwerte und Events:
-        # Linkes Panel: "Vorlesungszeit." ankreuzen
-        if "Vorlesungszeit." in self.left_vars:
-            self.left_vars["Vorlesungszeit."].set(True)
+        # Linkes Panel: "Vorlesungszeit." ankreuzen (mit Semesterkalender.txt später passend zum Datum)
+        for opt in self.LEFT_STANDARD:
+            if opt in self.left_vars:
+                self.left_vars[opt].set(True)
 
         # Center Panel: Erste ZPD Checkbox ankreuzen (z.B. über greeting_items)
-        # zpd_anrede = self.greeting_items[0]["anrede"] if self.greeting_items else None
+        # zpd_anrede = self.greeting_items[0].anrede if self.greeting_items else None
         # if zpd_anrede and zpd_anrede in self.prof_vars:
         #     self.prof_vars[zpd_anrede].set(True)
 
         # Datum Krankheitsbeginn auf heute setzen
-        heute = datetime.datetime.now().strftime("%d.%m.%Y")
-        self.entry_datum.delete(0, tk.END)
-        self.entry_datum.insert(0, heute)
+        self._set_datum_heute()
 
 
 
         self._update_preview()
 
+        # Vorlagen und Konfigurationsdateien im Hintergrund beobachten; Änderungen übernimmt der Tk-Thread
+        self._watcher = FileWatcher([self._template_body_path, TEMPLATE_SUBJECT_PATH, EMPFAENGER_PATH,
+                                     USER_STUNDENPLAN_PATH, USER_SEMESTERKALENDER_PATH, *USER_FILES])
+        self._watcher.start()
+        self.after(FILE_POLL_MS, self._poll_file_changes)
+
+        # Letzte Meldung aus daten.db erst nach dem ersten Zeichnen des Fensters laden
+        self.after_idle(self._restore_last_session)
+
+    def destroy(self):
+        self._watcher.stop()
+        attachments.shutdown()
+        if self._outbox is not None:
+            # Offene Nachrichten bleiben in daten.db und gehen beim nächsten Start raus
+            self._outbox.stop()
+        super().destroy()
+
+    def _poll_file_changes(self):
+        for path in self._watcher.changes():
+            try:
+                self._on_file_changed(path)
+            except Exception as e:
+                instrumentation.count("errors", operation="reload")
+                print(f"Fehler beim Neuladen von {path}:", e)
+        self.after(FILE_POLL_MS, self._poll_file_changes)
+
+    def _on_file_changed(self, path):
+        """Übernimmt eine geänderte Datei; nur hier wird neu eingelesen, nicht beim Rendern."""
+        if path == self._template_body_path:
+            self.template_body = load_template(path, default=self.template_body.source)
+            self._configure_template_sections()
+            self._update_preview()
+        elif path == TEMPLATE_SUBJECT_PATH:
+            self.template_subject = load_template(path, default=DEFAULT_SUBJECT)
+            # neue Betreff-Vorlage: eigene Änderungen am alten Betreff gelten nicht mehr
+            self._subject_sync.reset()
+            self._configure_template_sections()
+            self._update_preview()
+        elif path == EMPFAENGER_PATH:
+            self._reload_empfaenger()
+        elif path == USER_STUNDENPLAN_PATH:
+            self._stundenplan_cache = None
+            self._auto_select_by_stundenplan()
+        elif path == USER_SEMESTERKALENDER_PATH:
+            self.semesterkalender = semesterkalender.load_semesterkalender(path)
+            self._prefill_from_semesterkalender()
+        elif path in USER_FILES:
+            self._on_user_file_changed(USER_FILES[path], path)
+
+    def _reload_empfaenger(self):
+        # IDs sind inhaltsbasiert: Haken unveränderter Empfänger bleiben erhalten
+        self.directory = RecipientDirectory.load(EMPFAENGER_PATH)
+        self.greeting_items = self.directory.items
+        self.selection.set_directory(self.directory)
+        self._auto_selected = {rid for rid in self._auto_selected if rid in self.directory}
+        self._stundenplan_cache = None
+        self._auto_tage = None
+        if self._search is not None:
+            self._search.sync(self.directory)
+        else:
+            self._start_search_index()
+        self._recipient_rows()
+        self._filter_recipients()
+        self.modul_box.configure(values=self.directory.module())
+        self._auto_select_by_stundenplan()
+
+    def _on_user_file_changed(self, field, path):
+        old = getattr(self, f"user_{field}")
+        new = load_file_text(path, default="") or ""
+        setattr(self, f"user_{field}", new)
+        # Eingabefelder nur nachziehen, wenn der Nutzer sie nicht schon selbst geändert hat
+        entry = {"vorname": self.entry_vorname, "nachname": self.entry_nachname,
+                 "email": self.entry_sender_email}.get(field)
+        if entry is not None and entry.get().strip() == old:
+            entry.delete(0, tk.END)
+            entry.insert(0, new)
+        elif field == "matrikel" and self.matrikel_var.get().strip() == old:
+            self.matrikel_var.set(new)
+        self._schedule_preview("vorname")
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from storage import Storage
+            self._storage = Storage()
+        return self._storage
+
+    def _set_datum_heute(self):
+        heute = datetime.datetime.now().strftime("%d.%m.%Y")
+        self.entry_datum.delete(0, tk.END)
+        self.entry_datum.insert(0, heute)
+
+    def _restore_last_session(self):
+        # mit lokal vorgespeicherten persönlichen Daten des Nutzers aus .db-Datei Felder befüllen:
+        self.load_data_from_db()
+        self._load_profiles()
+        self._set_datum_heute()
+        # --- Automatische Auswahl anhand Stundenplan.txt und Semesterkalender.txt ---
+        self._auto_select_by_stundenplan()
+        self._prefill_from_semesterkalender()
+        self._schedule_preview()
+        # Beim letzten Mal nicht Verschicktes nachholen
+        if self.storage.outbox_counts().get("offen"):
+            self._outbox_worker()
+        self._update_outbox_label()
+
+    @timed("save_personal_data_to_db_and_txt")
     def save_personal_data_to_db_and_txt(self):
         vorname = self.entry_vorname.get().strip()
         nachname = self.entry_nachname.get().strip()
@@ -192,21 +541,8 @@ class KrankmeldungApp(tk.Tk):
         matrikel = self.matrikel_var.get().strip()
 
         # SQLite speichern
-        conn = sqlite3.connect("daten.db")
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS krankmeldungen (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                vorname TEXT,
-                nachname TEXT,
-                datum TEXT,
-                matrikelnummer TEXT
-            )
-        """)
-        cursor.execute("INSERT INTO krankmeldungen (vorname, nachname, datum, matrikelnummer) VALUES (?, ?, ?, ?)",
-                       (vorname, nachname, datum, matrikel))
-        conn.commit()
-        conn.close()
+        self.storage.add_report(self._current_report())
+        self._save_profile()
 
         # Textdatei speichern
         with open("krankmeldung.txt", "w", encoding="utf-8") as f:
@@ -216,42 +552,109 @@ class KrankmeldungApp(tk.Tk):
 
         messagebox.showinfo("Erfolg", "Daten wurden in Datenbank und Textdatei gespeichert.")
 
+    @timed("load_profiles")
+    def _load_profiles(self):
+        try:
+            self.profiles = load_profiles(self.storage)
+        except Exception as e:
+            instrumentation.count("errors", operation="load_profiles")
+            print("Fehler beim Laden der Profile:", e)
+            self.profiles = ProfileIndex()
+
+    def _suggest_profiles(self, feld, text):
+        if self.profiles is None:
+            return []
+        return [(profile.label(), profile.matrikelnummer) for profile in self.profiles.complete(feld, text)]
+
+    def _apply_profile(self, matrikelnummer):
+        """Füllt Vorname, Nachname, Matrikelnummer und Absender-E-Mail aus einem Profil."""
+        profile = self.profiles.get(matrikelnummer) if self.profiles is not None else None
+        if profile is None:
+            return
+        for entry, value in ((self.entry_vorname, profile.vorname), (self.entry_nachname, profile.nachname),
+                             (self.entry_sender_email, profile.email)):
+            entry.delete(0, tk.END)
+            entry.insert(0, value)
+        if profile.studiengang:
+            self.user_studiengang = profile.studiengang
+        self.matrikel_var.set(profile.matrikelnummer)
+        self._schedule_preview("vorname", "nachname", "matrikel")
+
+    def _save_profile(self):
+        profile = Profile(self.matrikel_var.get().strip(), self.entry_vorname.get().strip(),
+                          self.entry_nachname.get().strip(), self.entry_sender_email.get().strip(),
+                          self.user_studiengang)
+        if not profile.matrikelnummer:
+            return
+        self.storage.save_profile(profile.as_dict())
+        if self.profiles is not None:
+            self.profiles.add(profile)
+
+    def _current_report(self):
+        """Alle Felder der aktuellen Meldung für daten.db."""
+        ctx = self._gather_context()
+        return {
+            "vorname": self.entry_vorname.get().strip(),
+            "nachname": self.entry_nachname.get().strip(),
+            "datum": self.entry_datum.get().strip(),
+            "matrikelnummer": self.matrikel_var.get().strip(),
+            "empfaenger_list": ",".join(self.selection.ids()),
+            "module": sorted({item.modul for item in self.selection.items() if item.modul}),
+            "datum_gesund": ctx["DatumGesund"],
+            "art": ctx["art"],
+            "attest": ctx["attest"],
+            "eau": ctx["eAU"],
+            "unfall": ctx["unfall"],
+            "pruefungstag": ctx["prüfungstag"],
+            "bemerkung": ctx["bemerkung"],
+            "studiengang": self.user_studiengang,
+            "email": self.entry_sender_email.get().strip(),
+        }
+
+    @timed("load_data_from_db")
     def load_data_from_db(self):
         try:
-            conn = sqlite3.connect("daten.db")
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT vorname, nachname, datum, matrikelnummer, empfaenger_list FROM krankmeldungen ORDER BY id DESC LIMIT 1")
-            row = cursor.fetchone()
-            conn.close()
+            row = self.storage.last_report()
             if row:
-                vorname, nachname, datum, matrikel, empfaenger_str = row
+                vorname, nachname, datum, matrikel = row["vorname"], row["nachname"], row["datum"], row["matrikelnummer"]
+                empfaenger_str = row["empfaenger_list"]
                 self.entry_vorname.delete(0, tk.END)
-                self.entry_vorname.insert(0, vorname)
+                self.entry_vorname.insert(0, vorname or "")
                 self.entry_nachname.delete(0, tk.END)
-                self.entry_nachname.insert(0, nachname)
+                self.entry_nachname.insert(0, nachname or "")
                 self.entry_datum.delete(0, tk.END)
-                self.entry_datum.insert(0, datum)
-                self.matrikel_var.set(matrikel)
+                self.entry_datum.insert(0, datum or "")
+                self.matrikel_var.set(matrikel or "")
 
-                # Alle Empfänger-Dropboxen aus = False
-                for var in self.prof_vars.values():
-                    var.set(False)
-                # gespeicherte Empfänger wieder auf True setzen
+                self._auto_selected = set()
+                self._auto_tage = None
+                self._manuell = set()
+                # gespeicherte Empfänger (IDs, bei alten Einträgen Anreden) als Ganzes wiederherstellen
                 gespeicherte_empfaenger = empfaenger_str.split(",") if empfaenger_str else []
-                for anrede in gespeicherte_empfaenger:
-                    if anrede in self.prof_vars:
-                        self.prof_vars[anrede].set(True)
+                self.selection.replace(item.id for token in gespeicherte_empfaenger
+                                       for item in self.directory.lookup(token))
         except Exception as e:
+            instrumentation.count("errors", operation="load_data_from_db")
             print("Fehler beim Laden aus DB:", e)
 
     def export_output(self):
-        text = self.output_text.get("1.0", "end-1c")
+        text = self.preview.get("1.0", "end-1c")
         file_path = filedialog.asksaveasfilename(defaultextension=".txt",
-                                                 filetypes=[("Textdateien", "*.txt"), ("Alle Dateien", "*.*")])
+                                                 filetypes=[("Textdateien", "*.txt"), ("E-Mail (.eml)", "*.eml"),
+                                                            ("Alle Dateien", "*.*")])
         if file_path:
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(text)
+            if file_path.lower().endswith(".eml"):
+                # komplette Nachricht mit Kopfzeilen, TO/CC und Betreff statt nur des Textes
+                from mail_export import message_bytes
+                to_list, cc_list = split_to_cc(self._selected_items())
+                message = {"to": to_list, "cc": cc_list, "body": text,
+                           "subject": self.text_subject.get("1.0", "end-1c").strip(),
+                           "sender": self.entry_sender_email.get().strip() or None}
+                with open(file_path, "wb") as file:
+                    file.write(message_bytes(message, "\r\n"))
+            else:
+                with open(file_path, "w", encoding="utf-8") as file:
+                    file.write(text)
             messagebox.showinfo("Erfolg", "Datei wurde gespeichert:\n" + file_path)
 
     def _build_top_panel(self):
@@ -267,23 +670,22 @@ class KrankmeldungApp(tk.Tk):
         self.entry_vorname = ttk.Entry(self.top, width=20)
         self.entry_vorname.grid(row=0, column=1, padx=10)
         self.entry_vorname.insert(0, self.user_vorname)
-        self.entry_vorname.bind("<KeyRelease>", lambda e: self._update_preview())
+        self.entry_vorname.bind("<KeyRelease>", lambda e: self._schedule_preview("vorname"))
 
         ttk.Label(self.top, text="Nachname:").grid(row=0, column=2, sticky="e")
         self.entry_nachname = ttk.Entry(self.top, width=40)
         self.entry_nachname.grid(row=0, column=3, padx=10)
         self.entry_nachname.insert(0, self.user_nachname)
-        self.entry_nachname.bind("<KeyRelease>", lambda e: self._update_preview())
+        self.entry_nachname.bind("<KeyRelease>", lambda e: self._schedule_preview("nachname"))
 
         ttk.Label(self.top, text="Erster Krankheitstag:").grid(row=0, column=6, sticky="e")
         self.entry_datum = ttk.Entry(self.top, width=14)
         self.entry_datum.grid(row=0, column=7, padx=10, sticky="w")
-        self.entry_datum.bind("<KeyRelease>", lambda e: self._update_preview())
+        self.entry_datum.bind("<KeyRelease>", lambda e: self._on_datum_change("datum"))
 
         ttk.Label(self.top, text="Letzter Krankheitstag:").grid(row=1, column=6, sticky="e")
         self.entry_datum_2 = ttk.Entry(self.top, width=14)
         self.entry_datum_2.grid(row=1, column=7, padx=10, sticky="w")
-        self.entry_datum_2.bind("<KeyRelease>", lambda e: self._update_preview())
 
         # ----------------- Icon laden  ----------------- START
         diskette_img = tk.PhotoImage(file="icon_save_Windows.png") # tkinter kann nur Zoom mit ganzen Zahlen, unpraktisch. Lieber pillow (auch PIL genannt) benutzen.
@@ -303,14 +705,12 @@ class KrankmeldungApp(tk.Tk):
         # btn_save = ttk.Button(self.top, text="💾", command=self.save_personal_data_to_db_and_txt)
         btn_save.grid(row=0, column=9, sticky="e", padx=10)
 
-        # mit lokal vorgespeicherten persönlichen Daten des Nutzers aus .db-Datei Felder befüllen:
-        self.load_data_from_db()
-
         def on_datum_2_change(event=None):
             text = self.entry_datum_2.get().strip()
             if not text:
                 self.meldung_var.set("Krankmeldung")
-                self._update_preview()
+                self._schedule_preview("meldung")
+            self._on_datum_change("datum_2")
 
         self.entry_datum_2.bind("<KeyRelease>", on_datum_2_change)
 
@@ -318,11 +718,11 @@ class KrankmeldungApp(tk.Tk):
         self.meldung_var = tk.StringVar(value="Krankmeldung")
 
         rb1 = ttk.Radiobutton(self.top, text="Krankmeldung", variable=self.meldung_var, value="Krankmeldung",
-                              command=self._update_preview)
+                              command=lambda: self._schedule_preview("meldung"))
         rb1.grid(row=0, column=8, sticky="w", padx=10)
 
         rb2 = ttk.Radiobutton(self.top, text="Gesundmeldung", variable=self.meldung_var, value="Gesundmeldung",
-                              command=self._update_preview)
+                              command=lambda: self._schedule_preview("meldung"))
         rb2.grid(row=1, column=8, sticky="w", padx=(10, 0))
 
         # 2510221928FF OUT
@@ -337,20 +737,30 @@ class KrankmeldungApp(tk.Tk):
             self.entry_datum_2.delete(0, tk.END)
             self.entry_datum_2.insert(0, datetime.datetime.now().strftime("%d.%m.%Y"))
             self.meldung_var.set("Gesundmeldung")
-            self._update_preview()
+            self._on_datum_change("datum_2", "meldung")
 
         btn_heute_gesund = ttk.Button(self.top, text="heute wieder gesund", command=set_heute_gesund)
         btn_heute_gesund.grid(row=1, column=9, padx=10)
 
         # Zweite Zeile: Matrikelnummer und Absender-E-Mail
         ttk.Label(self.top, text="Matrikelnummer:").grid(row=1, column=0, sticky="e")
-        ttk.Entry(self.top, textvariable=self.matrikel_var, width=15).grid(row=1, column=1, sticky="w", padx=10)
+        self.entry_matrikel = ttk.Entry(self.top, textvariable=self.matrikel_var, width=15)
+        self.entry_matrikel.grid(row=1, column=1, sticky="w", padx=10)
 
         ttk.Label(self.top, text="Absender-E-Mail:").grid(row=1, column=2, sticky="e")
         self.entry_sender_email = ttk.Entry(self.top, width=40)
         self.entry_sender_email.grid(row=1, column=3, columnspan=3, sticky="w", padx=10)
         self.entry_sender_email.insert(0, self.user_email)
-        self.entry_sender_email.bind("<KeyRelease>", lambda e: self._update_preview())
+
+        # Autovervollständigung aus den gespeicherten Profilen: eine Auswahl füllt alle Felder
+        self._autocomplete = [
+            AutocompletePopup(self.entry_vorname, lambda text: self._suggest_profiles("vorname", text),
+                              self._apply_profile),
+            AutocompletePopup(self.entry_nachname, lambda text: self._suggest_profiles("nachname", text),
+                              self._apply_profile),
+            AutocompletePopup(self.entry_matrikel, lambda text: self._suggest_profiles("matrikelnummer", text),
+                              self._apply_profile),
+        ]
 
     def _build_left_panel(self):
         left = ttk.LabelFrame(self, text="Heute verpasse ich krankheitsbedingt ...", padding=6)
@@ -362,6 +772,7 @@ class KrankmeldungApp(tk.Tk):
             "die restlichen Stunden des Tages.\nHeute Morgen war ich aber schon da.\n(\"Krank im Dienst\")"
         ]
         self.left_vars = {}
+        self._left_manuell = set()
 
         def on_vorlesungszeit_toggle():
             pass
@@ -370,7 +781,7 @@ class KrankmeldungApp(tk.Tk):
             pass
 
         def on_berufspraxis_toggle():
-            pass
+            self._on_left_toggle("Berufspraxis.")
 
         def on_KrankImDienst_toggle():
             pass
@@ -394,7 +805,7 @@ class KrankmeldungApp(tk.Tk):
             if opt == "Berufspraxis.":
                 cb = ttk.Checkbutton(left, text=opt, variable=v, command=on_berufspraxis_toggle)
             else:
-                cb = ttk.Checkbutton(left, text=opt, variable=v, command=self._update_preview)
+                cb = ttk.Checkbutton(left, text=opt, variable=v, command=lambda o=opt: self._on_left_toggle(o))
             cb.pack(anchor="w", pady=2)
             self.left_vars[opt] = v
 
@@ -402,102 +813,224 @@ class KrankmeldungApp(tk.Tk):
         center = ttk.LabelFrame(self, text="Krankmelden bei", padding=6)
         center.grid(row=1, column=1, sticky="nsew", padx=6, pady=6)
         center.columnconfigure(0, weight=1)
-        center.rowconfigure(0, weight=1)
-
-        # Canvas + Scrollbar erstellen
-        canvas = tk.Canvas(center)
-        scrollbar = ttk.Scrollbar(center, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        canvas.grid(row=0, column=0, sticky="nsew")
-        scrollbar.grid(row=0, column=1, sticky="ns")
-
-        # Checkboxen aufbauen:
-        self.prof_vars = {}
-        row_idx = 0
-
+        center.rowconfigure(1, weight=1)
+
+        # Suche über Modul, Anrede und E-Mail (tippfehlertolerant), filtert die Liste beim Tippen
+        suche = ttk.Frame(center)
+        suche.grid(row=0, column=0, sticky="ew", pady=(0, 6))
+        suche.columnconfigure(1, weight=1)
+        ttk.Label(suche, text="Suchen:").grid(row=0, column=0, padx=(0, 4))
+        self.suche_var = tk.StringVar()
+        self.suche_var.trace_add("write", lambda *args: self._filter_recipients())
+        entry_suche = ttk.Entry(suche, textvariable=self.suche_var)
+        entry_suche.grid(row=0, column=1, sticky="ew")
+        entry_suche.bind("<Escape>", lambda e: self.suche_var.set(""))
+
+        # Virtuelle Liste: Widgets nur für sichtbare Zeilen, Haken-Zustand in self.selection
+        self.recipient_list = VirtualCheckList(center, self._recipient_rows(),
+                                               is_checked=self.selection.__contains__,
+                                               on_toggle=self._on_recipient_toggle)
+        self.recipient_list.grid(row=1, column=0, sticky="nsew")
+        # Haken nach programmatischen Änderungen (Laden, Stundenplan) gesammelt nachziehen
+        self._preview.set_section("liste", {"empfaenger"}, lambda ctx: self.recipient_list.refresh())
+
+        # Sammelauswahl: alle, keine, ein ganzes Modul, gespeicherte Auswahl
+        tools = ttk.Frame(center)
+        tools.grid(row=2, column=0, sticky="ew", pady=(6, 0))
+        tools.columnconfigure(3, weight=1)
+        tools.columnconfigure(7, weight=1)
+        ttk.Button(tools, text="Alle", width=6,
+                   command=lambda: self._bulk_select(self.selection.select_all)).grid(row=0, column=0, padx=(0, 2))
+        ttk.Button(tools, text="Keine", width=6,
+                   command=lambda: self._bulk_select(self.selection.clear)).grid(row=0, column=1, padx=2)
+        ttk.Label(tools, text="Modul:").grid(row=0, column=2, padx=(8, 2))
+        self.modul_var = tk.StringVar()
+        self.modul_box = ttk.Combobox(tools, textvariable=self.modul_var, state="readonly",
+                                      values=self.directory.module())
+        self.modul_box.grid(row=0, column=3, sticky="ew", padx=2)
+        ttk.Button(tools, text="+", width=3, command=lambda: self._select_modul(True)).grid(row=0, column=4, padx=2)
+        ttk.Button(tools, text="−", width=3, command=lambda: self._select_modul(False)).grid(row=0, column=5, padx=2)
+        ttk.Label(tools, text="Auswahl:").grid(row=0, column=6, padx=(8, 2))
+        self.vorlage_var = tk.StringVar()
+        self.vorlage_box = ttk.Combobox(tools, textvariable=self.vorlage_var, postcommand=self._refresh_vorlagen)
+        self.vorlage_box.grid(row=0, column=7, sticky="ew", padx=2)
+        self.vorlage_box.bind("<<ComboboxSelected>>", lambda e: self._load_vorlage())
+        ttk.Button(tools, text="Laden", command=self._load_vorlage).grid(row=0, column=8, padx=2)
+        ttk.Button(tools, text="Speichern", command=self._save_vorlage).grid(row=0, column=9, padx=2)
+        ttk.Button(tools, text="Löschen", command=self._delete_vorlage).grid(row=0, column=10, padx=(2, 0))
+
+    def _recipient_rows(self):
+        rows = []
         for item in self.greeting_items:
-            modul = item["modul"]
-            email = item["email"]
-            anrede = item["anrede"]
+            modul = item.modul
+            email = item.email
             label = f"{modul} ({email})" if email else modul
+            rows.append((item.id, label))
+        # für die Suche: alle Zeilen und Zeile je ID, bis zum nächsten Neueinlesen
+        self._rows = rows
+        self._row_by_id = dict(rows)
+        return rows
 
-            var = tk.BooleanVar()
-            # Verbindung herstellen (korrekt gebundene Lambda-Variable!)
-            var.trace_add('write', lambda *args, a=anrede: self._update_preview())
-            cb = ttk.Checkbutton(scrollable_frame, text=label, variable=var)
-            cb.grid(row=row_idx, column=0, sticky="w", pady=2)
-            self.prof_vars[anrede] = var
-            row_idx += 1
+    def _start_search_index(self):
+        """Baut den Suchindex im Hintergrund; bei großen Verzeichnissen dauert das einen Moment."""
+        directory = self.directory
+
+        def build():
+            index = RecipientSearch(directory)
+            # Nur übernehmen, wenn inzwischen nicht neu eingelesen wurde
+            if directory is self.directory:
+                self._search = index
+
+        threading.Thread(target=build, name="krankomat-suchindex", daemon=True).start()
 
-        # Attribute sichern – dann existiert scrollable_frame global
-        self.center_canvas = canvas
-        self.center_scrollbar = scrollbar
-        self.center_scrollable_frame = scrollable_frame
+    def _filter_recipients(self):
+        query = self.suche_var.get()
+        if query.strip() and self._search is None:
+            # Index noch im Aufbau: gleich noch einmal versuchen
+            if self._search_retry is None:
+                self._search_retry = self.after(100, self._retry_filter)
+            return
+        ids = self._search.search(query) if self._search is not None else None
+        if ids is None:
+            rows = self._rows
+        else:
+            rows = [(rid, self._row_by_id[rid]) for rid in ids if rid in self._row_by_id]
+        self.recipient_list.set_rows(rows)
+
+    def _retry_filter(self):
+        self._search_retry = None
+        self._filter_recipients()
+
+    def _on_recipient_toggle(self, rid, value):
+        self._auto_selected.discard(rid)
+        self._manuell.add(rid)
+        self.selection.set(rid, value)
+
+    def _bulk_select(self, change, *args):
+        """Sammeloperation auf der Auswahl: eine Benachrichtigung, geänderte Haken gelten als von Hand gesetzt."""
+        with self.selection.batch():
+            changed = change(*args)
+        self._auto_selected -= changed
+        self._manuell |= changed
+        return changed
+
+    def _select_modul(self, value):
+        modul = self.modul_var.get()
+        if modul:
+            self._bulk_select(self.selection.select_modul, modul, value)
+
+    def _refresh_vorlagen(self):
+        try:
+            self.vorlage_box.configure(values=self.storage.selection_names())
+        except Exception as e:
+            instrumentation.count("errors", operation="vorlagen")
+            print("Fehler beim Lesen der gespeicherten Auswahlen:", e)
+
+    def _load_vorlage(self):
+        name = self.vorlage_var.get().strip()
+        ids = self.storage.load_selection(name) if name else None
+        if ids is None:
+            messagebox.showinfo("Auswahl", f"Keine gespeicherte Auswahl „{name}“.")
+            return
+        self._bulk_select(self.selection.replace, ids)
 
+    def _save_vorlage(self):
+        name = self.vorlage_var.get().strip()
+        if not name:
+            messagebox.showinfo("Auswahl", "Bitte einen Namen für die Auswahl eingeben.")
+            return
+        self.storage.save_selection(name, self.selection.ids())
+        self._refresh_vorlagen()
 
+    def _delete_vorlage(self):
+        name = self.vorlage_var.get().strip()
+        if name and messagebox.askyesno("Auswahl", f"Gespeicherte Auswahl „{name}“ löschen?"):
+            self.storage.delete_selection(name)
+            self.vorlage_var.set("")
+            self._refresh_vorlagen()
 
-        # --- Automatische Auswahl anhand Stundenplan.txt ---
+    def _on_datum_change(self, *handlers):
         self._auto_select_by_stundenplan()
+        self._prefill_from_semesterkalender()
+        self._schedule_preview(*handlers)
+
+    def _krank_zeitraum(self):
+        """(Erster, Letzter Krankheitstag) als date; ohne gültigen Letzten gilt nur der Erste. Sonst None."""
+        start = semesterkalender.parse_datum(self.entry_datum.get())
+        if start is None:
+            return None
+        ende = semesterkalender.parse_datum(self.entry_datum_2.get())
+        return start, ende if ende is not None else start
+
+    # Checkbox im linken Panel -> Tagesart aus dem Semesterkalender
+    LEFT_KALENDER = {
+        "Vorlesungszeit.": semesterkalender.VORLESUNG,
+        "Berufspraxis.": semesterkalender.BERUFSPRAXIS,
+        "eine Prüfungsleistung / Klausur / Präsentation.": semesterkalender.PRUEFUNG,
+    }
+    # Beim Start angehakt; gilt auch, wenn der Semesterkalender den Zeitraum nicht kennt
+    LEFT_STANDARD = {"Vorlesungszeit."}
+
+    def _on_left_toggle(self, opt):
+        # Von Hand gesetzte Haken überschreibt der Semesterkalender nicht mehr
+        self._left_manuell.add(opt)
+        self._schedule_preview("left")
+
+    def _prefill_from_semesterkalender(self):
+        """Setzt Vorlesungszeit, Berufspraxis und Prüfung im linken Panel passend zum Krankheitszeitraum."""
+        kalender = self.semesterkalender
+        zeitraum = self._krank_zeitraum()
+        if kalender is None or zeitraum is None:
+            return
+        # Zeitraum außerhalb des Kalenders: unbekannt, es gelten die Standardhaken
+        arten = kalender.arten_im_zeitraum(*zeitraum) if kalender.umfasst(*zeitraum) else None
+        changed = False
+        for opt, art in self.LEFT_KALENDER.items():
+            var = self.left_vars.get(opt)
+            if var is None or opt in self._left_manuell:
+                continue
+            value = opt in self.LEFT_STANDARD if arten is None else art in arten
+            if var.get() != value:
+                var.set(value)
+                changed = True
+        if changed:
+            self._schedule_preview("left")
 
     def _auto_select_by_stundenplan(self):
-        """Wählt automatisch Empfänger anhand von Stundenplan.txt und aktuellem Wochentag."""
+        """Wählt automatisch Empfänger anhand von Stundenplan.txt für alle Tage von
+        "Erster Krankheitstag" bis "Letzter Krankheitstag".
 
-        if not os.path.exists(USER_STUNDENPLAN_PATH):
+        Bei jeder Datumsänderung werden nur die Unterschiede zur letzten Auswahl übernommen:
+        Haken für weggefallene Tage verschwinden, neue kommen hinzu, von Hand gesetzte bleiben.
+        """
+        index = self._stundenplan_index()
+        if index is None:
             return
 
-        # Krankheitsbeginn-Datum aus Eingabefeld lesen
-        datum_text = self.entry_datum.get().strip()
-
-        try:
-            # Datum aus Format TT.MM.JJJJ lesen
-            krank_datum = datetime.datetime.strptime(datum_text, "%d.%m.%Y").date()
-        except ValueError:
-            # Falls Format falsch oder leer ist, abbrechen
+        # Datum aus Format TT.MM.JJJJ lesen; falsch oder leer -> nichts ändern
+        zeitraum = self._krank_zeitraum()
+        if zeitraum is None:
             return
+        start, ende = zeitraum
 
-        # Wochentag vom eingegebenen Datum (nicht 'heute')
-        wochentag_map = {
-            0: "Montag",
-            1: "Dienstag",
-            2: "Mittwoch",
-            3: "Donnerstag",
-            4: "Freitag",
-            5: "Samstag",
-            6: "Sonntag",
-        }
-        heute = wochentag_map[krank_datum.weekday()]
-
-        # Stundenplanzeilen einlesen
-        passende_module = []
-        with open(USER_STUNDENPLAN_PATH, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                parts = line.split(";")
-                if len(parts) >= 2:
-                    tag, modul = parts[0].strip(), parts[1].strip()
-                    if tag.lower() == heute.lower():
-                        passende_module.append(modul)
-
-        # Checkboxen automatisch aktivieren, wenn Modulnamen passen
-        for item in self.greeting_items:
-            modulname = item.get("modul", "").strip()
-            anrede = item.get("anrede", "").strip()
-            for pmod in passende_module:
-                if pmod.lower() in modulname.lower():
-                    if anrede in self.prof_vars:
-                        self.prof_vars[anrede].set(True)
-                        break
+        tage = tage_im_zeitraum(start, ende)
+        if tage == self._auto_tage:
+            return
+        self._auto_tage = tage
+
+        neu = set(ids_im_zeitraum(index, start, ende)) - self._manuell
+        # war schon von Hand angehakt: gehört weiter dem Nutzer
+        neu -= {rid for rid in neu - self._auto_selected if rid in self.selection}
+        self.selection.update(add=neu - self._auto_selected, remove=self._auto_selected - neu)
+        self._auto_selected = neu
+
+    def _stundenplan_index(self):
+        """(Wochentag, Woche) -> Empfänger-IDs; neu berechnet erst, wenn die Dateiüberwachung eine Änderung meldet."""
+        if self._stundenplan_cache is None:
+            plan = load_stundenplan(USER_STUNDENPLAN_PATH)
+            self._stundenplan_cache = (plan, plan.index_directory(self.directory) if plan is not None else None)
+            self._auto_tage = None
+        return self._stundenplan_cache[1]
 
     def _build_right_panel(self):
         right = ttk.LabelFrame(self, text="Details / Optionen", padding=6)
@@ -507,27 +1040,38 @@ class KrankmeldungApp(tk.Tk):
         def on_eau_toggle():
             if self.eau_var.get():
                 self.attest_var.set(True)
-            self._update_preview()  # Optionale Aktualisierung der Vorschau
+            self._schedule_preview("optionen")  # Optionale Aktualisierung der Vorschau
 
         self.gkv_var = tk.BooleanVar()
-        ttk.Checkbutton(right, text="GKV", variable=self.gkv_var, command=self._update_preview).pack(anchor="w", pady=2)
+        ttk.Checkbutton(right, text="GKV", variable=self.gkv_var, command=self._on_option_toggle).pack(anchor="w", pady=2)
 
         self.unfall_var = tk.BooleanVar()
-        ttk.Checkbutton(right, text="Unfall", variable=self.unfall_var, command=self._update_preview).pack(anchor="w",
+        ttk.Checkbutton(right, text="Unfall", variable=self.unfall_var, command=lambda: self._schedule_preview("optionen")).pack(anchor="w",
                                                                                                            pady=2)
         self.attest_var = tk.BooleanVar()
-        ttk.Checkbutton(right, text="Attest", variable=self.attest_var, command=self._update_preview).pack(anchor="w",
+        ttk.Checkbutton(right, text="Attest", variable=self.attest_var, command=self._on_option_toggle).pack(anchor="w",
                                                                                                            pady=2)
         self.eau_var = tk.BooleanVar()
         eau_cb = ttk.Checkbutton(right, text="eAU", variable=self.eau_var, command=on_eau_toggle)
         eau_cb.pack(anchor="w", pady=2)
 
+        # Attest/eAU als Anhang: Fotos werden im Hintergrund zu einem kompakten PDF
+        self._anhang_future = None
+        self._senden_nach_anhang = None  # None oder send_now eines wartenden _prepare_emails
+        self._anhaenge = []
+        anhang_frame = ttk.Frame(right)
+        anhang_frame.pack(anchor="w", fill="x", pady=(4, 0))
+        ttk.Button(anhang_frame, text="Attest/eAU anhängen…", command=self._choose_attachments).pack(side="left")
+        ttk.Button(anhang_frame, text="Anhang entfernen", command=self._clear_attachments).pack(side="left", padx=(4, 0))
+        self.anhang_label = ttk.Label(right, text="Kein Anhang", wraplength=220)
+        self.anhang_label.pack(anchor="w", pady=2)
+
 
         # Multiline-Textfeld für Bemerkungen
         ttk.Label(right, text="Bemerkung / voraussichtliche Dauer:").pack(anchor="w", pady=(8, 0))
         self.bemerkung_entry = tk.Text(right, width=30, height=5, wrap=tk.WORD)
         self.bemerkung_entry.pack(anchor="w", pady=2)
-        self.bemerkung_entry.bind("<KeyRelease>", lambda e: self._update_preview())
+        self.bemerkung_entry.bind("<KeyRelease>", lambda e: self._schedule_preview("bemerkung"))
 
         # Variablen für Checkboxen mit Beispieltexten
         self.bemerkung_1_var = tk.BooleanVar()
@@ -541,7 +1085,7 @@ class KrankmeldungApp(tk.Tk):
                     neu = aktuell + ("\n" if aktuell else "") + text
                     self.bemerkung_entry.delete("1.0", tk.END)
                     self.bemerkung_entry.insert("1.0", neu)
-                    self._update_preview()
+                    self._schedule_preview("bemerkung")
             else:
                 aktuell = self.bemerkung_entry.get("1.0", "end-1c")
                 lines = aktuell.split("\n")
@@ -550,7 +1094,7 @@ class KrankmeldungApp(tk.Tk):
                     neu = "\n".join(lines)
                     self.bemerkung_entry.delete("1.0", tk.END)
                     self.bemerkung_entry.insert("1.0", neu)
-                    self._update_preview()
+                    self._schedule_preview("bemerkung")
 
         ttk.Checkbutton(right, text="nur 1 Tag krank", variable=self.bemerkung_1_var,
                         command=lambda: toggle_bemerkung(self.bemerkung_1_var, "nur 1 Tag krank")).pack(anchor="w",
@@ -571,6 +1115,8 @@ class KrankmeldungApp(tk.Tk):
 
         self.preview = scrolledtext.ScrolledText(out, wrap="word")
         self.preview.grid(row=0, column=0, sticky="nsew")
+        # Vorschau nur an den geänderten Stellen patchen: Scrollposition und Cursor bleiben stehen
+        self._preview_sync = TextSync(self.preview)
 
     def _build_buttons_panel(self):
         btns = ttk.Frame(self, padding=6)
@@ -580,6 +1126,9 @@ class KrankmeldungApp(tk.Tk):
 
         ttk.Button(btns, text="E-Mails vorbereiten und manuell abschicken", command=lambda: self._prepare_emails(send_now=False)).grid(row=0, column=0, sticky="ew", padx=6)
         ttk.Button(btns, text="E-Mails sofort abschicken", command=lambda: self._prepare_emails(send_now=True)).grid(row=0, column=1, sticky="ew", padx=6)
+        self.outbox_label = ttk.Label(btns, text="")
+        self.outbox_label.grid(row=1, column=1, sticky="w", padx=6, pady=(4, 0))
+        self.outbox_retry_button = ttk.Button(btns, text="Gescheiterte erneut senden", command=self._retry_outbox)
 
     def _build_email_info_panel(self):
         frame = ttk.LabelFrame(self, text="E-Mail-Adressen & Betreff zum Kopieren", padding=6)
@@ -590,163 +1139,131 @@ class KrankmeldungApp(tk.Tk):
         self.text_emails = tk.Text(frame, height=3, wrap="word")
         self.text_emails.grid(row=1, column=0, sticky="ew")
         self.text_emails.config(state="disabled")
+        self._emails_sync = TextSync(self.text_emails)
 
         ttk.Label(frame, text="Betreff:").grid(row=2, column=0, sticky="w", pady=(6, 0))
         self.text_subject = tk.Text(frame, height=1, wrap="word")
         self.text_subject.grid(row=3, column=0, sticky="ew")
         self.text_subject.config(state="normal") # 2510221932FF Editierbar gemacht für Benutzer.
-
-
-    def _gather_context(self):
+        # Eigene Änderungen am Betreff bleiben beim Neu-Rendern erhalten
+        self._subject_sync = TextSync(self.text_subject, keep_edits=True)
+
+
+    # ----------------- Kontext-Quellen für die Vorschau -----------------
+    # Jede Quelle liefert nur die Platzhalter, die von ihrer Eingabe abhängen.
+
+    CONTEXT_KEYS = {
+        "vorname": {"vorname", "Vornamen", "namefield", "studiengang"},
+        "nachname": {"nachname", "Nachname", "namefield", "studiengang"},
+        "datum": {"Datum", "DatumKrank"},
+        "datum_2": {"DatumGesund", "Datum2"},
+        "matrikel": {"Matrikelnummer"},
+        "meldung": {"art", "krankmeldung", "gesundmeldung"},
+        "bemerkung": {"bemerkung", "bemerkung_1", "bemerkung_2", "bemerkung_3"},
+        "optionen": {"attest", "eAU", "unfall"},
+        "left": {"prüfungstag"},
+        "empfaenger": {"anrede"},
+    }
+
+    def _inputs_for(self, placeholders):
+        return {name for name, keys in self.CONTEXT_KEYS.items() if keys & placeholders}
+
+    def _configure_template_sections(self):
+        """Leitet aus den Platzhaltern der Vorlagen ab, welche Eingaben Body und Betreff betreffen."""
+        self._preview.set_section("body", self._inputs_for(self.template_body.placeholders), self._render_body)
+        subject_keys = self.template_subject.placeholders.intersection(SUBJECT_KEYS)
+        self._preview.set_section("subject", self._inputs_for(subject_keys), self._render_subject)
+
+    def _ctx_name(self):
         vorname = self.entry_vorname.get().strip()
         nachname = self.entry_nachname.get().strip()
-
-        name_field = f"{vorname} {nachname}".strip()
-        name_str = f"Name: {name_field}" if vorname else f"Name:{name_field}"
-
-        anreden_auswahl = []
-        for anrede, var in self.prof_vars.items():
-            if var.get():
-                anreden_auswahl.append(anrede.strip())
-
-        ctx = {
-            "vorname": vorname or "Vorname",
-            "nachname": nachname or "Nachname",
-            "Datum": self.entry_datum.get().strip() or datetime.datetime.now().strftime("%d.%m.%Y"),
-            "art": self.meldung_var.get(),
-            "bemerkung": self.bemerkung_entry.get("1.0", "end-1c").strip() or "",
-            "Vornamen": vorname or "Vorname",
-            "Nachname": nachname or "Nachname",
-            "Matrikelnummer": self.matrikel_var.get().strip() or "",
-            "krankmeldung": "x" if self.meldung_var.get() == "Krankmeldung" else "",
-            "gesundmeldung": "x" if self.meldung_var.get() == "Gesundmeldung" else "",
-            "DatumKrank": self.entry_datum.get().strip(),
-            "DatumGesund": self.entry_datum_2.get().strip() or "",
-            "attest": "ja" if self.attest_var.get() else "nein",
-            "eAU": "ja" if (self.eau_var.get() and self.gkv_var.get() and self.attest_var.get()) else ("ja" if self.eau_var.get() else "nein"),
-            "prüfungstag": "ja" if self.left_vars["eine Prüfungsleistung / Klausur / Präsentation."].get() else "nein",
-            "unfall": "ja" if self.unfall_var.get() else "nein",
-            "namefield": name_str,
-            "studiengang": self.user_studiengang,
-            "anrede": ", ".join(anreden_auswahl),
-            "bemerkung_1": "x" if self.bemerkung_1_var.get() else "",
-            "bemerkung_2": "x" if self.bemerkung_2_var.get() else "",
-            "bemerkung_3": "x" if self.bemerkung_3_var.get() else "",
-            "Datum2": self.entry_datum_2.get().strip()
-        }
-        self._name_field = name_str
+        ctx = meldung.ctx_name(vorname, nachname, self.user_studiengang)
+        self._name_field = ctx["namefield"]
         return ctx
 
-    def _update_preview(self):
-        scroll_pos = self.preview.yview()
-        self.preview.delete("1.0", tk.END)
-        self.preview.insert(tk.END, "Hier steht der Text für die Vorschau")
-        ctx = self._gather_context()
+    def _ctx_datum(self):
+        return meldung.ctx_datum(self.entry_datum.get().strip())
 
-        anreden_auswahl = [anrede.strip() for anrede, var in self.prof_vars.items() if var.get()]
+    def _ctx_datum_2(self):
+        return meldung.ctx_datum_2(self.entry_datum_2.get().strip())
 
-        anrede_text = ",\n".join(anreden_auswahl)
-        ctx["anrede"] = anrede_text
+    def _ctx_matrikel(self):
+        return meldung.ctx_matrikel(self.matrikel_var.get().strip())
 
-        body = render_template(self.template_body, ctx)
+    def _ctx_meldung(self):
+        return meldung.ctx_meldung(self.meldung_var.get())
 
-        if anreden_auswahl:
-            # Ersten Eintrag großschreiben (nur erstes Wort oder komplett)
-            s = anreden_auswahl[0]
-            anreden_auswahl[0] = s[0].upper() + s[1:] if s else s
+    def _ctx_bemerkung(self):
+        return meldung.ctx_bemerkung(self.bemerkung_entry.get("1.0", "end-1c").strip(),
+                                     self.bemerkung_1_var.get(), self.bemerkung_2_var.get(),
+                                     self.bemerkung_3_var.get())
 
-        anrede_text = ",\n".join(anreden_auswahl)
-        ctx["anrede"] = anrede_text
+    def _on_option_toggle(self):
+        # eAU-Haken auch in der GUI setzen, wenn GKV und Attest gesetzt wurden
+        if meldung.effective_eau(self.eau_var.get(), self.gkv_var.get(), self.attest_var.get()):
+            self.eau_var.set(True)
+        self._schedule_preview("optionen")
 
-        body = render_template(self.template_body, ctx)
+    def _ctx_optionen(self):
+        return meldung.ctx_optionen(self.attest_var.get(), self.eau_var.get(), self.unfall_var.get())
 
-        # Alle ausgewählten Anreden zusammensetzen:
-        # anrede_text = "\n".join(anreden_auswahl)
-        # ctx["anrede"] = anrede_text
+    def _ctx_left(self):
+        return meldung.ctx_pruefungstag(self.left_vars["eine Prüfungsleistung / Klausur / Präsentation."].get())
 
-        to_list = []
-        cc_list = []
-        """
-        # 2510262246OUT.
-        selected = [a for a, v in self.prof_vars.items() if v.get()]
-        to_list, cc_list = [], []
-
-        if selected:
-            # Erster Empfänger ist Hauptempfänger; alle weiteren in CC.
-            first = selected[0]
-            primary = next((g for g in self.greeting_items if g["anrede"] == first), None)
-            if primary and primary.get("email"):
-                cc_list.append(primary["email"]) #2510262244OLD: war mal to_list.append. Machte keinen Sinn für die Business Requirements.
-
-            # Alle weiteren Empfänger als CC
-            # for a in selected[1:]:
-            #     g = next((g for g in self.greeting_items if g["anrede"] == a), None)
-            #     if g and g.get("email"):
-            #         cc_list.append(g["email"])
-        """
+    def _ctx_empfaenger(self):
+        return {"anrede": meldung.greeting_for(self._selected_items())}
 
+    def _selected_items(self):
+        """Ausgewählte Empfänger in Dateireihenfolge."""
+        return self.selection.items()
 
-        # Alle Anwender-Auswahlen im mittleren Panel als CC, auch ZPD nicht doppeln
-        for anrede in anreden_auswahl:
-            # if zpd and anrede == zpd.get("anrede"):
-            #     continue  # ZPD nicht nochmal in CC
-            g = next((g for g in self.greeting_items if g["anrede"] == anrede), None)
-            if g and g.get("email"):
-                cc_list.append(g["email"])
-
-        # Generate greeting text
-        greeting_text = generate_anreden(anreden_auswahl)
-        ctx["anrede"] = greeting_text
-        body = render_template(self.template_body, ctx)
-
+    def _gather_context(self):
+        """Liefert den vollständigen, aktuellen Kontext (alle Eingaben neu eingelesen, auch ungenutzte)."""
+        ctx = {}
+        for source in dict.fromkeys(self._preview.sources.values()):
+            ctx.update(source())
+        return ctx
 
+    # ----------------- Vorschau -----------------
 
-        # Empfänger-Liste am Ende entfernen, da Begrüßung alle enthält
-        # Optional kannst du hier andere Zusätze einfügen
+    def _schedule_preview(self, *inputs):
+        """Merkt geänderte Eingaben vor; gerendert wird gesammelt im nächsten Idle-Zyklus."""
+        if instrumentation.enabled:
+            for name in inputs or ("alle",):
+                instrumentation.count("preview_events", handler=name)
+        self._preview.mark_dirty(*inputs)
 
-        opts = []
-        if self.unfall_var.get(): opts.append("Unfall")
-        if self.attest_var.get(): opts.append("Attest")
-        if self.eau_var.get(): opts.append("eAU")
+    def _update_preview(self):
+        """Rendert die komplette Vorschau sofort (z. B. vor dem Versand)."""
+        self._preview.mark_dirty()
+        self._preview.flush()
 
-        # automatische Setzung von eAU wenn GKV UND Unfall gesetzt wurden
-        if self.gkv_var.get() and self.attest_var.get():
-            self.eau_var.set(True)
-        # else:
-        #     self.eau_var.set(False)
-
-        self.preview.delete("1.0", tk.END)
-        self.preview.insert(tk.END, body)
-        self.preview.yview_moveto(scroll_pos[0])
-
-        # Betreff füllen
-        subject_template = load_file_text(TEMPLATE_SUBJECT_PATH, default="Krankmeldung EGOV 2025 {Datum} [{Vornamen} {Nachname}, {Matrikelnummer}]")
-        subject_filled = render_template(subject_template, {
-            "Datum": ctx.get("Datum"),
-            "Vornamen": ctx.get("Vornamen"),
-            "Nachname": ctx.get("Nachname"),
-            "Matrikelnummer": ctx.get("Matrikelnummer","")
-        })
+    def _render_body(self, ctx):
+        self._preview_sync.update(render_template(self.template_body, ctx))
 
-        # E-Mail-Adressen-Feld und Betreff-Feld aktualisieren
-        combined_emails = "; ".join(to_list + cc_list)
+    def _render_subject(self, ctx):
+        # Vorlage liegt im Speicher; bei Änderungen der Datei tauscht _on_file_changed sie aus
+        self._subject_sync.update(self._fill_subject(ctx))
 
-        self.text_emails.config(state="normal")
-        self.text_emails.delete("1.0", tk.END)
-        self.text_emails.insert(tk.END, combined_emails)
-        self.text_emails.config(state="disabled")
+    def _fill_subject(self, ctx):
+        return meldung.fill_subject(self.template_subject, ctx)
 
-        self.text_subject.config(state="normal")
-        self.text_subject.delete("1.0", tk.END)
-        self.text_subject.insert(tk.END, subject_filled)
-        self.text_subject.config(state="normal")
+    def _render_emails(self, ctx):
+        # Alle Anwender-Auswahlen im mittleren Panel, jede Adresse einmal (wie beim Versand)
+        to_list, cc_list = split_to_cc(self._selected_items())
 
+        self._emails_sync.update("; ".join(to_list + cc_list))
 
 
     def _load_template_from_file(self):
         path = filedialog.askopenfilename(title="Template (body) auswählen", filetypes=[("Text files","*.txt"),("All files","*.*")])
         if path:
-            self.template_body = load_file_text(path, default=self.template_body)
+            self.template_body = load_template(path, default=self.template_body.source)
+            # ab jetzt die gewählte Datei statt template.txt beobachten
+            self._watcher.unwatch(self._template_body_path)
+            self._template_body_path = path
+            self._watcher.watch(path)
+            self._configure_template_sections()
             self._update_preview()
 
     def _save_text_as_file(self):
@@ -764,69 +1281,139 @@ class KrankmeldungApp(tk.Tk):
                 messagebox.showerror("Fehler", f"Fehler beim Speichern der Datei:\n{e}")
 
 
+    def _choose_attachments(self):
+        paths = filedialog.askopenfilenames(title="Attest/eAU auswählen",
+                                            filetypes=[("Bilder und PDF", "*.jpg *.jpeg *.png *.heic *.webp *.pdf"),
+                                                       ("All files", "*.*")])
+        if not paths:
+            return
+        self.attest_var.set(True)
+        self._on_option_toggle()
+        self._anhaenge = []
+        self._anhang_future = attachments.submit(paths)
+        self.anhang_label.config(text=f"{len(paths)} Datei(en) werden aufbereitet…")
+        self.after(100, self._poll_attachment, self._anhang_future)
+
+    def _poll_attachment(self, future):
+        if future is not self._anhang_future:
+            return  # inzwischen entfernt oder neu gewählt
+        if not future.done():
+            self.after(100, self._poll_attachment, future)
+            return
+        self._anhang_future = None
+        send_now, self._senden_nach_anhang = self._senden_nach_anhang, None
+        try:
+            self._anhaenge = future.result()
+        except Exception as e:
+            instrumentation.count("errors", operation="attachment")
+            self._anhaenge = []
+            self.anhang_label.config(text="Kein Anhang")
+            messagebox.showerror("Fehler", f"Anhang konnte nicht aufbereitet werden:\n{e}")
+            return
+        self.anhang_label.config(text=attachments.describe(self._anhaenge))
+        if send_now is not None:
+            self._prepare_emails(send_now)
+
+    def _clear_attachments(self):
+        if self._anhang_future is not None:
+            self._anhang_future.cancel()
+        self._anhang_future = None
+        self._senden_nach_anhang = None
+        self._anhaenge = []
+        self.anhang_label.config(text="Kein Anhang")
+
+    def _outbox_worker(self):
+        if self._outbox is None:
+            from outbox import OutboxWorker
+            self._outbox = OutboxWorker(self.storage)
+            self._outbox.start()
+            self.after(OUTBOX_POLL_MS, self._poll_outbox)
+        return self._outbox
+
+    def _poll_outbox(self):
+        events = self._outbox.events()
+        for art, entry_id, text in events:
+            if art == "fehlgeschlagen":
+                messagebox.showerror("Postausgang", f"Eine E-Mail konnte nicht gesendet werden:\n{text}\n\n"
+                                                   "Sie bleibt in daten.db und kann erneut gesendet werden.")
+            elif art == "erneut":
+                print("Postausgang:", text)
+        if events:
+            self._update_outbox_label()
+        self.after(OUTBOX_POLL_MS, self._poll_outbox)
+
+    def _update_outbox_label(self):
+        counts = self.storage.outbox_counts()
+        offen, gescheitert = counts.get("offen", 0), counts.get("fehlgeschlagen", 0)
+        teile = []
+        if offen:
+            teile.append(f"{offen} im Postausgang")
+        if gescheitert:
+            teile.append(f"{gescheitert} gescheitert")
+        self.outbox_label.config(text=", ".join(teile))
+        if gescheitert:
+            self.outbox_retry_button.grid(row=1, column=0, sticky="e", padx=6, pady=(4, 0))
+        else:
+            self.outbox_retry_button.grid_remove()
+
+    def _retry_outbox(self):
+        if self.storage.retry_outbox():
+            self._outbox_worker().wake()
+        self._update_outbox_label()
+
+    def _send_via_outbox(self, to_list, cc_list, subject, body, sender_email):
+        """Sofortversand: Nachricht in den Postausgang, der Arbeits-Thread verschickt sie.
+
+        Liefert False, wenn dieselbe Nachricht schon eingestellt war und nicht erneut gesendet werden soll.
+        """
+        import outbox
+        message = {
+            "to": to_list,
+            "cc": cc_list,
+            "subject": subject,
+            "body": body,
+            "sender": sender_email,
+            "attachments": list(self._anhaenge),
+        }
+        if not any(neu for _id, neu in outbox.enqueue(self.storage, message)):
+            if not messagebox.askyesno("Schon im Postausgang",
+                                       "Genau diese E-Mail wurde bereits in den Postausgang gelegt oder "
+                                       "gesendet. Noch einmal senden?"):
+                return False
+            outbox.enqueue(self.storage, message, erneut=True)
+        self._outbox_worker().wake()
+        self._update_outbox_label()
+        return True
+
     def _prepare_emails(self, send_now=False):
+        if self._anhang_future is not None:
+            # Anhang wird noch aufbereitet: erstellt wird, sobald er fertig ist (siehe _poll_attachment)
+            self._senden_nach_anhang = send_now
+            self.anhang_label.config(text="Anhang wird aufbereitet – E-Mail folgt…")
+            return
         # initial_anrede = "Sehr geehrte Damen und Herren vom ZPD"
-        if self.template_body is not None:
-            self.template_body = self.template_body.replace("{anrede}", anrede)
 
         self.update_idletasks()  # alle GUI-Ereignisse abarbeiten
         self._update_preview()  # Kontext inkl. Empfängerliste neu generieren
 
 
-        ctx = self._gather_context()
+        ctx = dict(self._preview.context)
 
-        empfaenger_greetings = []
-        for anrede, var in self.prof_vars.items():
-            if var.get():
-                empfaenger_greetings.append(anrede.strip())
+        # Alle markierten Empfänger aus self.selection ermitteln (Dateireihenfolge)
+        selected = self._selected_items()
 
-        greeting_text = generate_anreden(empfaenger_greetings)
+        greeting_text = generate_anreden([g.anrede for g in selected])
         ctx["empfаenger"] = greeting_text
 
         body = render_template(self.template_body, ctx)
 
+        # Erster markierter Empfänger ist Hauptempfänger (TO), alle weiteren kommen in CC
+        to_list, cc_list = split_to_cc(selected)
 
-
-        to_list = []
-        cc_list = []
-
-        # Alle markierten Empfänger aus self.prof_vars ermitteln
-        selected = [a for a, v in self.prof_vars.items() if v.get()]
-
-        if selected:
-            # Erster markierter Empfänger ist Hauptempfänger (TO)
-            first = selected[0]
-            first_obj = next((g for g in self.greeting_items if g["anrede"] == first), None)
-            if first_obj and first_obj.get("email"):
-                to_list.append(first_obj["email"])
-
-            # Alle weiteren markierten Empfänger kommen in CC
-            for a in selected[1:]:
-                g = next((g for g in self.greeting_items if g["anrede"] == a), None)
-                if g and g.get("email"):
-                    cc_list.append(g["email"])
-
-
-
-        subject = load_file_text(TEMPLATE_SUBJECT_PATH, default="Krankmeldung EGOV 2025 {Datum} [{Vornamen} {Nachname}, {Matrikelnummer}]")
-        subject_filled = render_template(subject, {
-            "Datum": ctx.get("Datum"),
-            "Vornamen": ctx.get("Vornamen"),
-            "Nachname": ctx.get("Nachname"),
-            "Matrikelnummer": ctx.get("Matrikelnummer","")
-        })
-
-        # Textfelder aktualisieren (nur zum Kopieren, nicht editierbar)
-        combined_emails = "; ".join(to_list + cc_list)
-        self.text_emails.config(state="normal")
-        self.text_emails.delete("1.0", tk.END)
-        self.text_emails.insert(tk.END, combined_emails)
-        self.text_emails.config(state="disabled")
-
-        self.text_subject.config(state="normal")
-        self.text_subject.delete("1.0", tk.END)
-        self.text_subject.insert(tk.END, subject_filled)
-        self.text_subject.config(state="normal")
+        # Textfelder aktualisieren; ein vom Nutzer bearbeiteter Betreff wird so verschickt, wie er dasteht
+        self._emails_sync.update("; ".join(to_list + cc_list))
+        self._subject_sync.update(self._fill_subject(ctx))
+        subject_filled = self._subject_sync.get().strip()
 
 
         sender_email = self.entry_sender_email.get().strip() or None
@@ -836,31 +1423,70 @@ class KrankmeldungApp(tk.Tk):
                 return
 
         try:
-            create_outlook_mail(to_list, cc_list, subject_filled, body, sender_email=sender_email, send_now=send_now)
-            messagebox.showinfo("Fertig", "E-Mail als Entwurf erstellt." if not send_now else "E-Mail wurde gesendet.")
+            if send_now:
+                # Scheitert der Versand, bleibt die Nachricht im Postausgang und wird wiederholt
+                if not self._send_via_outbox(to_list, cc_list, subject_filled, body, sender_email):
+                    return
+                messagebox.showinfo("Fertig", "E-Mail liegt im Postausgang und wird im Hintergrund gesendet.")
+            else:
+                send_mail(to_list, cc_list, subject_filled, body, sender_email=sender_email, send_now=send_now,
+                          attachments=self._anhaenge)
+                messagebox.showinfo("Fertig", "E-Mail als Entwurf erstellt.")
         except Exception as e:
+            instrumentation.count("errors", operation="send_mail")
             messagebox.showerror("Fehler", f"Fehler beim Erstellen/Senden der E-Mail:\n{e}")
 
 
-def create_outlook_mail(to_addresses, cc_addresses, subject, body, sender_email=None, send_now=False):
-    outlook = win32.Dispatch('outlook.application')
-    mail = outlook.CreateItem(0)
-    mail.To = ";".join(to_addresses) if isinstance(to_addresses, (list,tuple)) else to_addresses or ""
-    mail.CC = ";".join(cc_addresses) if cc_addresses else ""
-    mail.Subject = subject
-    mail.Body = body
-    if sender_email:
-        accounts = outlook.Session.Accounts
-        for account in accounts:
-            if account.SmtpAddress.lower() == sender_email.lower():
-                mail._oleobj_.Invoke(*(64209, 0, 8, 0, account))
-                break
-    if send_now:
-        mail.Send()
-    else:
-        mail.Save()
-        mail.Display()
+@timed("create_outlook_mail")
+def create_outlook_mail(to_addresses, cc_addresses, subject, body, sender_email=None, send_now=False,
+                        attachments=None):
+    """Legt die Nachricht in Outlook an (Entwurf) oder verschickt sie direkt; ``attachments`` sind Dateipfade."""
+    from transport import get_transport
+    get_transport("outlook").send({
+        "to": to_addresses if isinstance(to_addresses, (list, tuple)) else [a for a in [to_addresses] if a],
+        "cc": list(cc_addresses or []),
+        "subject": subject,
+        "body": body,
+        "sender": sender_email,
+        "attachments": list(attachments or []),
+    }, send_now=send_now)
+
+
+@timed("send_mail")
+def send_mail(to_addresses, cc_addresses, subject, body, sender_email=None, send_now=False, attachments=None):
+    """Entwürfe gehen immer über Outlook; sofortiger Versand über den eingestellten Versandweg."""
+    from transport import get_transport
+    transport = get_transport() if send_now else get_transport("outlook")
+    transport.send({
+        "to": list(to_addresses),
+        "cc": list(cc_addresses or []),
+        "subject": subject,
+        "body": body,
+        "sender": sender_email,
+        "attachments": list(attachments or []),
+    }, send_now=send_now)
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        # Stapelbetrieb ohne Fenster: python main.py batch eingabe.csv -o ausgabe.jsonl
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        # Verlauf oder Stapel-CSV als mbox/.eml: python main.py export -o archiv.mbox
+        import mail_export
+        sys.exit(mail_export.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "digest":
+        # eine Sammelnachricht pro Empfänger und Tag: python main.py digest meldungen.csv -o sammel.jsonl
+        import digest
+        sys.exit(digest.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        # Auswertung des Verlaufs: python main.py stats --semester 2026S
+        import statistik
+        sys.exit(statistik.main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        # lokaler HTTP/JSON-Dienst für mehrere Terminals: python main.py serve --port 8765
+        import service
+        sys.exit(service.main(sys.argv[2:]))
     app = KrankmeldungApp()
     app.mainloop()
@@ -0,0 +1,139 @@
+"""Regeln für den Inhalt einer Meldung – ohne Tk, damit GUI, Stapelbetrieb und Dienste dieselben nutzen.
+
+Jede ``ctx_*``-Funktion liefert nur die Platzhalter, die von ihrer Eingabe abhängen
+(siehe ``KrankmeldungApp.CONTEXT_KEYS``); ``build_context`` setzt alles zusammen.
+"""
+import datetime
+
+from empfaenger import split_to_cc
+from template_engine import render_template
+
+DEFAULT_SUBJECT = "Krankmeldung EGOV 2025 {Datum} [{Vornamen} {Nachname}, {Matrikelnummer}]"
+# Platzhalter, die im Betreff ersetzt werden
+SUBJECT_KEYS = ("Datum", "Vornamen", "Nachname", "Matrikelnummer")
+
+# Felder einer Meldung, wie sie aus der GUI, aus daten.db oder aus einer Stapel-Datei kommen
+REPORT_DEFAULTS = {
+    "vorname": "", "nachname": "", "matrikelnummer": "", "studiengang": "",
+    "datum": "", "datum_gesund": "", "art": "Krankmeldung", "bemerkung": "",
+    "attest": False, "eau": False, "gkv": False, "unfall": False, "pruefungstag": False,
+    "bemerkung_1": False, "bemerkung_2": False, "bemerkung_3": False,
+}
+
+
+def heute():
+    return datetime.datetime.now().strftime("%d.%m.%Y")
+
+
+def generate_anreden(anrede_list):
+    """Erzeugt die Begrüßungszeilen genau aus der Anrede-Spalte, fügt Komma an falls nötig.
+
+    Jede Anrede nur einmal (z. B. eine Dozentin mit zwei ausgewählten Modulen), in der Reihenfolge der Auswahl.
+    """
+    lines = []
+    for a in anrede_list:
+        line = a.strip()
+        # if not line.endswith(","):
+        #     line += ","
+        lines.append(line)
+    return ",\n".join(dict.fromkeys(lines))
+
+
+def greeting_for(items):
+    """Begrüßung aus den Anreden der ausgewählten Empfänger; erster Eintrag beginnt groß."""
+    anreden_auswahl = list(dict.fromkeys(item.anrede.strip() for item in items))
+    if anreden_auswahl:
+        s = anreden_auswahl[0]
+        anreden_auswahl[0] = s[0].upper() + s[1:] if s else s
+    return generate_anreden(anreden_auswahl)
+
+
+def ctx_name(vorname, nachname, studiengang=""):
+    name_field = f"{vorname} {nachname}".strip()
+    name_str = f"Name: {name_field}" if vorname else f"Name:{name_field}"
+    return {
+        "vorname": vorname or "Vorname",
+        "nachname": nachname or "Nachname",
+        "Vornamen": vorname or "Vorname",
+        "Nachname": nachname or "Nachname",
+        "namefield": name_str,
+        "studiengang": studiengang,
+    }
+
+
+def ctx_datum(datum):
+    return {"Datum": datum or heute(), "DatumKrank": datum}
+
+
+def ctx_datum_2(datum_2):
+    return {"DatumGesund": datum_2, "Datum2": datum_2}
+
+
+def ctx_matrikel(matrikel):
+    return {"Matrikelnummer": matrikel or ""}
+
+
+def ctx_meldung(art):
+    return {
+        "art": art,
+        "krankmeldung": "x" if art == "Krankmeldung" else "",
+        "gesundmeldung": "x" if art == "Gesundmeldung" else "",
+    }
+
+
+def ctx_bemerkung(bemerkung, bemerkung_1=False, bemerkung_2=False, bemerkung_3=False):
+    return {
+        "bemerkung": bemerkung or "",
+        "bemerkung_1": "x" if bemerkung_1 else "",
+        "bemerkung_2": "x" if bemerkung_2 else "",
+        "bemerkung_3": "x" if bemerkung_3 else "",
+    }
+
+
+def effective_eau(eau, gkv, attest):
+    # automatische Setzung von eAU wenn GKV UND Attest gesetzt wurden
+    return bool(eau or (gkv and attest))
+
+
+def ctx_optionen(attest, eau, unfall):
+    return {
+        "attest": "ja" if attest else "nein",
+        "eAU": "ja" if eau else "nein",
+        "unfall": "ja" if unfall else "nein",
+    }
+
+
+def ctx_pruefungstag(pruefungstag):
+    return {"prüfungstag": "ja" if pruefungstag else "nein"}
+
+
+def build_context(report, items=()):
+    """Kompletter Vorlagen-Kontext für eine Meldung (dict mit Schlüsseln aus REPORT_DEFAULTS)."""
+    r = dict(REPORT_DEFAULTS, **report)
+    ctx = {}
+    ctx.update(ctx_name(r["vorname"], r["nachname"], r["studiengang"]))
+    ctx.update(ctx_datum(r["datum"]))
+    ctx.update(ctx_datum_2(r["datum_gesund"]))
+    ctx.update(ctx_matrikel(r["matrikelnummer"]))
+    ctx.update(ctx_meldung(r["art"]))
+    ctx.update(ctx_bemerkung(r["bemerkung"], r["bemerkung_1"], r["bemerkung_2"], r["bemerkung_3"]))
+    ctx.update(ctx_optionen(r["attest"], effective_eau(r["eau"], r["gkv"], r["attest"]), r["unfall"]))
+    ctx.update(ctx_pruefungstag(r["pruefungstag"]))
+    ctx["anrede"] = greeting_for(items)
+    return ctx
+
+
+def fill_subject(template_subject, ctx):
+    return render_template(template_subject, {key: ctx.get(key, "") for key in SUBJECT_KEYS})
+
+
+def prepare_message(report, items, template_body, template_subject):
+    """Fertige Nachricht für eine Meldung: TO/CC, Betreff und Text wie in ``_prepare_emails``."""
+    ctx = build_context(report, items)
+    to_list, cc_list = split_to_cc(items)
+    return {
+        "to": to_list,
+        "cc": cc_list,
+        "subject": fill_subject(template_subject, ctx),
+        "body": render_template(template_body, ctx),
+    }
@@ -0,0 +1,262 @@
+"""Postausgang: vorbereitete Nachrichten bleiben in daten.db, bis sie wirklich verschickt sind.
+
+``enqueue`` legt eine Nachricht in der Tabelle ``outbox`` ab (siehe storage.py) und kehrt
+sofort zurück; ein ``OutboxWorker`` im Hintergrund verschickt sie. Schlägt ein Versuch fehl,
+wird er mit wachsendem Abstand wiederholt (``BASIS_S``, verdoppelt bis ``MAX_S``); erst nach
+``MAX_VERSUCHE`` oder bei einer endgültigen Ablehnung (SMTP 5xx) gilt die Nachricht als
+gescheitert. Was beim Beenden noch offen ist, geht beim nächsten Start raus.
+
+* Ratenlimit: höchstens ``KRANKOMAT_MAILS_PRO_MINUTE`` Nachrichten je Minute.
+* Empfängerlimit: Nachrichten mit mehr als ``KRANKOMAT_MAX_EMPFAENGER`` Adressen (TO + CC)
+  werden auf mehrere Nachrichten aufgeteilt.
+* Idempotenz: Jede Nachricht hat einen Schlüssel (Standard: Hash über Inhalt und Empfänger).
+  Dieselbe Nachricht ein zweites Mal einzustellen – Doppelklick, Neustart – legt nichts Neues
+  an; ``enqueue`` meldet das dem Aufrufer. Wer bewusst noch einmal senden will, gibt
+  ``erneut=True`` an. Aus dem Schlüssel entsteht auch die Message-ID, sodass eine nach einem
+  Absturz doppelt zugestellte Nachricht beim Empfänger als dieselbe erkennbar ist.
+
+Zum Testen ohne Mailserver ``KRANKOMAT_TRANSPORT=recording`` setzen (siehe transport.py).
+"""
+import collections
+import datetime
+import hashlib
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+
+import instrumentation
+
+MAX_EMPFAENGER = int(os.environ.get("KRANKOMAT_MAX_EMPFAENGER", "50"))
+MAILS_PRO_MINUTE = int(os.environ.get("KRANKOMAT_MAILS_PRO_MINUTE", "30"))
+BASIS_S = 15
+MAX_S = 30 * 60
+MAX_VERSUCHE = 10
+# So lange gilt eine gerade versandte Nachricht als reserviert (siehe Storage.claim_outbox)
+RESERVIERUNG_S = 10 * 60
+# Längste Pause des Arbeits-Threads ohne fällige Nachricht
+LEERLAUF_S = 60
+
+NACHRICHT_FELDER = ("to", "cc", "subject", "body", "sender", "attachments")
+
+
+def message_key(message):
+    """Schlüssel einer Nachricht: gleicher Inhalt und gleiche Empfänger ergeben denselben Schlüssel."""
+    data = {field: message.get(field) or None for field in NACHRICHT_FELDER}
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def split_recipients(to, cc, limit=MAX_EMPFAENGER):
+    """Teilt TO und CC auf Nachrichten mit je höchstens ``limit`` Adressen auf; liefert ``[(to, cc)]``.
+
+    Die Rollen bleiben erhalten, TO-Adressen kommen zuerst.
+    """
+    to = list(to or [])
+    cc = list(cc or [])
+    if limit is None or limit <= 0 or len(to) + len(cc) <= limit:
+        return [(to, cc)]
+    adressen = [("to", a) for a in to] + [("cc", a) for a in cc]
+    teile = []
+    for start in range(0, len(adressen), limit):
+        teil = adressen[start:start + limit]
+        teile.append(([a for rolle, a in teil if rolle == "to"], [a for rolle, a in teil if rolle == "cc"]))
+    return teile
+
+
+def enqueue(storage, message, transport=None, key=None, limit=MAX_EMPFAENGER, erneut=False):
+    """Stellt eine Nachricht (dict wie in transport.py) in den Postausgang.
+
+    Liefert je Teil ``(id, neu)``; ``neu`` ist False, wenn dieselbe Nachricht schon im Postausgang
+    liegt oder verschickt wurde. ``erneut=True`` stellt sie trotzdem noch einmal ein. Zu viele
+    Empfänger ergeben mehrere Einträge mit den Schlüsseln ``<key>/1``, ``<key>/2`` …
+    """
+    from transport import transport_name
+    if not message.get("to") and not message.get("cc"):
+        raise ValueError("Nachricht ohne Empfänger")
+    name = transport_name(transport)
+    key = key or message_key(message)
+    if erneut:
+        key = f"{key}-{datetime.datetime.now():%Y%m%d%H%M%S%f}"
+    teile = split_recipients(message.get("to"), message.get("cc"), limit)
+    entries = []
+    for n, (to, cc) in enumerate(teile, start=1):
+        teil_key = key if len(teile) == 1 else f"{key}/{n}"
+        nachricht = {field: message.get(field) for field in NACHRICHT_FELDER}
+        nachricht.update(to=to, cc=cc, message_id=f"<{teil_key.replace('/', '.')}@krankomat.local>")
+        entries.append((teil_key, name, json.dumps(nachricht, ensure_ascii=False)))
+    result = storage.enqueue_outbox(entries)
+    instrumentation.count("outbox_enqueued", sum(1 for _id, neu in result if neu))
+    return result
+
+
+def backoff(versuche, basis_s=BASIS_S, max_s=MAX_S):
+    """Wartezeit vor dem nächsten Versuch, nachdem ``versuche`` Versuche gescheitert sind."""
+    return min(max_s, basis_s * 2 ** max(0, versuche - 1))
+
+
+def is_permanent(error):
+    """Lohnt sich ein weiterer Versuch nicht? (abgelehnt mit 5xx, Konfigurations- oder Dateifehler)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Ohne Empfänger (leeres dict) kann die Nachricht nie zugestellt werden
+        codes = [reply[0] for reply in error.recipients.values()]
+        return all(500 <= code < 600 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return isinstance(error, (ValueError, ImportError, FileNotFoundError))
+
+
+class RateLimit:
+    """Gleitendes Fenster: höchstens ``anzahl`` Ereignisse je ``fenster_s`` Sekunden."""
+
+    def __init__(self, anzahl, fenster_s=60.0, clock=time.monotonic):
+        self.anzahl = anzahl
+        self.fenster_s = fenster_s
+        self.clock = clock
+        self._zeiten = collections.deque()
+
+    def pause(self):
+        """Sekunden bis zum nächsten freien Platz (0: sofort)."""
+        if not self.anzahl or self.anzahl <= 0:
+            return 0.0
+        now = self.clock()
+        while self._zeiten and now - self._zeiten[0] >= self.fenster_s:
+            self._zeiten.popleft()
+        if len(self._zeiten) < self.anzahl:
+            return 0.0
+        return self.fenster_s - (now - self._zeiten[0])
+
+    def frei(self):
+        """Freie Plätze im aktuellen Fenster."""
+        if not self.anzahl or self.anzahl <= 0:
+            return None
+        self.pause()
+        return self.anzahl - len(self._zeiten)
+
+    def belegen(self):
+        self._zeiten.append(self.clock())
+
+
+class OutboxWorker:
+    """Verschickt den Postausgang im Hintergrund.
+
+    Ereignisse für die GUI holt ``events()`` ab (wie ``FileWatcher.changes()``): Tupel
+    ``(art, id, text)`` mit ``art`` in ``gesendet``, ``erneut``, ``fehlgeschlagen``.
+    Ohne ``start()`` lässt sich der Postausgang mit ``drain()`` auch direkt (z. B. in Tests) leeren.
+    """
+
+    def __init__(self, storage, transport_factory=None, pro_minute=MAILS_PRO_MINUTE, basis_s=BASIS_S,
+                 max_s=MAX_S, max_versuche=MAX_VERSUCHE, now=datetime.datetime.now, clock=time.monotonic):
+        if transport_factory is None:
+            from transport import new_transport as transport_factory
+        self.storage = storage
+        self.transport_factory = transport_factory
+        self.rate = RateLimit(pro_minute, clock=clock)
+        self.basis_s = basis_s
+        self.max_s = max_s
+        self.max_versuche = max_versuche
+        self.now = now
+        self._transports = {}  # Name -> eigener Versandweg dieses Threads
+        self._events = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _iso(self, seconds=0):
+        return (self.now() + datetime.timedelta(seconds=seconds)).isoformat(timespec="seconds")
+
+    def _transport(self, name):
+        transport = self._transports.get(name)
+        if transport is None:
+            transport = self._transports[name] = self.transport_factory(name)
+        return transport
+
+    def _send(self, entry):
+        message = json.loads(entry["nachricht"])
+        versuche = entry["versuche"] + 1
+        try:
+            refused = self._transport(entry["transport"]).send(message, send_now=True)
+        except Exception as e:
+            instrumentation.count("errors", operation="outbox_send")
+            fehler = f"{type(e).__name__}: {e}"
+            if is_permanent(e) or versuche >= self.max_versuche:
+                self.storage.finish_outbox(entry["id"], "fehlgeschlagen", fehler)
+                self._events.put(("fehlgeschlagen", entry["id"], fehler))
+            else:
+                naechster = self._iso(backoff(versuche, self.basis_s, self.max_s))
+                self.storage.finish_outbox(entry["id"], "offen", fehler, naechster)
+                self._events.put(("erneut", entry["id"], f"{fehler} – neuer Versuch {naechster[11:]}"))
+            return
+        # Teilweise abgelehnte Empfänger (SMTP) festhalten, die Nachricht selbst ist raus
+        fehler = f"abgelehnt: {', '.join(sorted(refused))}" if refused else None
+        self.storage.finish_outbox(entry["id"], "gesendet", fehler)
+        instrumentation.count("outbox_sent")
+        self._events.put(("gesendet", entry["id"], fehler or ""))
+
+    def drain(self):
+        """Verschickt alle fälligen Nachrichten, soweit das Ratenlimit reicht.
+
+        Liefert die Sekunden bis zum nächsten möglichen Versand oder None, wenn nichts mehr offen ist.
+        """
+        while not self._stop.is_set():
+            pause = self.rate.pause()
+            if pause > 0:
+                return pause
+            frei = self.rate.frei()
+            entries = self.storage.claim_outbox(self._iso(), self._iso(RESERVIERUNG_S), frei or 50)
+            if not entries:
+                break
+            for entry in entries:
+                if self._stop.is_set():
+                    # Reservierung läuft ab, der nächste Start holt den Rest
+                    return None
+                self.rate.belegen()
+                self._send(entry)
+        due = self.storage.next_outbox_due()
+        if due is None:
+            return None
+        return max(0.0, (datetime.datetime.fromisoformat(due) - self.now()).total_seconds())
+
+    def events(self):
+        result = []
+        while True:
+            try:
+                result.append(self._events.get_nowait())
+            except queue.Empty:
+                return result
+
+    def wake(self):
+        """Nach ``enqueue`` aufrufen, damit neue Nachrichten sofort rausgehen."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="krankomat-postausgang", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                pause = self.drain()
+            except Exception as e:
+                instrumentation.count("errors", operation="outbox")
+                print("Fehler im Postausgang:", e)
+                pause = self.basis_s
+            self._wake.wait(LEERLAUF_S if pause is None else min(pause, LEERLAUF_S))
+            self._wake.clear()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        for transport in self._transports.values():
+            try:
+                transport.close()
+            except Exception as e:
+                print("Fehler beim Schließen des Versandwegs:", e)
+        self._transports = {}
@@ -0,0 +1,101 @@
+"""Profile mehrerer Studierender für gemeinsam genutzte Terminals, mit Präfix-Index für die Autovervollständigung.
+
+Ein Profil gehört zu einer Matrikelnummer und hält Vorname, Nachname, Absender-E-Mail und
+Studiengang. Gespeichert wird in daten.db (Tabelle ``profile``, siehe storage.py); im Speicher
+liegt je Feld ein sortiertes Array ``(Schlüssel, Matrikelnummer)``. Eine Präfix-Suche ist damit
+ein ``bisect`` plus so viele Schritte, wie Treffer gebraucht werden – auch bei zehntausenden
+Profilen ohne spürbare Verzögerung.
+"""
+import bisect
+import sys
+import unicodedata
+
+# Felder, über die gesucht werden kann
+FELDER = ("vorname", "nachname", "matrikelnummer")
+
+
+def normalize(text):
+    """Suchschlüssel: ohne Groß-/Kleinschreibung und Akzente, ß/ä/ö/ü wie ss/a/o/u."""
+    text = (text or "").strip()
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class Profile:
+    __slots__ = ("matrikelnummer", "vorname", "nachname", "email", "studiengang")
+
+    def __init__(self, matrikelnummer, vorname="", nachname="", email="", studiengang=""):
+        self.matrikelnummer = matrikelnummer
+        self.vorname = sys.intern(vorname or "")
+        self.nachname = sys.intern(nachname or "")
+        self.email = email or ""
+        self.studiengang = sys.intern(studiengang or "")
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row["matrikelnummer"], row["vorname"], row["nachname"], row["email"], row["studiengang"])
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def label(self):
+        name = ", ".join(p for p in (self.nachname, self.vorname) if p)
+        return f"{name} ({self.matrikelnummer})" if name else self.matrikelnummer
+
+
+class ProfileIndex:
+    """Profile nach Matrikelnummer plus je Suchfeld ein sortiertes ``[(schlüssel, matrikel)]``."""
+
+    def __init__(self, profiles=()):
+        self._by_matrikel = {}
+        self._keys = {feld: [] for feld in FELDER}
+        for profile in profiles:
+            if profile.matrikelnummer:
+                self._by_matrikel[profile.matrikelnummer] = profile
+        # Einmal sortieren statt zehntausendmal einfügen
+        for feld, keys in self._keys.items():
+            keys.extend((normalize(getattr(p, feld)), m) for m, p in self._by_matrikel.items()
+                        if getattr(p, feld))
+            keys.sort()
+
+    def __len__(self):
+        return len(self._by_matrikel)
+
+    def get(self, matrikelnummer):
+        return self._by_matrikel.get((matrikelnummer or "").strip())
+
+    def add(self, profile):
+        """Fügt ein Profil ein oder ersetzt das zur selben Matrikelnummer (O(log n) Suche je Feld)."""
+        if not profile.matrikelnummer:
+            return
+        old = self._by_matrikel.get(profile.matrikelnummer)
+        for feld, keys in self._keys.items():
+            if old is not None and getattr(old, feld):
+                entry = (normalize(getattr(old, feld)), old.matrikelnummer)
+                i = bisect.bisect_left(keys, entry)
+                if i < len(keys) and keys[i] == entry:
+                    del keys[i]
+            if getattr(profile, feld):
+                bisect.insort(keys, (normalize(getattr(profile, feld)), profile.matrikelnummer))
+        self._by_matrikel[profile.matrikelnummer] = profile
+
+    def complete(self, feld, prefix, limit=8):
+        """Profile, deren ``feld`` mit ``prefix`` beginnt, sortiert nach diesem Feld."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        keys = self._keys[feld]
+        result = []
+        for i in range(bisect.bisect_left(keys, (prefix,)), len(keys)):
+            key, matrikel = keys[i]
+            if not key.startswith(prefix) or len(result) >= limit:
+                break
+            result.append(self._by_matrikel[matrikel])
+        return result
+
+
+def load_profiles(storage):
+    """Alle Profile aus daten.db als ``ProfileIndex``."""
+    return ProfileIndex(Profile.from_row(row) for row in storage.iter_profiles())
@@ -0,0 +1,178 @@
+"""Semesterkalender.txt einmal einlesen und beliebige Tage oder Zeiträume schnell einordnen.
+
+Format je Zeile: ``Art;Von;Bis;Bezeichnung`` (``Bis`` und ``Bezeichnung`` optional, Datum als
+TT.MM.JJJJ, ``#`` leitet Kommentare ein). Arten:
+
+    Vorlesungszeit          -> vorlesung
+    Prüfung / Prüfungszeit  -> pruefung
+    Berufspraxis            -> berufspraxis
+    Ferien / Feiertag / vorlesungsfrei -> frei
+
+Überlappen sich Einträge, gilt Prüfung vor frei vor Berufspraxis vor Vorlesung. Tage ohne
+Eintrag sowie Wochenenden (außer Prüfungstage) sind frei. Vor dem ersten und nach dem letzten
+Eintrag weiß der Kalender nichts; ob ein Zeitraum darin liegt, sagt ``umfasst``. Die Einträge werden beim Einlesen
+zu einer sortierten Folge disjunkter Abschnitte zusammengefasst; ein Tag wird per bisect
+in O(log n) eingeordnet, ein Zeitraum in O(log n + Abschnitte im Zeitraum).
+"""
+import bisect
+import datetime
+
+from template_engine import file_stamp
+
+VORLESUNG = "vorlesung"
+PRUEFUNG = "pruefung"
+BERUFSPRAXIS = "berufspraxis"
+FREI = "frei"
+
+# Rang bei Überlappung: höher gewinnt
+_RANG = {VORLESUNG: 1, BERUFSPRAXIS: 2, FREI: 3, PRUEFUNG: 4}
+_ARTEN = {
+    "vorlesungszeit": VORLESUNG,
+    "vorlesung": VORLESUNG,
+    "prüfung": PRUEFUNG,
+    "prüfungen": PRUEFUNG,
+    "prüfungszeit": PRUEFUNG,
+    "pruefung": PRUEFUNG,
+    "berufspraxis": BERUFSPRAXIS,
+    "praxisphase": BERUFSPRAXIS,
+    "ferien": FREI,
+    "feiertag": FREI,
+    "vorlesungsfrei": FREI,
+    "frei": FREI,
+}
+
+
+def parse_datum(text):
+    """TT.MM.JJJJ -> date; leer oder ungültig -> None."""
+    try:
+        return datetime.datetime.strptime((text or "").strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def semester_von(datum):
+    """Semester eines Tages als sortierbares Kürzel: ``2026S`` (1.3.–31.8.), ``2026W`` (1.9.–Ende Februar)."""
+    if 3 <= datum.month <= 8:
+        return f"{datum.year}S"
+    return f"{datum.year if datum.month >= 9 else datum.year - 1}W"
+
+
+def semester_bezeichnung(kuerzel):
+    """``2026S`` -> ``SoSe 2026``, ``2025W`` -> ``WiSe 2025/26``; unbekannte Kürzel unverändert."""
+    if len(kuerzel) == 5 and kuerzel[:4].isdigit() and kuerzel[4] in "SW":
+        jahr = int(kuerzel[:4])
+        return f"SoSe {jahr}" if kuerzel[4] == "S" else f"WiSe {jahr}/{(jahr + 1) % 100:02d}"
+    return kuerzel or "ohne Datum"
+
+
+class Semesterkalender:
+    """Disjunkte Abschnitte ``[starts[i], starts[i+1])`` (als Tagesordinal) mit je einer Art."""
+
+    def __init__(self, eintraege=()):
+        # eintraege: (art, von, bis) mit date-Werten, bis einschließlich
+        self.eintraege = list(eintraege)
+        self._starts, self._arten = self._abschnitte(self.eintraege)
+
+    @classmethod
+    def parse(cls, lines):
+        eintraege = []
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = [p.strip() for p in line.split(";")]
+            art = _ARTEN.get(parts[0].lower())
+            von = parse_datum(parts[1]) if len(parts) > 1 else None
+            if art is None or von is None:
+                continue
+            bis = (parse_datum(parts[2]) if len(parts) > 2 else None) or von
+            if bis < von:
+                von, bis = bis, von
+            eintraege.append((art, von, bis))
+        return cls(eintraege)
+
+    @staticmethod
+    def _abschnitte(eintraege):
+        # Alle Grenzen sammeln, dann jeden Elementarabschnitt der ranghöchsten überdeckenden Art zuordnen
+        grenzen = sorted({g for _, von, bis in eintraege for g in (von.toordinal(), bis.toordinal() + 1)})
+        offen = {}  # grenze -> [(rang, +1/-1)]
+        for art, von, bis in eintraege:
+            offen.setdefault(von.toordinal(), []).append((_RANG[art], 1))
+            offen.setdefault(bis.toordinal() + 1, []).append((_RANG[art], -1))
+        aktiv = [0] * (max(_RANG.values()) + 1)
+        nach_rang = {rang: art for art, rang in _RANG.items()}
+        starts, arten = [], []
+        for grenze in grenzen:
+            for rang, delta in offen[grenze]:
+                aktiv[rang] += delta
+            rang = next((r for r in range(len(aktiv) - 1, 0, -1) if aktiv[r]), 0)
+            art = nach_rang.get(rang)
+            if arten and arten[-1] == art:
+                continue
+            starts.append(grenze)
+            arten.append(art)
+        return starts, arten
+
+    def _art_im_abschnitt(self, ordinal):
+        i = bisect.bisect_right(self._starts, ordinal) - 1
+        return self._arten[i] if i >= 0 else None
+
+    def art(self, datum):
+        """Art eines einzelnen Tages."""
+        art = self._art_im_abschnitt(datum.toordinal())
+        if art is None or (art != PRUEFUNG and datum.weekday() >= 5):
+            return FREI
+        return art
+
+    def umfasst(self, start, ende=None):
+        """True, wenn ``start`` bis ``ende`` ganz zwischen erstem und letztem Kalendertag liegt."""
+        ende = ende if ende is not None and ende >= start else start
+        starts = self._starts
+        # starts[-1] ist der Tag nach dem Ende des letzten Eintrags
+        return bool(starts) and starts[0] <= start.toordinal() and ende.toordinal() < starts[-1]
+
+    def arten_im_zeitraum(self, start, ende=None):
+        """Menge der Arten aller Tage von ``start`` bis ``ende`` (einschließlich)."""
+        ende = ende if ende is not None and ende >= start else start
+        lo, hi = start.toordinal(), ende.toordinal()
+        starts, arten = self._starts, self._arten
+        gefunden = set()
+        i = bisect.bisect_right(starts, lo) - 1
+        if i < 0:
+            gefunden.add(FREI)
+            i = 0
+        while i < len(starts) and starts[i] <= hi:
+            von = max(lo, starts[i])
+            bis = min(hi, starts[i + 1] - 1) if i + 1 < len(starts) else hi
+            art = arten[i] or FREI
+            if art in (PRUEFUNG, FREI):
+                gefunden.add(art)
+            else:
+                # Vorlesung/Berufspraxis nur an Werktagen, Wochenenden darin sind frei
+                werktag = bis - von >= 2 or any(datetime.date.fromordinal(t).weekday() < 5
+                                                  for t in range(von, bis + 1))
+                wochenende = bis - von >= 6 or any(datetime.date.fromordinal(t).weekday() >= 5
+                                                     for t in range(von, bis + 1))
+                if werktag:
+                    gefunden.add(art)
+                if wochenende:
+                    gefunden.add(FREI)
+            i += 1
+        return gefunden
+
+
+_cache = {}
+
+
+def load_semesterkalender(path):
+    """Lädt Semesterkalender.txt, gecacht über Pfad und Änderungszeit. Fehlt die Datei: None."""
+    key = file_stamp(path)
+    if key is None:
+        return None
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        kalender = Semesterkalender.parse(f)
+    _cache[path] = (key, kalender)
+    return kalender
@@ -0,0 +1,288 @@
+"""Lokaler HTTP/JSON-Dienst: ein Krankomat für mehrere Terminals (z. B. im Studierendenbüro).
+
+Läuft auf asyncio mit einem kleinen HTTP/1.1-Server (Keep-Alive, nur ``Content-Length``-Bodies,
+keine Zusatzpakete). Vorlagen und Empfängerverzeichnis bleiben im Speicher; Rendern und
+Neueinlesen laufen in einem Thread-Pool, damit die Ereignisschleife nie blockiert.
+Ändern sich Vorlagen, Empfaenger.txt oder der Semesterkalender, wird im Hintergrund ein neuer
+Renderer gebaut und atomar ausgetauscht.
+
+Endpunkte (JSON rein, JSON raus)::
+
+    GET  /health
+    GET  /recipients?modul=...&offset=0&limit=500
+    POST /recipients/resolve  {"empfaenger": ["<ID, Anrede oder E-Mail>", ...]}
+    POST /context             {"vorname": ..., "datum": ..., "empfaenger": [...]}
+    POST /render              dieselbe Meldung oder eine Liste davon
+
+Felder einer Meldung wie ``meldung.REPORT_DEFAULTS``. Fehlt ``pruefungstag``, wird es aus dem
+Semesterkalender abgeleitet. Aufruf::
+
+    python main.py serve [--host 127.0.0.1] [--port 8765] [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+from batch import (EMPFAENGER_PATH, SEMESTERKALENDER_PATH, TEMPLATE_BODY_PATH, TEMPLATE_SUBJECT_PATH, Renderer,
+                   parse_flag)
+from empfaenger import split_to_cc
+from meldung import REPORT_DEFAULTS, build_context
+from watcher import FileWatcher
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1 << 20
+# Offene Verbindungen ohne Anfrage werden nach dieser Zeit geschlossen
+KEEPALIVE_S = 30.0
+RELOAD_CHECK_S = 1.0
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_report(payload, studiengang=""):
+    """JSON-Objekt -> (Meldung, Empfänger-Angaben, pruefungstag_ableiten)."""
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Meldung muss ein JSON-Objekt sein.")
+    report = {"studiengang": studiengang}
+    for field, default in REPORT_DEFAULTS.items():
+        if field not in payload:
+            continue
+        value = payload[field]
+        if not isinstance(default, bool):
+            report[field] = "" if value is None else str(value)
+        elif isinstance(value, bool):
+            report[field] = value
+        elif isinstance(value, str):
+            # wie die Ja/Nein-Spalten im Stapelbetrieb: "nein", "0", "false" sind falsch
+            report[field] = parse_flag(value)
+        else:
+            raise HttpError(400, f"{field} muss true/false oder ein Text wie \"ja\"/\"nein\" sein.")
+    tokens = payload.get("empfaenger") or []
+    if isinstance(tokens, str):
+        tokens = tokens.split(",")
+    tokens = [str(t).strip() for t in tokens if str(t).strip()]
+    return report, tokens, "pruefungstag" not in payload
+
+
+class RenderService:
+    """Hält einen Renderer im Speicher und beantwortet die Anfragen."""
+
+    def __init__(self, renderer_kwargs=None, workers=None):
+        self.renderer_kwargs = renderer_kwargs or {}
+        self.renderer = Renderer(**self.renderer_kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 2),
+                                            thread_name_prefix="krankomat-render")
+        kw = self.renderer_kwargs
+        self._watcher = FileWatcher([kw.get("body_path", TEMPLATE_BODY_PATH),
+                                     kw.get("subject_path", TEMPLATE_SUBJECT_PATH),
+                                     kw.get("empfaenger_path", EMPFAENGER_PATH),
+                                     kw.get("kalender_path", SEMESTERKALENDER_PATH) or SEMESTERKALENDER_PATH])
+        self._routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/recipients"): self.recipients,
+            ("POST", "/recipients/resolve"): self.resolve,
+            ("POST", "/context"): self.context,
+            ("POST", "/render"): self.render,
+        }
+
+    # ---- Endpunkte (laufen im Thread-Pool) ----
+
+    def health(self, query, payload):
+        return {"status": "ok", "empfaenger": len(self.renderer.directory),
+                "dateiueberwachung": self._watcher.backend}
+
+    def recipients(self, query, payload):
+        directory = self.renderer.directory
+        modul = query.get("modul", [""])[0]
+        items = directory.by_modul(modul) if modul else directory.items
+        try:
+            offset = max(0, int(query.get("offset", ["0"])[0]))
+            limit = max(0, int(query.get("limit", ["500"])[0]))
+        except ValueError:
+            raise HttpError(400, "offset und limit müssen Zahlen sein.")
+        return {"gesamt": len(items), "empfaenger": [item.as_dict() for item in items[offset:offset + limit]]}
+
+    def resolve(self, query, payload):
+        _, tokens, _ = parse_report(payload)
+        items, unknown = self.renderer.resolve(tokens)
+        to_list, cc_list = split_to_cc(items)
+        return {"empfaenger": [item.as_dict() for item in items], "to": to_list, "cc": cc_list,
+                "unbekannt": unknown}
+
+    def context(self, query, payload):
+        renderer = self.renderer
+        report, tokens, ableiten = parse_report(payload, renderer.studiengang)
+        items, unknown = renderer.resolve(tokens)
+        result = {}
+        tagesarten = renderer.tagesarten(report, ableiten)
+        if tagesarten is not None:
+            result["tagesarten"] = tagesarten
+        result["context"] = build_context(report, items)
+        if unknown:
+            result["unbekannt"] = unknown
+        return result
+
+    def render(self, query, payload):
+        renderer = self.renderer
+        if isinstance(payload, list):
+            return [renderer.render_report(*parse_report(p, renderer.studiengang)) for p in payload]
+        return renderer.render_report(*parse_report(payload, renderer.studiengang))
+
+    # ---- HTTP ----
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        handler = self._routes.get((method, path))
+        if handler is None:
+            if any(p == path for _, p in self._routes):
+                raise HttpError(405, f"{method} ist für {path} nicht erlaubt.")
+            raise HttpError(404, f"Unbekannter Pfad: {path}")
+        payload = None
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError as e:
+                raise HttpError(400, f"Ungültiges JSON: {e}")
+        elif method == "POST":
+            raise HttpError(400, "Leerer Body.")
+        instrumentation.count("service_requests", path=path)
+        loop = asyncio.get_running_loop()
+        with instrumentation.span("service_request"):
+            return await loop.run_in_executor(self._executor, handler, parse_qs(url.query), payload)
+
+    async def _read_request(self, reader):
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_S)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Ungültige Anfragezeile.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "Nur Bodies mit Content-Length werden unterstützt.")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Ungültige Content-Length.")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Body größer als {MAX_BODY_BYTES} Bytes.")
+        body = await reader.readexactly(length) if length else b""
+        keep_alive = (headers.get("connection", "").lower() != "close"
+                      and (version != "HTTP/1.0" or headers.get("connection", "").lower() == "keep-alive"))
+        return method.upper(), target, body, keep_alive
+
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + data
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    writer.write(self._response(e.status, {"fehler": str(e)}, False))
+                    await writer.drain()
+                    return
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                if request is None:
+                    return
+                method, target, body, keep_alive = request
+                try:
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"fehler": str(e)}
+                except Exception as e:
+                    instrumentation.count("errors", operation="service")
+                    status, payload = 500, {"fehler": f"{type(e).__name__}: {e}"}
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---- Neueinlesen ----
+
+    async def _reload_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(RELOAD_CHECK_S)
+            changed = self._watcher.changes()
+            if not changed:
+                continue
+            try:
+                # Neuer Renderer im Pool; laufende Anfragen rendern mit dem alten zu Ende
+                self.renderer = await loop.run_in_executor(self._executor, lambda: Renderer(**self.renderer_kwargs))
+                print("Neu eingelesen:", ", ".join(changed), file=sys.stderr)
+            except Exception as e:
+                instrumentation.count("errors", operation="reload")
+                print("Neueinlesen fehlgeschlagen, alter Stand bleibt aktiv:", e, file=sys.stderr)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        self._watcher.start()
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=512)
+        reload_task = asyncio.create_task(self._reload_loop())
+        try:
+            if ready is not None:
+                ready(server)
+            async with server:
+                await server.serve_forever()
+        finally:
+            reload_task.cancel()
+            self._watcher.stop()
+            self._executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="krankomat serve", description="Krankomat als lokaler HTTP/JSON-Dienst.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Threads für das Rendern")
+    parser.add_argument("--template", default=TEMPLATE_BODY_PATH)
+    parser.add_argument("--subject", default=TEMPLATE_SUBJECT_PATH)
+    parser.add_argument("--empfaenger", default=EMPFAENGER_PATH)
+    parser.add_argument("--kalender", default=SEMESTERKALENDER_PATH, help="Semesterkalender ('' für keinen)")
+    args = parser.parse_args(argv)
+
+    service = RenderService({"body_path": args.template, "subject_path": args.subject,
+                             "empfaenger_path": args.empfaenger, "kalender_path": args.kalender},
+                            workers=args.workers)
+    print(f"Krankomat-Dienst läuft auf http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Start-Snapshot: der komplett eingelesene Startzustand in einer Datei.
+
+Beim Kaltstart werden Nutzer-Dateien, Empfaenger.txt, Stundenplan.txt und die Vorlagen
+eingelesen und als Snapshot gespeichert. Beim nächsten Start wird nur noch geprüft,
+ob sich eine der Quelldateien geändert hat (mtime und Größe); wenn nicht, entfällt das Einlesen.
+"""
+import os
+import pickle
+
+from empfaenger import RecipientDirectory
+from stundenplan import load_stundenplan, remember_stundenplan
+from template_engine import file_stamp, load_template, remember_template
+
+SNAPSHOT_PATH = ".krankomat_start.pickle"
+# Erhöhen, sobald sich der Aufbau von StartupState oder der gespeicherten Objekte ändert
+SNAPSHOT_VERSION = 3
+
+
+class StartupState:
+    """Alles, was ``KrankmeldungApp`` vor dem ersten Fenster braucht."""
+
+    def __init__(self, stamps, user, template_body, template_subject, directory, stundenplan, stundenplan_index):
+        self.stamps = stamps
+        self.user = user
+        self.template_body = template_body
+        self.template_subject = template_subject
+        self.directory = directory
+        self.stundenplan = stundenplan
+        self.stundenplan_index = stundenplan_index
+
+
+def _read_text(path, default=""):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def build_state(paths, default_subject):
+    """Liest alles frisch ein. ``paths`` enthält ``user`` (Feld -> Pfad), ``body``, ``subject``,
+    ``empfaenger`` und ``stundenplan``."""
+    stamps = {path: file_stamp(path) for path in _all_paths(paths)}
+    directory = RecipientDirectory.load(paths["empfaenger"])
+    stundenplan = load_stundenplan(paths["stundenplan"])
+    return StartupState(
+        stamps=stamps,
+        user={field: _read_text(path) for field, path in paths["user"].items()},
+        template_body=load_template(paths["body"], default=""),
+        template_subject=load_template(paths["subject"], default=default_subject),
+        directory=directory,
+        stundenplan=stundenplan,
+        stundenplan_index=stundenplan.index_directory(directory) if stundenplan else None,
+    )
+
+
+def _all_paths(paths):
+    return sorted(set(paths["user"].values()) | {paths["body"], paths["subject"], paths["empfaenger"], paths["stundenplan"]})
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            version, state = pickle.load(f)
+    except Exception:
+        # fehlend, kaputt oder mit alter Programmversion geschrieben -> neu aufbauen
+        return None
+    return state if version == SNAPSHOT_VERSION else None
+
+
+def _write_snapshot(path, state):
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump((SNAPSHOT_VERSION, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("Start-Snapshot konnte nicht geschrieben werden:", e)
+
+
+def load_startup_state(paths, default_subject, snapshot_path=SNAPSHOT_PATH):
+    """Startzustand aus dem Snapshot, wenn alle Quelldateien unverändert sind, sonst frisch eingelesen."""
+    state = _read_snapshot(snapshot_path)
+    if state is None or state.stamps != {path: file_stamp(path) for path in _all_paths(paths)}:
+        state = build_state(paths, default_subject)
+        _write_snapshot(snapshot_path, state)
+    else:
+        # Datei-Caches vorbelegen, damit spätere load_*-Aufrufe nicht erneut einlesen
+        remember_template(paths["body"], state.stamps[paths["body"]], state.template_body)
+        remember_template(paths["subject"], state.stamps[paths["subject"]], state.template_subject)
+        if state.stundenplan is not None:
+            remember_stundenplan(paths["stundenplan"], state.stamps[paths["stundenplan"]], state.stundenplan)
+    return state
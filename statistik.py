@@ -0,0 +1,109 @@
+"""Auswertung des Verlaufs in daten.db: Meldungen je Person, Modul, Kalenderwoche und Semester.
+
+Die Zahlen kommen aus den Summentabellen der Storage (siehe storage.py) und stehen damit
+unabhängig von der Größe des Verlaufs sofort bereit.
+
+Aufruf::
+
+    python main.py stats                          # Summen je Semester
+    python main.py stats --semester 2026S         # Top-Liste Personen und Module im Sommersemester 2026
+    python main.py stats --matrikel 1234567       # Verlauf einer Person
+    python main.py stats --wochen 2026-03-01 2026-07-31
+    python main.py stats --neu-aufbauen           # Summen neu berechnen, Module aus Empfaenger.txt nachtragen
+"""
+import argparse
+import datetime
+import json
+import sys
+
+from semesterkalender import semester_bezeichnung
+
+
+def _zelle(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value)
+
+
+def _tabelle(rows, spalten, out):
+    if not rows:
+        print("  (keine Einträge)", file=out)
+        return
+    breiten = [max(len(titel), *(len(_zelle(row, key)) for row in rows)) for titel, key in spalten]
+    print("  " + "  ".join(titel.ljust(b) for (titel, _), b in zip(spalten, breiten)), file=out)
+    for row in rows:
+        print("  " + "  ".join(_zelle(row, key).ljust(b) for (_, key), b in zip(spalten, breiten)), file=out)
+
+
+def _mit_bezeichnung(rows):
+    for row in rows:
+        if "semester" in row:
+            row["semester"] = semester_bezeichnung(row["semester"])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="krankomat stats", description="Verlauf und Statistik aus daten.db.")
+    parser.add_argument("--db", default=None, help="Datenbank (Standard: daten.db)")
+    parser.add_argument("--semester", help="Semester-Kürzel, z. B. 2026S oder 2025W")
+    parser.add_argument("--matrikel", help="Verlauf und Summen einer Person")
+    parser.add_argument("--wochen", nargs=2, metavar=("VON", "BIS"), type=datetime.date.fromisoformat,
+                        help="Summen je Kalenderwoche (JJJJ-MM-TT JJJJ-MM-TT)")
+    parser.add_argument("--top", type=int, default=20, help="Länge der Top-Listen")
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON statt als Tabelle")
+    parser.add_argument("--neu-aufbauen", action="store_true", help="Summentabellen neu berechnen")
+    parser.add_argument("--empfaenger", default=None, help="Empfaenger.txt für --neu-aufbauen")
+    args = parser.parse_args(argv)
+
+    from storage import DB_PATH, Storage
+    storage = Storage(args.db or DB_PATH)
+    try:
+        if args.neu_aufbauen:
+            from batch import EMPFAENGER_PATH
+            from empfaenger import RecipientDirectory
+            directory = RecipientDirectory.load(args.empfaenger or EMPFAENGER_PATH)
+
+            def modul_of(rid):
+                item = directory.get(rid)
+                return item.modul if item is not None else None
+
+            storage.rebuild_summaries(modul_of)
+            print("Summentabellen neu aufgebaut.", file=sys.stderr)
+
+        ergebnis = {}
+        if args.matrikel:
+            ergebnis["verlauf"] = storage.history(args.matrikel)
+            ergebnis["summen"] = _mit_bezeichnung(storage.student_summary(args.matrikel))
+        if args.wochen:
+            ergebnis["wochen"] = storage.weekly_totals(*args.wochen)
+        if args.semester:
+            ergebnis["studierende"] = _mit_bezeichnung(storage.top_students(args.semester, args.top))
+            ergebnis["module"] = _mit_bezeichnung(storage.module_summary(args.semester, args.top))
+        if not ergebnis:
+            ergebnis["semester"] = _mit_bezeichnung(storage.semester_totals())
+    finally:
+        storage.close()
+
+    if args.json:
+        json.dump(ergebnis, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    spalten = {
+        "verlauf": [("Datum", "datum"), ("Art", "art"), ("Krank bis", "datum_gesund"), ("Module", "module")],
+        "summen": [("Semester", "semester"), ("Meldungen", "meldungen"), ("krank", "krank"),
+                   ("gesund", "gesund"), ("Tage", "tage"), ("zuletzt", "letzte")],
+        "wochen": [("Woche", "woche"), ("Meldungen", "meldungen"), ("krank", "krank"), ("gesund", "gesund")],
+        "studierende": [("Matrikel", "matrikelnummer"), ("Meldungen", "meldungen"), ("krank", "krank"),
+                        ("Tage", "tage"), ("zuletzt", "letzte")],
+        "module": [("Modul", "modul"), ("Meldungen", "meldungen"), ("krank", "krank"), ("gesund", "gesund")],
+        "semester": [("Semester", "semester"), ("Meldungen", "meldungen"), ("krank", "krank"),
+                     ("gesund", "gesund"), ("Personen", "studierende")],
+    }
+    for name, rows in ergebnis.items():
+        print(f"{name.capitalize()}:")
+        _tabelle(rows, spalten[name], sys.stdout)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,565 @@
+"""Speicherschicht für daten.db: eine langlebige Verbindung, versionierte Migrationen, gebündelte Schreibzugriffe.
+
+Die Schema-Version steht in ``PRAGMA user_version``. Jede Migration läuft genau einmal
+und in einer eigenen Transaktion; alte Datenbanken werden beim Öffnen nachgezogen.
+
+Für Verlauf und Statistik werden Summentabellen (je Studierende/Semester, Modul/Semester,
+Kalenderwoche und Semester) in derselben Transaktion wie das Einfügen fortgeschrieben. Abfragen
+lesen nur diese Tabellen oder einen deckenden Index und brauchen keinen Scan über alle Meldungen.
+
+Der Postausgang (Tabelle ``outbox``) hält vorbereitete Nachrichten bis zum Versand, siehe outbox.py.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+from semesterkalender import semester_von
+
+DB_PATH = "daten.db"
+
+# Journal-Modus per Umgebungsvariable überschreibbar. WAL braucht Shared Memory auf dem
+# Rechner, der die Datei hält – liegt daten.db auf einem Netzlaufwerk, das kein WAL kann,
+# KRANKOMAT_DB_JOURNAL=DELETE setzen.
+DEFAULT_JOURNAL_MODE = os.environ.get("KRANKOMAT_DB_JOURNAL", "WAL")
+BUSY_TIMEOUT_MS = 5000
+
+# Spalten einer Krankmeldung in fester Reihenfolge (ohne id)
+REPORT_FIELDS = (
+    "vorname", "nachname", "datum", "matrikelnummer",
+    "empfaenger_list", "datum_gesund", "art", "attest", "eau", "unfall",
+    "pruefungstag", "bemerkung", "studiengang", "email", "erstellt_am",
+)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_1(conn):
+    # Grundtabelle wie in den ersten Versionen des Krankomaten
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS krankmeldungen (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vorname TEXT,
+            nachname TEXT,
+            datum TEXT,
+            matrikelnummer TEXT
+        )
+    """)
+
+
+def _migrate_2(conn):
+    # Restliche Felder der Meldung; manche alten Datenbanken haben empfaenger_list schon
+    vorhanden = _columns(conn, "krankmeldungen")
+    for column in REPORT_FIELDS[4:]:
+        if column not in vorhanden:
+            conn.execute(f"ALTER TABLE krankmeldungen ADD COLUMN {column} TEXT")
+
+
+def _migrate_3(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_krankmeldungen_matrikel ON krankmeldungen (matrikelnummer)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_krankmeldungen_datum ON krankmeldungen (datum)")
+
+
+def _migrate_4(conn):
+    # ISO-Datum (sortier- und bereichsfähig) und die Module der Empfänger zum Zeitpunkt der Meldung
+    vorhanden = _columns(conn, "krankmeldungen")
+    for column in ("datum_iso", "module"):
+        if column not in vorhanden:
+            conn.execute(f"ALTER TABLE krankmeldungen ADD COLUMN {column} TEXT")
+    rows = conn.execute("SELECT id, datum FROM krankmeldungen").fetchall()
+    conn.executemany("UPDATE krankmeldungen SET datum_iso = ? WHERE id = ?",
+                     [(_iso(_parse_datum(datum)), rid) for rid, datum in rows])
+    # Ersetzt die Indizes aus Migration 3: TT.MM.JJJJ taugt nicht für Bereiche, und der Verlauf
+    # einer Person wird vollständig aus dem Index gelesen
+    conn.execute("DROP INDEX IF EXISTS idx_krankmeldungen_datum")
+    conn.execute("DROP INDEX IF EXISTS idx_krankmeldungen_matrikel")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_krankmeldungen_datum_iso ON krankmeldungen (datum_iso, art)")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_krankmeldungen_verlauf
+        ON krankmeldungen (matrikelnummer, datum_iso, art, datum_gesund, module)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stat_studierende (
+            matrikelnummer TEXT NOT NULL, semester TEXT NOT NULL,
+            meldungen INTEGER NOT NULL, krank INTEGER NOT NULL, gesund INTEGER NOT NULL,
+            tage INTEGER NOT NULL, letzte TEXT,
+            PRIMARY KEY (matrikelnummer, semester)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stat_studierende_rang ON stat_studierende (semester, meldungen)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stat_module (
+            modul TEXT NOT NULL, semester TEXT NOT NULL,
+            meldungen INTEGER NOT NULL, krank INTEGER NOT NULL, gesund INTEGER NOT NULL,
+            PRIMARY KEY (modul, semester)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stat_module_rang ON stat_module (semester, meldungen)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stat_wochen (
+            woche TEXT PRIMARY KEY,
+            meldungen INTEGER NOT NULL, krank INTEGER NOT NULL, gesund INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stat_semester (
+            semester TEXT PRIMARY KEY,
+            meldungen INTEGER NOT NULL, krank INTEGER NOT NULL, gesund INTEGER NOT NULL,
+            studierende INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    _rebuild_summaries(conn)
+
+
+def _migrate_5(conn):
+    # Gespeicherte Empfänger-Auswahlen ("Vorlagen"), je Name eine kommagetrennte ID-Liste
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS auswahl_vorlagen (
+            name TEXT PRIMARY KEY,
+            empfaenger_list TEXT NOT NULL,
+            geaendert_am TEXT
+        )
+    """)
+
+
+def _migrate_6(conn):
+    # Profile je Matrikelnummer für gemeinsam genutzte Terminals; Startbestand aus den Meldungen,
+    # bei mehreren Meldungen einer Person gilt die neueste
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS profile (
+            matrikelnummer TEXT PRIMARY KEY,
+            vorname TEXT,
+            nachname TEXT,
+            email TEXT,
+            studiengang TEXT,
+            zuletzt TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO profile (matrikelnummer, vorname, nachname, email, studiengang, zuletzt)
+        SELECT matrikelnummer, vorname, nachname, email, studiengang, erstellt_am FROM krankmeldungen
+        WHERE coalesce(trim(matrikelnummer), '') != '' ORDER BY id
+    """)
+
+
+def _migrate_7(conn):
+    # Postausgang: vorbereitete Nachrichten bis zum erfolgreichen Versand (siehe outbox.py).
+    # schluessel macht das Einstellen idempotent, auch über Neustarts hinweg.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schluessel TEXT NOT NULL UNIQUE,
+            transport TEXT NOT NULL,
+            nachricht TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'offen',
+            versuche INTEGER NOT NULL DEFAULT 0,
+            naechster_versuch TEXT NOT NULL,
+            letzter_fehler TEXT,
+            erstellt_am TEXT,
+            gesendet_am TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_faellig ON outbox (status, naechster_versuch)")
+
+
+def _migrate_8(conn):
+    # Krankheitstage zählen jetzt einschließlich des letzten Tags: Summen mit neuer Zählung aufbauen
+    _rebuild_summaries(conn)
+
+
+MIGRATIONS = [_migrate_1, _migrate_2, _migrate_3, _migrate_4, _migrate_5, _migrate_6, _migrate_7, _migrate_8]
+
+OUTBOX_FIELDS = ("id", "schluessel", "transport", "nachricht", "status", "versuche", "naechster_versuch",
+                 "letzter_fehler", "erstellt_am", "gesendet_am")
+
+PROFILE_FIELDS = ("matrikelnummer", "vorname", "nachname", "email", "studiengang")
+
+SUMMARY_TABLES = ("stat_studierende", "stat_module", "stat_wochen", "stat_semester")
+
+
+def _parse_datum(text):
+    try:
+        return datetime.datetime.strptime((text or "").strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def _iso(datum):
+    return datum.isoformat() if datum is not None else None
+
+
+def kalenderwoche(datum):
+    """date -> ``JJJJ-Www`` (ISO-Woche, sortiert chronologisch)."""
+    jahr, woche, _ = datum.isocalendar()
+    return f"{jahr}-W{woche:02d}"
+
+
+class _Summen:
+    """Zuwächse für die Summentabellen, erst gesammelt und dann je Schlüssel einmal geschrieben."""
+
+    def __init__(self):
+        self.studierende = {}  # (matrikel, semester) -> [meldungen, krank, gesund, tage, letzte]
+        self.module = {}       # (modul, semester) -> [meldungen, krank, gesund]
+        self.wochen = {}       # woche -> [meldungen, krank, gesund]
+        self.semester = {}     # semester -> [meldungen, krank, gesund, neue studierende]
+
+    def add(self, matrikel, datum_iso, art, datum_gesund, module):
+        datum = datetime.date.fromisoformat(datum_iso) if datum_iso else None
+        # Ohne lesbares Datum unter "" (unbekannt), damit die Summen vollständig bleiben
+        semester = semester_von(datum) if datum else ""
+        woche = kalenderwoche(datum) if datum else ""
+        krank = 1 if art == "Krankmeldung" else 0
+        gesund = 1 if art == "Gesundmeldung" else 0
+        tage = 0
+        if krank:
+            # Krankheitstage einschließlich des letzten Krankheitstags (datum_gesund); ohne ihn zählt der erste Tag
+            ende = _parse_datum(datum_gesund)
+            tage = (ende - datum).days + 1 if datum and ende and ende >= datum else 1
+        s = self.studierende.setdefault((matrikel or "", semester), [0, 0, 0, 0, None])
+        s[0] += 1
+        s[1] += krank
+        s[2] += gesund
+        s[3] += tage
+        if datum_iso and (s[4] is None or datum_iso > s[4]):
+            s[4] = datum_iso
+        for modul in {m.strip() for m in (module or "").split(",") if m.strip()}:
+            m = self.module.setdefault((modul, semester), [0, 0, 0])
+            m[0] += 1
+            m[1] += krank
+            m[2] += gesund
+        for zeile in (self.wochen.setdefault(woche, [0, 0, 0]), self.semester.setdefault(semester, [0, 0, 0, 0])):
+            zeile[0] += 1
+            zeile[1] += krank
+            zeile[2] += gesund
+
+    def write(self, conn):
+        # Erst UPDATE, nur bei neuem Schlüssel INSERT – ohne UPSERT, das ältere SQLite-Versionen nicht kennen
+        for (matrikel, semester), (n, krank, gesund, tage, letzte) in self.studierende.items():
+            cur = conn.execute(
+                "UPDATE stat_studierende SET meldungen = meldungen + ?, krank = krank + ?, gesund = gesund + ?,"
+                " tage = tage + ?, letzte = max(coalesce(letzte, ''), coalesce(?, '')) "
+                "WHERE matrikelnummer = ? AND semester = ?", (n, krank, gesund, tage, letzte, matrikel, semester))
+            if cur.rowcount == 0:
+                conn.execute("INSERT INTO stat_studierende VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (matrikel, semester, n, krank, gesund, tage, letzte))
+                self.semester[semester][3] += 1
+        for (modul, semester), (n, krank, gesund) in self.module.items():
+            cur = conn.execute(
+                "UPDATE stat_module SET meldungen = meldungen + ?, krank = krank + ?, gesund = gesund + ? "
+                "WHERE modul = ? AND semester = ?", (n, krank, gesund, modul, semester))
+            if cur.rowcount == 0:
+                conn.execute("INSERT INTO stat_module VALUES (?, ?, ?, ?, ?)", (modul, semester, n, krank, gesund))
+        for woche, (n, krank, gesund) in self.wochen.items():
+            cur = conn.execute(
+                "UPDATE stat_wochen SET meldungen = meldungen + ?, krank = krank + ?, gesund = gesund + ? "
+                "WHERE woche = ?", (n, krank, gesund, woche))
+            if cur.rowcount == 0:
+                conn.execute("INSERT INTO stat_wochen VALUES (?, ?, ?, ?)", (woche, n, krank, gesund))
+        for semester, (n, krank, gesund, neu) in self.semester.items():
+            cur = conn.execute(
+                "UPDATE stat_semester SET meldungen = meldungen + ?, krank = krank + ?, gesund = gesund + ?,"
+                " studierende = studierende + ? WHERE semester = ?", (n, krank, gesund, neu, semester))
+            if cur.rowcount == 0:
+                conn.execute("INSERT INTO stat_semester VALUES (?, ?, ?, ?, ?)", (semester, n, krank, gesund, neu))
+
+
+def _rebuild_summaries(conn):
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    summen = _Summen()
+    for row in conn.execute("SELECT matrikelnummer, datum_iso, art, datum_gesund, module FROM krankmeldungen"):
+        summen.add(*row)
+    summen.write(conn)
+
+
+class Storage:
+    """Zugriff auf daten.db über eine Verbindung, die für die Laufzeit des Programms offen bleibt."""
+
+    def __init__(self, path=DB_PATH, journal_mode=DEFAULT_JOURNAL_MODE, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        self.path = path
+        # isolation_level=None: Transaktionen werden explizit mit BEGIN/COMMIT gesteuert
+        self.conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        if journal_mode:
+            self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.migrate()
+
+    def transaction(self):
+        return _Transaction(self)
+
+    @property
+    def schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        with self._lock:
+            version = self.schema_version
+            for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+                with self.transaction():
+                    step(self.conn)
+                    self.conn.execute(f"PRAGMA user_version = {number}")
+
+    def add_report(self, report):
+        """Speichert eine Krankmeldung (dict mit Schlüsseln aus REPORT_FIELDS) und liefert ihre id."""
+        return self.add_reports([report])[0]
+
+    def add_reports(self, reports):
+        """Speichert viele Krankmeldungen in einer einzigen Transaktion und schreibt die Summen fort.
+
+        Optional ``module``: Module der Empfänger (Liste oder kommagetrennt) für die Modulstatistik.
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        columns = REPORT_FIELDS + ("datum_iso", "module")
+        sql = f"INSERT INTO krankmeldungen ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        ids = []
+        summen = _Summen()
+        with self.transaction():
+            for report in reports:
+                values = [report.get(field) for field in REPORT_FIELDS]
+                values[-1] = values[-1] or now
+                datum_iso = _iso(_parse_datum(report.get("datum")))
+                module = report.get("module") or None
+                if module is not None and not isinstance(module, str):
+                    module = ",".join(module)
+                ids.append(self.conn.execute(sql, values + [datum_iso, module]).lastrowid)
+                summen.add(report.get("matrikelnummer"), datum_iso, report.get("art"), report.get("datum_gesund"),
+                           module)
+            summen.write(self.conn)
+        return ids
+
+    def last_report(self):
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT id, {', '.join(REPORT_FIELDS)} FROM krankmeldungen ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    def iter_reports(self, von=None, bis=None, batch_size=500):
+        """Alle Meldungen nach id, seitenweise gelesen – der Speicherbedarf bleibt konstant.
+
+        ``von``/``bis`` (date) filtern nach dem ersten Krankheitstag; Zeilen ohne lesbares Datum fallen dann weg.
+        """
+        sql = f"SELECT id, {', '.join(REPORT_FIELDS)} FROM krankmeldungen WHERE id > ?"
+        params = []
+        if von is not None or bis is not None:
+            sql += " AND datum_iso BETWEEN ? AND ?"
+            params = [_iso(von) or "", _iso(bis) or "9999-12-31"]
+        sql += " ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            # Lock nur pro Seite halten, damit die GUI zwischendurch speichern kann
+            with self._lock:
+                rows = self.conn.execute(sql, [last_id] + params + [batch_size]).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]["id"]
+
+    # ---- Profile ----
+
+    def iter_profiles(self):
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {', '.join(PROFILE_FIELDS)} FROM profile").fetchall()
+        return iter(rows)
+
+    def save_profile(self, profile):
+        """Legt ein Profil an oder überschreibt es (dict mit Schlüsseln aus PROFILE_FIELDS)."""
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        values = [profile.get(field) or "" for field in PROFILE_FIELDS]
+        if not values[0].strip():
+            return
+        with self.transaction():
+            self.conn.execute(f"INSERT OR REPLACE INTO profile ({', '.join(PROFILE_FIELDS)}, zuletzt) "
+                              f"VALUES ({', '.join('?' * len(PROFILE_FIELDS))}, ?)", values + [now])
+
+    # ---- Gespeicherte Auswahlen ----
+
+    def selection_names(self):
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT name FROM auswahl_vorlagen ORDER BY name")]
+
+    def load_selection(self, name):
+        """Empfänger-IDs einer gespeicherten Auswahl oder None."""
+        with self._lock:
+            row = self.conn.execute("SELECT empfaenger_list FROM auswahl_vorlagen WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return [t for t in row[0].split(",") if t]
+
+    def save_selection(self, name, ids):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.transaction():
+            self.conn.execute("INSERT OR REPLACE INTO auswahl_vorlagen (name, empfaenger_list, geaendert_am) "
+                              "VALUES (?, ?, ?)", (name, ",".join(ids), now))
+
+    def delete_selection(self, name):
+        with self.transaction():
+            self.conn.execute("DELETE FROM auswahl_vorlagen WHERE name = ?", (name,))
+
+    # ---- Postausgang ----
+
+    def enqueue_outbox(self, entries):
+        """Stellt ``(schluessel, transport, nachricht)`` ein; bekannte Schlüssel bleiben unverändert.
+
+        Liefert ``(id, neu)`` in Eingabereihenfolge – bei schon vorhandenen Schlüsseln die id des
+        alten Eintrags und ``neu=False``.
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        ids = []
+        with self.transaction():
+            for schluessel, transport, nachricht in entries:
+                row = self.conn.execute("SELECT id FROM outbox WHERE schluessel = ?", (schluessel,)).fetchone()
+                if row is not None:
+                    ids.append((row[0], False))
+                    continue
+                ids.append((self.conn.execute("INSERT INTO outbox (schluessel, transport, nachricht, naechster_versuch, "
+                                              "erstellt_am) VALUES (?, ?, ?, ?, ?)",
+                                              (schluessel, transport, nachricht, now, now)).lastrowid, True))
+        return ids
+
+    def claim_outbox(self, now, lease_until, limit):
+        """Fällige offene Nachrichten (älteste zuerst) bis ``lease_until`` für sich reservieren.
+
+        Ein zweiter Krankomat an derselben daten.db sieht sie bis dahin nicht als fällig; bricht
+        der Versand ab, ohne dass ein Ergebnis eingetragen wird, sind sie danach wieder dran.
+        """
+        with self.transaction():
+            rows = self.conn.execute(
+                f"SELECT {', '.join(OUTBOX_FIELDS)} FROM outbox WHERE status = 'offen' AND naechster_versuch <= ? "
+                "ORDER BY naechster_versuch, id LIMIT ?", (now, limit)).fetchall()
+            self.conn.executemany("UPDATE outbox SET naechster_versuch = ? WHERE id = ?",
+                                  [(lease_until, row["id"]) for row in rows])
+        return [dict(row) for row in rows]
+
+    def next_outbox_due(self):
+        """Zeitpunkt (ISO) des nächsten fälligen Versuchs oder None, wenn nichts offen ist."""
+        with self._lock:
+            return self.conn.execute("SELECT min(naechster_versuch) FROM outbox WHERE status = 'offen'").fetchone()[0]
+
+    def finish_outbox(self, entry_id, status, fehler=None, naechster_versuch=None):
+        """Ergebnis eines Versuchs: ``gesendet``, ``offen`` (mit neuem Termin) oder ``fehlgeschlagen``."""
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.transaction():
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, versuche = versuche + 1, letzter_fehler = ?, "
+                "naechster_versuch = coalesce(?, naechster_versuch), "
+                "gesendet_am = CASE WHEN ? = 'gesendet' THEN ? ELSE gesendet_am END WHERE id = ?",
+                (status, fehler, naechster_versuch, status, now, entry_id))
+
+    def retry_outbox(self):
+        """Endgültig gescheiterte Nachrichten wieder einstellen; liefert ihre Anzahl."""
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.transaction():
+            return self.conn.execute("UPDATE outbox SET status = 'offen', versuche = 0, naechster_versuch = ? "
+                                     "WHERE status = 'fehlgeschlagen'", (now,)).rowcount
+
+    def outbox_counts(self):
+        """Anzahl Nachrichten je Status, z. B. ``{"offen": 2, "gesendet": 40}``."""
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, count(*) FROM outbox GROUP BY status").fetchall())
+
+    # ---- Verlauf und Statistik ----
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def history(self, matrikelnummer, limit=100):
+        """Meldungen einer Person, neueste zuerst (vollständig aus dem Index ``idx_krankmeldungen_verlauf``)."""
+        rows = self._query(
+            "SELECT id, datum_iso, art, datum_gesund, module FROM krankmeldungen "
+            "WHERE matrikelnummer = ? ORDER BY datum_iso DESC, id DESC LIMIT ?", (matrikelnummer, limit))
+        for row in rows:
+            datum = row["datum_iso"]
+            row["datum"] = datetime.date.fromisoformat(datum).strftime("%d.%m.%Y") if datum else ""
+        return rows
+
+    def counts_between(self, von, bis):
+        """Anzahl der Meldungen je Art mit erstem Krankheitstag von ``von`` bis ``bis`` (date, einschließlich)."""
+        rows = self._query("SELECT art, count(*) AS anzahl FROM krankmeldungen WHERE datum_iso BETWEEN ? AND ? "
+                           "GROUP BY art", (_iso(von), _iso(bis)))
+        return {row["art"] or "": row["anzahl"] for row in rows}
+
+    def student_summary(self, matrikelnummer):
+        """Summen einer Person je Semester, neuestes zuerst."""
+        return self._query("SELECT * FROM stat_studierende WHERE matrikelnummer = ? ORDER BY semester DESC",
+                           (matrikelnummer,))
+
+    def top_students(self, semester, limit=20):
+        """Personen mit den meisten Meldungen im Semester (Kürzel wie ``semester_von``)."""
+        return self._query("SELECT * FROM stat_studierende WHERE semester = ? ORDER BY meldungen DESC LIMIT ?",
+                           (semester, limit))
+
+    def module_summary(self, semester=None, limit=None):
+        """Meldungen je Modul, absteigend; ohne ``semester`` über alle Semester summiert."""
+        if semester is not None:
+            sql, params = "SELECT * FROM stat_module WHERE semester = ? ORDER BY meldungen DESC", [semester]
+        else:
+            sql = ("SELECT modul, sum(meldungen) AS meldungen, sum(krank) AS krank, sum(gesund) AS gesund "
+                   "FROM stat_module GROUP BY modul ORDER BY meldungen DESC")
+            params = []
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def weekly_totals(self, von=None, bis=None):
+        """Summen je Kalenderwoche von der Woche von ``von`` bis zur Woche von ``bis`` (date)."""
+        lo = kalenderwoche(von) if von else "0"
+        hi = kalenderwoche(bis) if bis else "9999"
+        return self._query("SELECT * FROM stat_wochen WHERE woche BETWEEN ? AND ? ORDER BY woche", (lo, hi))
+
+    def semester_totals(self):
+        return self._query("SELECT * FROM stat_semester ORDER BY semester")
+
+    def rebuild_summaries(self, modul_of=None):
+        """Summentabellen neu aufbauen, z. B. nach Änderungen von Hand an daten.db.
+
+        Mit ``modul_of`` (Empfänger-ID -> Modul oder None) wird bei älteren Meldungen ohne
+        gespeicherte Module die Spalte ``module`` aus ``empfaenger_list`` nachgetragen.
+        """
+        with self.transaction():
+            if modul_of is not None:
+                rows = self.conn.execute("SELECT id, empfaenger_list FROM krankmeldungen WHERE module IS NULL")
+                updates = []
+                for rid, empfaenger in rows.fetchall():
+                    module = {modul_of(t.strip()) for t in (empfaenger or "").split(",") if t.strip()}
+                    module.discard(None)
+                    module.discard("")
+                    if module:
+                        updates.append((",".join(sorted(module)), rid))
+                self.conn.executemany("UPDATE krankmeldungen SET module = ? WHERE id = ?", updates)
+            _rebuild_summaries(self.conn)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK unter dem Lock der Storage (verschachtelbar)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.outer = False
+
+    def __enter__(self):
+        self.storage._lock.acquire()
+        conn = self.storage.conn
+        self.outer = not conn.in_transaction
+        if self.outer:
+            conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.outer:
+                self.storage.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.storage._lock.release()
+        return False
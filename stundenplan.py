@@ -0,0 +1,189 @@
+"""Stundenplan.txt einmal einlesen und Module schnell den Empfängern zuordnen.
+
+Format je Zeile: ``Wochentag;Modul A,Modul B,...[;A|B]``. Ein Empfänger passt zu einem
+Wochentag, wenn eines der Module dieses Tages in seinem Modulnamen vorkommt
+(ohne Beachtung der Groß-/Kleinschreibung).
+
+Die optionale dritte Spalte beschränkt die Zeile auf A- oder B-Wochen. A- und B-Wochen
+wechseln sich ab ``REF_MONTAG`` lückenlos ab; bis Ende 2026 ist A jede ungerade ISO-Kalenderwoche.
+Die ISO-Wochennummer selbst taugt nicht: in Jahren mit 53 Wochen (2020, 2026) sind KW 53 und
+KW 1 beide ungerade. Ohne Angabe gilt die Zeile jede Woche; derselbe Wochentag darf mehrfach
+vorkommen.
+"""
+import datetime
+from collections import deque
+
+from template_engine import file_stamp
+
+WOCHENTAGE = ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag")
+_WOCHENTAG_INDEX = {name.lower(): i for i, name in enumerate(WOCHENTAGE)}
+WOCHEN = ("A", "B")
+# Montag einer A-Woche (KW 1/2025); ab hier wechseln A und B jede Woche
+REF_MONTAG = datetime.date(2024, 12, 30)
+
+
+def wochentyp(datum):
+    """A oder B, im Wochentakt ab ``REF_MONTAG`` – auch über den Jahreswechsel hinweg."""
+    return WOCHEN[((datum - REF_MONTAG).days // 7) % 2]
+
+
+def tage_im_zeitraum(start, ende):
+    """Alle (Wochentag, Wochentyp)-Kombinationen von ``start`` bis ``ende`` (einschließlich).
+
+    Es gibt höchstens 14 Kombinationen; sind alle gefunden, wird abgebrochen. Damit kostet
+    auch ein Zeitraum über ein ganzes Semester nur wenige Schritte.
+    """
+    if ende < start:
+        ende = start
+    gefunden = set()
+    tag = start
+    while tag <= ende and len(gefunden) < 2 * len(WOCHENTAGE):
+        gefunden.add((tag.weekday(), wochentyp(tag)))
+        tag += datetime.timedelta(days=1)
+    return gefunden
+
+
+class AhoCorasick:
+    """Multi-Pattern-Suche: findet alle Muster in einem Text in einem einzigen Durchlauf.
+
+    ``patterns`` ist eine Folge von ``(muster, wert)``; ``find`` liefert die Menge der Werte
+    aller Muster, die im Text vorkommen. Laufzeit linear in Textlänge plus Trefferzahl.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern, value in patterns:
+            if pattern:
+                self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern, value):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state].add(value)
+
+    def _build(self):
+        # Breitensuche: Fehlerlinks setzen und Ausgaben der Suffix-Zustände übernehmen
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find(self, text):
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class Stundenplan:
+    """(Wochentag, Woche) -> Module, plus vorkompilierter Matcher über alle Modulnamen.
+
+    ``woche`` ist ``"A"``, ``"B"`` oder ``None`` für jede Woche.
+    """
+
+    def __init__(self, by_weekday=None):
+        self.by_weekday = by_weekday or {}
+        self._matcher = None
+
+    @classmethod
+    def parse(cls, lines):
+        by_weekday = {}
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(";")
+            if len(parts) < 2:
+                continue
+            tag = _WOCHENTAG_INDEX.get(parts[0].strip().lower())
+            if tag is None:
+                continue
+            woche = parts[2].strip().upper() if len(parts) > 2 else ""
+            woche = woche if woche in WOCHEN else None
+            for modul in parts[1].split(","):
+                modul = modul.strip()
+                if modul:
+                    by_weekday.setdefault((tag, woche), []).append(modul)
+        return cls(by_weekday)
+
+    def modules_on(self, weekday, woche=None):
+        """Module an einem Wochentag; mit ``woche`` inklusive der nur in dieser Woche stattfindenden."""
+        module = list(self.by_weekday.get((weekday, None), []))
+        if woche is not None:
+            module += self.by_weekday.get((weekday, woche), [])
+        return module
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = AhoCorasick(
+                (modul.lower(), key) for key, module in self.by_weekday.items() for modul in module)
+        return self._matcher
+
+    def index_directory(self, directory):
+        """Ordnet jeden Empfänger genau einmal zu: (Wochentag, Woche) -> Liste der Empfänger-IDs (Dateireihenfolge)."""
+        index = {}
+        matcher = self.matcher
+        for item in directory:
+            modul = item.modul
+            if not modul:
+                continue
+            for key in matcher.find(modul.lower()):
+                index.setdefault(key, []).append(item.id)
+        return index
+
+
+def ids_im_zeitraum(index, start, ende):
+    """Vereinigung der Empfänger-IDs aller Unterrichtstage von ``start`` bis ``ende``."""
+    ids = {}
+    for tag, woche in tage_im_zeitraum(start, ende):
+        ids.update(dict.fromkeys(index.get((tag, None), ())))
+        ids.update(dict.fromkeys(index.get((tag, woche), ())))
+    return list(ids)
+
+
+_cache = {}
+
+
+def remember_stundenplan(path, stamp, plan):
+    """Trägt einen anderswo (z. B. aus dem Start-Snapshot) geladenen Stundenplan in den Cache ein."""
+    if stamp is not None:
+        _cache[path] = (stamp, plan)
+
+
+def load_stundenplan(path):
+    """Lädt Stundenplan.txt, gecacht über Pfad und Änderungszeit. Fehlt die Datei: None."""
+    key = file_stamp(path)
+    if key is None:
+        return None
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        plan = Stundenplan.parse(f)
+    _cache[path] = (key, plan)
+    return plan
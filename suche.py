@@ -0,0 +1,202 @@
+"""Fehlertolerante Suche im Empfängerverzeichnis über einen Wort- und Trigramm-Index.
+
+Modul, Anrede und E-Mail jedes Empfängers werden beim Laden einmal in Wörter zerlegt. Der
+Index kennt jedes verschiedene Wort nur einmal (die meisten Module, Anreden und Domains
+wiederholen sich) und hält dazu:
+
+* eine sortierte Wortliste für Präfixe (``bisect``),
+* Trigramm -> Wörter für Tippfehler,
+* Wort -> Empfänger-IDs.
+
+Ein Suchwort passt auf das gleiche Wort, das zuletzt getippte auf alle Wörter, die mit ihm
+beginnen. Gibt es keins und hat das Suchwort mindestens vier Zeichen, passt es auf alle
+Wörter, die ``MIN_ANTEIL`` seiner Trigramme enthalten (Tippfehler). Ein Empfänger ist ein
+Treffer, wenn jedes Suchwort bei ihm passt; genaue Treffer stehen vor unscharfen. Begonnen
+wird mit dem seltensten Suchwort, die übrigen werden nur an dessen Treffern geprüft – die
+Kosten hängen an den Treffern, nicht an der Größe des Verzeichnisses.
+Nach dem Neueinlesen von Empfaenger.txt gleicht ``sync`` den Index über die
+(inhaltsbasierten) IDs ab, statt ihn neu aufzubauen.
+"""
+import bisect
+import math
+import re
+from collections import Counter
+
+from profiles import normalize
+
+# Anteil der Trigramme eines Suchworts, die ein Wort für einen unscharfen Treffer enthalten muss
+MIN_ANTEIL = 0.6
+# Unscharfe Suche erst ab dieser Wortlänge; kürzere Suchwörter nur als Präfix
+MIN_UNSCHARF = 4
+_WORT = re.compile(r"\w+")
+
+
+def woerter(text):
+    return _WORT.findall(normalize(text))
+
+
+def trigramme(wort, offen=False):
+    """Trigramme eines Worts mit Leerzeichen am Rand; ``offen``: ohne Wortende (wird noch getippt)."""
+    rand = f" {wort}" if offen else f" {wort} "
+    return {rand[i:i + 3] for i in range(max(1, len(rand) - 2))}
+
+
+def _add_ref(refs, i, value):
+    # Ein Verweis direkt, ab dem zweiten eine Menge – wie die Indizes in empfaenger.py
+    current = refs[i]
+    if current is None:
+        refs[i] = value
+    elif isinstance(current, set):
+        current.add(value)
+    elif current != value:
+        refs[i] = {current, value}
+
+
+def _discard_ref(refs, i, value):
+    current = refs[i]
+    if isinstance(current, set):
+        current.discard(value)
+        if len(current) == 1:
+            refs[i] = next(iter(current))
+    elif current == value:
+        refs[i] = None
+
+
+def _refs(refs, i):
+    current = refs[i]
+    if current is None:
+        return ()
+    return current if isinstance(current, set) else (current,)
+
+
+class RecipientSearch:
+    """Suchindex über ein ``RecipientDirectory``; ``search(anfrage)`` liefert passende IDs."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._words = []         # Wortnummer -> Wort
+        self._word_no = {}       # Wort -> Wortnummer
+        self._sorted = []        # alle Wörter sortiert, für Präfixe
+        self._gram_words = {}    # Trigramm -> [Wortnummern]
+        self._word_items = []    # Wortnummer -> None | ID | {IDs}
+        self._item_words = {}    # ID -> Wortnummern des Empfängers
+        self._field_cache = {}   # Feldinhalt -> Wortnummern (Module und Domains wiederholen sich)
+        for item in directory:
+            self._add(item, sort=False)
+        self._sorted.sort()
+        self._field_cache = None
+
+    def __len__(self):
+        return len(self._item_words)
+
+    def _word(self, wort, sort=True):
+        no = self._word_no.get(wort)
+        if no is None:
+            no = self._word_no[wort] = len(self._words)
+            self._words.append(wort)
+            self._word_items.append(None)
+            for gram in trigramme(wort):
+                self._gram_words.setdefault(gram, []).append(no)
+            if sort:
+                bisect.insort(self._sorted, wort)
+            else:
+                self._sorted.append(wort)
+        return no
+
+    def _field_words(self, text, sort):
+        cache = self._field_cache
+        nos = cache.get(text) if cache is not None else None
+        if nos is None:
+            nos = {self._word(w, sort) for w in woerter(text)}
+            if cache is not None:
+                cache[text] = nos
+        return nos
+
+    def _add(self, item, sort=True):
+        nos = self._field_words(item.modul, sort) | self._field_words(item.anrede, sort)
+        if item.email:
+            local, _, domain = item.email.partition("@")
+            nos |= self._field_words(local, sort) | self._field_words(domain, sort)
+        self._item_words[item.id] = tuple(nos)
+        for no in nos:
+            _add_ref(self._word_items, no, item.id)
+
+    def _remove(self, rid):
+        # Wörter bleiben im Wortschatz; ohne Empfänger liefern sie einfach keine Treffer mehr
+        for no in self._item_words.pop(rid, ()):
+            _discard_ref(self._word_items, no, rid)
+
+    def sync(self, directory):
+        """Übernimmt ein neu eingelesenes Verzeichnis: nur weggefallene und neue Einträge werden angefasst."""
+        for rid in [rid for rid in self._item_words if rid not in directory]:
+            self._remove(rid)
+        for item in directory:
+            if item.id not in self._item_words:
+                self._add(item)
+        self.directory = directory
+
+    def _matching_words(self, wort, praefix):
+        """Wortnummern zu einem Suchwort: das Wort selbst (bzw. alle mit diesem Präfix), sonst unscharf passende.
+
+        Liefert ``(wörter, unscharf)``; unscharf wird nur gesucht, wenn es keinen genauen Treffer gibt.
+        """
+        sorted_words, word_no, word_items = self._sorted, self._word_no, self._word_items
+        genau = set()
+        if praefix:
+            i = bisect.bisect_left(sorted_words, wort)
+            while i < len(sorted_words) and sorted_words[i].startswith(wort):
+                genau.add(word_no[sorted_words[i]])
+                i += 1
+        elif wort in word_no:
+            genau.add(word_no[wort])
+        # Wörter, deren Empfänger alle weggefallen sind, zählen nicht
+        genau = {no for no in genau if word_items[no] is not None}
+        if genau or len(wort) < MIN_UNSCHARF:
+            return genau, False
+        grams = trigramme(wort, offen=praefix)
+        noetig = math.ceil(len(grams) * MIN_ANTEIL)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._gram_words.get(gram, ()))
+        words = self._words
+        return {no for no, n in counts.items()
+                if n >= noetig and len(words[no]) >= len(wort) - 2 and word_items[no] is not None}, True
+
+    def search(self, query, limit=None):
+        """IDs passender Empfänger, beste zuerst (bei Gleichstand in Dateireihenfolge).
+
+        Anfragen ohne Wort mit mindestens zwei Zeichen liefern None (= kein Filter).
+        """
+        alle = woerter(query)
+        # Das letzte Wort wird gerade getippt (Präfix), sofern die Anfrage nicht mit einem Trenner endet
+        offen = bool(alle) and not query[-1:].isspace()
+        suchwoerter = {(w, offen and n == len(alle) - 1) for n, w in enumerate(alle) if len(w) >= 2}
+        if not suchwoerter:
+            return None
+        word_items = self._word_items
+        passend = []
+        for wort, praefix in suchwoerter:
+            nos, unscharf = self._matching_words(wort, praefix)
+            if not nos:
+                return []
+            # geschätzte Trefferzahl, um mit dem seltensten Suchwort anzufangen
+            groesse = sum(len(r) if isinstance(r, set) else 1 for r in map(word_items.__getitem__, nos) if r)
+            passend.append((groesse, nos, unscharf))
+        passend.sort(key=lambda p: p[0])
+
+        groesse, nos, unscharf = passend[0]
+        treffer = set()
+        for no in nos:
+            treffer.update(_refs(word_items, no))
+        unscharf_ids = set(treffer) if unscharf else set()
+        # Alle weiteren Suchwörter nur noch an den bisherigen Treffern prüfen
+        item_words = self._item_words
+        for groesse, nos, unscharf in passend[1:]:
+            treffer = {rid for rid in treffer if not nos.isdisjoint(item_words[rid])}
+            if unscharf:
+                unscharf_ids |= treffer
+            if not treffer:
+                return []
+        position = self.directory.position
+        ergebnis = sorted(treffer, key=lambda rid: (rid in unscharf_ids, position(rid)))
+        return ergebnis[:limit] if limit is not None else ergebnis
@@ -0,0 +1,166 @@
+"""Vorlagen (template.txt, template-subject.txt) einmal kompilieren und danach nur noch zusammensetzen.
+
+Eine Vorlage wird in einen Plan aus festen Textstücken und Platzhaltern zerlegt.
+Rendern ist dann ein einziges ``"".join(...)`` über diesen Plan. Vorlagen mit Feldern, die der
+Plan nicht abbildet (``{a[0]}``, ``{a.b}``, ``{a:{breite}}``), rendert weiter ``str.format``.
+
+Einziger Unterschied zum früheren ``render_template``: Im Ersatz-Modus werden eingesetzte Werte
+nicht noch einmal nach Platzhaltern durchsucht (früher hing das von der Reihenfolge im Kontext ab).
+"""
+import os
+import re
+from functools import lru_cache
+from string import Formatter
+
+# Platzhalter im Ersatz-Modus: alles zwischen { und }, ohne weitere Klammern darin
+_PLACEHOLDER_RE = re.compile(r"\{([^{}]+)\}")
+# Name vor Attribut oder Index: "a" in "a.b" und "a[0]"
+_FIELD_ROOT_RE = re.compile(r"[^.\[]*")
+# Plan für Vorlagen, die str.format selbst rendern muss
+_DIREKT = "direkt"
+
+
+class CompiledTemplate:
+    """Eine einmal zerlegte Vorlage.
+
+    Verhält sich wie das frühere ``render_template``: Zuerst wird die Vorlage im Stil von
+    ``str.format`` gerendert. Fehlt dafür ein Platzhalter oder ist die Vorlage kein gültiges
+    Format, werden nur die bekannten ``{schluessel}`` ersetzt und der Rest bleibt stehen.
+    """
+
+    __slots__ = ("source", "placeholders", "_format_plan", "_replace_plan")
+
+    def __init__(self, source):
+        self.source = source
+        self._format_plan = self._compile_format(source)
+        self._replace_plan = self._compile_replace(source)
+        self.placeholders = frozenset(name for is_field, name in self._replace_plan if is_field)
+        if self._format_plan is not None:
+            self.placeholders = frozenset(_format_names(source))
+
+    @staticmethod
+    def _compile_format(source):
+        """Plan im Format-Modus, ``_DIREKT`` für str.format oder None, wenn die Vorlage kein gültiges Format ist."""
+        plan = []
+        direkt = False
+        try:
+            for literal, field, spec, conversion in Formatter().parse(source):
+                if literal:
+                    plan.append((False, literal))
+                if field is None:
+                    continue
+                # Nur einfache Namen im Plan; Attribute, Indizes, verschachtelte Angaben -> str.format
+                if (not field or any(c in field for c in ".[") or field.isdigit() or "{" in (spec or "")
+                        or conversion not in (None, "r", "s", "a")):
+                    direkt = True
+                plan.append((True, (field, conversion, spec)) if spec or conversion else (True, field))
+        except ValueError:
+            return None
+        return _DIREKT if direkt else tuple(plan)
+
+    @staticmethod
+    def _compile_replace(source):
+        plan = []
+        pos = 0
+        for m in _PLACEHOLDER_RE.finditer(source):
+            if m.start() > pos:
+                plan.append((False, source[pos:m.start()]))
+            plan.append((True, m.group(1)))
+            pos = m.end()
+        if pos < len(source):
+            plan.append((False, source[pos:]))
+        return tuple(plan)
+
+    def render(self, context):
+        plan = self._format_plan
+        if plan is _DIREKT:
+            try:
+                return self.source.format(**context)
+            except Exception:
+                pass
+        elif plan is not None and self.placeholders.issubset(context):
+            try:
+                return "".join(
+                    (str(context[part]) if isinstance(part, str) else _format_field(context, *part))
+                    if is_field else part
+                    for is_field, part in plan
+                )
+            except Exception:
+                pass
+        # Ersatz-Modus: unbekannte Platzhalter bleiben unverändert stehen
+        return "".join(
+            str(context[part]) if is_field and part in context
+            else ("{" + part + "}" if is_field else part)
+            for is_field, part in self._replace_plan
+        )
+
+    def __repr__(self):
+        return f"CompiledTemplate(placeholders={sorted(self.placeholders)!r})"
+
+
+def _format_names(source):
+    """Namen aller Felder einer Format-Vorlage, auch aus verschachtelten Angaben (``{a:{breite}}``)."""
+    for _literal, field, spec, _conversion in Formatter().parse(source):
+        if field is not None:
+            yield _FIELD_ROOT_RE.match(field).group()
+            if spec and "{" in spec:
+                yield from _format_names(spec)
+
+
+def _format_field(context, name, conversion, spec):
+    value = context[name]
+    if conversion == "r":
+        value = repr(value)
+    elif conversion == "a":
+        value = ascii(value)
+    elif conversion == "s":
+        value = str(value)
+    return format(value, spec or "")
+
+
+@lru_cache(maxsize=64)
+def compile_template(source):
+    """Kompiliert einen Vorlagentext; gleiche Texte werden nur einmal zerlegt."""
+    return CompiledTemplate(source)
+
+
+_file_cache = {}
+
+
+def file_stamp(path):
+    """(mtime_ns, size) einer Datei oder None, wenn sie fehlt – Schlüssel für alle Datei-Caches."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def remember_template(path, stamp, compiled):
+    """Trägt eine anderswo (z. B. aus dem Start-Snapshot) geladene Vorlage in den Datei-Cache ein."""
+    if stamp is not None:
+        _file_cache[path] = (stamp, compiled)
+
+
+def load_template(path, default=None):
+    """Lädt und kompiliert eine Vorlagendatei, gecacht über Pfad und Änderungszeit.
+
+    Fehlt die Datei, wird ``default`` kompiliert (bzw. None geliefert, wenn kein Default gesetzt ist).
+    """
+    key = file_stamp(path)
+    if key is None:
+        return compile_template(default) if default is not None else None
+    cached = _file_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        compiled = compile_template(f.read().strip())
+    _file_cache[path] = (key, compiled)
+    return compiled
+
+
+def render_template(template, context):
+    """Rendert eine Vorlage (Text oder CompiledTemplate) mit dem gegebenen Kontext."""
+    if not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
+    return template.render(context)
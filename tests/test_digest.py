@@ -0,0 +1,34 @@
+"""Sammelnachrichten aus digest.py."""
+from batch import Renderer
+from digest import Digest
+from meldung import REPORT_DEFAULTS
+
+
+def _renderer(tmp_path, zeilen):
+    empfaenger = tmp_path / "Empfaenger.txt"
+    empfaenger.write_text("Anrede;Modul;Email-Adresse\n" + "".join(z + "\n" for z in zeilen), encoding="utf-8")
+    body = tmp_path / "template.txt"
+    body.write_text("{Vornamen} {Nachname} ist krank.", encoding="utf-8")
+    subject = tmp_path / "template-subject.txt"
+    subject.write_text("Krankmeldung {Datum}", encoding="utf-8")
+    return Renderer(body_path=str(body), subject_path=str(subject), empfaenger_path=str(empfaenger),
+                    studiengang="", kalender_path=None)
+
+
+def _report(matrikel):
+    return dict(REPORT_DEFAULTS, vorname="Erika", nachname="Muster", matrikelnummer=matrikel, datum="02.02.2026")
+
+
+def test_entries_sharing_an_address_get_each_report_once(tmp_path):
+    renderer = _renderer(tmp_path, ["Frau Dr. X;Mathe 1;x@h.de", "Frau Dr. X;Mathe 2;X@h.de",
+                                    "Herr Y;Recht;y@h.de"])
+    digest = Digest(renderer)
+    digest.add("000001", _report("1"), ["Frau Dr. X", "Herr Y"])
+    digest.add("000002", _report("2"), ["x@h.de"])
+
+    messages = {message["to"][0].lower(): message for message in digest.messages()}
+    assert messages["x@h.de"]["meldungen"] == ["000001", "000002"]
+    assert messages["x@h.de"]["subject"].endswith("2 Meldung(en)")
+    assert messages["y@h.de"]["meldungen"] == ["000001"]
+    # Einzelversand hätte drei Zustellungen gebraucht: x und y für die erste, x für die zweite Meldung
+    assert digest.single_messages == 3
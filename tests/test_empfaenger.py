@@ -0,0 +1,13 @@
+"""TO/CC-Aufteilung in empfaenger.py."""
+from empfaenger import Recipient, split_to_cc
+
+
+def test_split_to_cc_drops_duplicate_addresses():
+    items = [Recipient("Frau X", "Mathe 1", "x@h.de"), Recipient("Frau X", "Mathe 2", "X@H.de"),
+             Recipient("Herr Y", "Recht", "y@h.de"), Recipient("Herr Y", "Recht 2", "y@h.de")]
+    assert split_to_cc(items) == (["x@h.de"], ["y@h.de"])
+
+
+def test_split_to_cc_without_address_for_first_entry():
+    items = [Recipient("Sekretariat", "", ""), Recipient("Herr Y", "Recht", "y@h.de")]
+    assert split_to_cc(items) == ([], ["y@h.de"])
@@ -0,0 +1,11 @@
+"""Begrüßungszeilen in meldung.py."""
+from empfaenger import Recipient
+from meldung import generate_anreden, greeting_for
+
+
+def test_shared_anrede_greets_once():
+    items = [Recipient("sehr geehrte Frau Dr. B", "Grundlagen Informatik", "b@h.de"),
+             Recipient("Sehr geehrter Herr C", "Recht", "c@h.de"),
+             Recipient("sehr geehrte Frau Dr. B", "Grundlagen E-Government", "b@h.de")]
+    assert greeting_for(items) == "Sehr geehrte Frau Dr. B,\nSehr geehrter Herr C"
+    assert generate_anreden([item.anrede for item in items]) == "sehr geehrte Frau Dr. B,\nSehr geehrter Herr C"
@@ -0,0 +1,187 @@
+"""Postausgang (outbox.py) mit dem RecordingTransport als Versandweg."""
+import datetime
+import smtplib
+
+import pytest
+
+import outbox
+from storage import Storage
+from transport import RecordingTransport
+
+
+class Uhr:
+    """Feste Zeit für Tests: ``now`` für Termine in daten.db, ``monotonic`` für das Ratenlimit."""
+
+    def __init__(self):
+        # daten.db stempelt neue Einträge mit der echten Zeit; die Testuhr läuft etwas voraus
+        self.jetzt = datetime.datetime.now().replace(microsecond=0) + datetime.timedelta(seconds=60)
+        self.sekunden = 1000.0
+
+    def now(self):
+        return self.jetzt
+
+    def monotonic(self):
+        return self.sekunden
+
+    def vor(self, sekunden):
+        self.jetzt += datetime.timedelta(seconds=sekunden)
+        self.sekunden += sekunden
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / "daten.db"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def uhr():
+    return Uhr()
+
+
+def _worker(storage, transport, uhr, **kwargs):
+    return outbox.OutboxWorker(storage, lambda name: transport, now=uhr.now, clock=uhr.monotonic, **kwargs)
+
+
+def _message(to="a@example.org", subject="Krankmeldung"):
+    return {"to": [to], "cc": [], "subject": subject, "body": "Text"}
+
+
+def _entry(storage, entry_id):
+    with storage._lock:
+        return dict(storage.conn.execute("SELECT * FROM outbox WHERE id = ?", (entry_id,)).fetchone())
+
+
+def test_transient_failure_is_retried_with_backoff(storage, uhr):
+    transport = RecordingTransport(fail=2)
+    worker = _worker(storage, transport, uhr, basis_s=15)
+    [(entry_id, _neu)] = outbox.enqueue(storage, _message(), "recording")
+
+    assert worker.drain() == 15
+    assert [art for art, _id, _text in worker.events()] == ["erneut"]
+    assert _entry(storage, entry_id)["versuche"] == 1
+
+    uhr.vor(14)
+    assert worker.drain() == 1  # noch nicht fällig
+    uhr.vor(1)
+    assert worker.drain() == 30  # zweiter Fehlschlag: doppelter Abstand
+    uhr.vor(30)
+    assert worker.drain() is None
+    assert [art for art, _id, _text in worker.events()] == ["erneut", "gesendet"]
+    entry = _entry(storage, entry_id)
+    assert (entry["status"], entry["versuche"]) == ("gesendet", 3)
+    assert len(transport.sent) == 1
+
+
+def test_gives_up_after_max_attempts(storage, uhr):
+    transport = RecordingTransport(fail=5)
+    worker = _worker(storage, transport, uhr, basis_s=1, max_versuche=3)
+    outbox.enqueue(storage, _message(), "recording")
+    for _ in range(3):
+        worker.drain()
+        uhr.vor(60)
+    assert storage.outbox_counts() == {"fehlgeschlagen": 1}
+    assert transport.sent == []
+
+
+@pytest.mark.parametrize("error, permanent", [
+    (smtplib.SMTPDataError(554, b"abgelehnt"), True),
+    (smtplib.SMTPDataError(451, b"spaeter"), False),
+    (smtplib.SMTPSenderRefused(550, b"nein", "ich@example.org"), True),
+    (smtplib.SMTPRecipientsRefused({}), True),
+    (smtplib.SMTPRecipientsRefused({"a@example.org": (550, b"unbekannt")}), True),
+    (smtplib.SMTPRecipientsRefused({"a@example.org": (550, b"x"), "b@example.org": (450, b"voll")}), False),
+    (smtplib.SMTPServerDisconnected("weg"), False),
+    (ConnectionRefusedError(), False),
+    (FileNotFoundError("Attest.pdf"), True),
+    (ValueError("Unbekannter Versandweg"), True),
+])
+def test_is_permanent(error, permanent):
+    assert outbox.is_permanent(error) is permanent
+
+
+def test_permanent_failure_is_not_retried(storage, uhr):
+    transport = RecordingTransport(fail=1, error=smtplib.SMTPDataError(554, b"abgelehnt"))
+    worker = _worker(storage, transport, uhr)
+    outbox.enqueue(storage, _message(), "recording")
+    assert worker.drain() is None
+    assert [art for art, _id, _text in worker.events()] == ["fehlgeschlagen"]
+    assert storage.outbox_counts() == {"fehlgeschlagen": 1}
+
+    assert storage.retry_outbox() == 1
+    worker.drain()
+    assert storage.outbox_counts() == {"gesendet": 1}
+
+
+def test_message_without_recipients_is_rejected(storage):
+    with pytest.raises(ValueError):
+        outbox.enqueue(storage, {"to": [], "cc": [], "subject": "x", "body": ""}, "recording")
+    assert storage.outbox_counts() == {}
+
+
+def test_rate_limit(storage, uhr):
+    transport = RecordingTransport()
+    worker = _worker(storage, transport, uhr, pro_minute=2)
+    for n in range(5):
+        outbox.enqueue(storage, _message(subject=f"Nr. {n}"), "recording")
+
+    assert worker.drain() == 60
+    assert len(transport.sent) == 2
+    uhr.vor(30)
+    assert worker.drain() == 30
+    assert len(transport.sent) == 2
+    uhr.vor(30)
+    worker.drain()
+    assert len(transport.sent) == 4
+    uhr.vor(60)
+    assert worker.drain() is None
+    assert [message["subject"] for message, _ in transport.sent] == [f"Nr. {n}" for n in range(5)]
+
+
+def test_claimed_entries_are_leased(storage, uhr):
+    outbox.enqueue(storage, _message(), "recording")
+    now = uhr.now().isoformat(timespec="seconds")
+    lease = (uhr.now() + datetime.timedelta(seconds=600)).isoformat(timespec="seconds")
+    assert len(storage.claim_outbox(now, lease, 10)) == 1
+    # Ein zweiter Krankomat an derselben daten.db bekommt den Eintrag nicht
+    assert storage.claim_outbox(now, lease, 10) == []
+    # Wird kein Ergebnis eingetragen (Absturz), ist er nach Ablauf der Reservierung wieder fällig
+    assert len(storage.claim_outbox(lease, lease, 10)) == 1
+
+
+def test_duplicate_is_reported_and_sent_once(storage, uhr):
+    transport = RecordingTransport()
+    worker = _worker(storage, transport, uhr)
+    [(first, neu)] = outbox.enqueue(storage, _message(), "recording")
+    assert neu
+    assert outbox.enqueue(storage, _message(), "recording") == [(first, False)]
+    worker.drain()
+    # auch nach dem Versand (und einem Neustart) bleibt es dieselbe Nachricht
+    assert outbox.enqueue(storage, _message(), "recording") == [(first, False)]
+    worker.drain()
+    assert len(transport.sent) == 1
+
+    [(again, neu)] = outbox.enqueue(storage, _message(), "recording", erneut=True)
+    assert neu and again != first
+    worker.drain()
+    assert len(transport.sent) == 2
+
+
+def test_large_recipient_lists_are_split(storage, uhr):
+    transport = RecordingTransport()
+    worker = _worker(storage, transport, uhr)
+    message = {"to": ["to@example.org"], "cc": [f"cc{n}@example.org" for n in range(6)], "subject": "S", "body": ""}
+    assert len(outbox.enqueue(storage, message, "recording", limit=3)) == 3
+    worker.drain()
+    teile = [(m["to"], len(m["cc"])) for m, _ in transport.sent]
+    assert sorted(teile) == [([], 1), ([], 3), (["to@example.org"], 2)]
+    assert len({m["message_id"] for m, _ in transport.sent}) == 3
+
+
+def test_recording_transport_fails_on_request():
+    transport = RecordingTransport(fail=1, error=OSError("weg"))
+    with pytest.raises(OSError):
+        transport.send(_message())
+    transport.send(_message())
+    assert [message["to"] for message, _ in transport.sent] == [["a@example.org"]]
@@ -0,0 +1,53 @@
+"""Semesterkalender: Tagesarten und Zeiträume außerhalb des Kalenders."""
+import datetime
+import os
+
+from batch import Renderer
+from semesterkalender import BERUFSPRAXIS, FREI, PRUEFUNG, VORLESUNG, Semesterkalender
+
+KALENDER = [
+    "Vorlesungszeit;16.03.2026;03.07.2026;Sommersemester 2026",
+    "Prüfung;06.07.2026;17.07.2026;Prüfungszeitraum",
+    "Berufspraxis;20.07.2026;25.09.2026;Praxisphase",
+]
+
+d = datetime.date
+
+
+def test_arten_im_zeitraum():
+    kalender = Semesterkalender.parse(KALENDER)
+    assert kalender.arten_im_zeitraum(d(2026, 3, 17)) == {VORLESUNG}
+    assert kalender.arten_im_zeitraum(d(2026, 7, 2), d(2026, 7, 7)) == {VORLESUNG, FREI, PRUEFUNG}
+    assert kalender.arten_im_zeitraum(d(2026, 9, 21), d(2026, 9, 25)) == {BERUFSPRAXIS}
+
+
+def test_umfasst():
+    kalender = Semesterkalender.parse(KALENDER)
+    assert kalender.umfasst(d(2026, 3, 16))
+    assert kalender.umfasst(d(2026, 3, 16), d(2026, 9, 25))
+    assert not kalender.umfasst(d(2026, 3, 13))
+    assert not kalender.umfasst(d(2026, 9, 21), d(2026, 9, 28))
+    assert not kalender.umfasst(d(2026, 10, 5))
+    assert not Semesterkalender().umfasst(d(2026, 5, 4))
+
+
+def test_renderer_leaves_uncovered_dates_unknown(tmp_path):
+    path = tmp_path / "Semesterkalender.txt"
+    path.write_text("\n".join(KALENDER), encoding="utf-8")
+    renderer = Renderer(body_path=str(tmp_path / "fehlt.txt"), subject_path=str(tmp_path / "fehlt.txt"),
+                        empfaenger_path=str(tmp_path / "fehlt.txt"), studiengang="", kalender_path=str(path))
+
+    report = {"datum": "08.07.2026", "pruefungstag": False}
+    assert renderer.tagesarten(report) == [PRUEFUNG]
+    assert report["pruefungstag"] is True
+
+    # Nach dem letzten Eintrag weiß der Kalender nichts: kein "frei", Prüfungstag bleibt wie angegeben
+    report = {"datum": "05.10.2026", "pruefungstag": True}
+    assert renderer.tagesarten(report) is None
+    assert report["pruefungstag"] is True
+
+
+def test_example_calendar_parses():
+    path = os.path.join(os.path.dirname(__file__), os.pardir, "Semesterkalender.example.txt")
+    with open(path, encoding="utf-8") as f:
+        assert Semesterkalender.parse(f).eintraege
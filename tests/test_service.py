@@ -0,0 +1,30 @@
+"""Meldungen aus JSON im Dienst (service.py)."""
+import pytest
+
+from service import HttpError, parse_report
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False),
+    ("ja", True), ("X", True), ("1", True), ("true", True), (" Wahr ", True),
+    ("nein", False), ("0", False), ("false", False), ("", False),
+])
+def test_flags_are_parsed_like_batch_columns(value, expected):
+    report, _tokens, _ableiten = parse_report({"attest": value, "pruefungstag": value})
+    assert report["attest"] is expected
+    assert report["pruefungstag"] is expected
+
+
+@pytest.mark.parametrize("value", [0, 1, None, [], {}])
+def test_other_flag_types_are_rejected(value):
+    with pytest.raises(HttpError) as e:
+        parse_report({"eau": value})
+    assert e.value.status == 400
+
+
+def test_text_fields_and_recipients():
+    report, tokens, ableiten = parse_report({"vorname": "Ada", "matrikelnummer": 123,
+                                             "empfaenger": "a@example.org, , ZPD"}, "Informatik")
+    assert report == {"studiengang": "Informatik", "vorname": "Ada", "matrikelnummer": "123"}
+    assert tokens == ["a@example.org", "ZPD"]
+    assert ableiten
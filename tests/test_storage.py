@@ -0,0 +1,34 @@
+"""Summentabellen in storage.py."""
+import pytest
+
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / "daten.db"))
+    yield storage
+    storage.close()
+
+
+@pytest.mark.parametrize("datum_gesund, tage", [
+    ("", 1),             # ohne letzten Krankheitstag zählt der erste Tag
+    ("02.03.2026", 1),   # Montag bis Montag
+    ("03.03.2026", 2),   # Montag bis Dienstag
+    ("04.03.2026", 3),   # Montag bis Mittwoch
+])
+def test_sick_days_count_last_day_inclusive(storage, datum_gesund, tage):
+    storage.add_report({"matrikelnummer": "1234567", "datum": "02.03.2026", "datum_gesund": datum_gesund,
+                        "art": "Krankmeldung"})
+    (summe,) = storage.student_summary("1234567")
+    assert summe["tage"] == tage
+
+
+def test_rebuild_matches_incremental_days(storage):
+    for datum_gesund in ("", "02.03.2026", "03.03.2026", "04.03.2026"):
+        storage.add_report({"matrikelnummer": "1234567", "datum": "02.03.2026", "datum_gesund": datum_gesund,
+                            "art": "Krankmeldung"})
+    vorher = storage.student_summary("1234567")
+    storage.rebuild_summaries()
+    assert storage.student_summary("1234567") == vorher
+    assert vorher[0]["tage"] == 1 + 1 + 2 + 3
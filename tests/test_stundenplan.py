@@ -0,0 +1,77 @@
+"""A-/B-Wochen und Modulzuordnung in stundenplan.py."""
+import datetime
+
+from empfaenger import Recipient, RecipientDirectory
+from stundenplan import AhoCorasick, Stundenplan, tage_im_zeitraum, wochentyp
+
+
+def test_week_type_alternates_across_53_week_new_year():
+    # 2026 hat 53 ISO-Wochen: KW 53 (28.12.) und KW 1 (04.01.) sind beide ungerade
+    montage = [datetime.date(2026, 12, 21) + datetime.timedelta(weeks=n) for n in range(4)]
+    typen = [wochentyp(tag) for tag in montage]
+    assert typen in (["A", "B", "A", "B"], ["B", "A", "B", "A"])
+    assert wochentyp(datetime.date(2026, 12, 28)) != wochentyp(datetime.date(2027, 1, 4))
+
+
+def test_week_type_is_constant_within_a_week():
+    montag = datetime.date(2026, 12, 28)
+    assert {wochentyp(montag + datetime.timedelta(days=n)) for n in range(7)} == {wochentyp(montag)}
+
+
+def test_period_over_new_year_contains_both_week_types():
+    tage = tage_im_zeitraum(datetime.date(2026, 12, 28), datetime.date(2027, 1, 8))
+    assert {(0, "A"), (0, "B")} <= tage
+
+
+def test_matcher_finds_overlapping_and_suffix_patterns():
+    matcher = AhoCorasick([("informatik", "kurz"), ("grundlagen informatik", "lang"),
+                           ("grundlagen", "anfang"), ("matik", "ende"), ("nicht da", "nie")])
+    assert matcher.find("grundlagen informatik 2") == {"kurz", "lang", "anfang", "ende"}
+    assert matcher.find("wirtschaftsinformatik") == {"kurz", "ende"}
+    assert matcher.find("grundlagen e-government") == {"anfang"}
+    assert matcher.find("") == set()
+
+
+def test_matcher_with_shared_prefixes_and_repeated_patterns():
+    matcher = AhoCorasick([("aab", 1), ("ab", 2), ("b", 3), ("aab", 4), ("", 5)])
+    assert matcher.find("aaab") == {1, 2, 3, 4}
+    assert matcher.find("aa") == set()
+
+
+def test_comma_separated_modules_are_split():
+    plan = Stundenplan.parse(["Montag;Projektmanagement, Grundlagen Informatik,,",
+                              "montag;Recht;B", "Dienstag;", "Irgendwann;Mathe"])
+    assert plan.modules_on(0) == ["Projektmanagement", "Grundlagen Informatik"]
+    assert plan.modules_on(0, "B") == ["Projektmanagement", "Grundlagen Informatik", "Recht"]
+    assert plan.modules_on(1) == []
+
+
+def _naive_index(plan, directory):
+    # frühere Zuordnung: jedes Modul des Tages als Teilstring im Modulnamen suchen
+    index = {}
+    for item in directory:
+        for key, module in plan.by_weekday.items():
+            if item.modul and any(modul.lower() in item.modul.lower() for modul in module):
+                index.setdefault(key, []).append(item.id)
+    return index
+
+
+def test_index_directory_matches_substring_loop():
+    plan = Stundenplan.parse([
+        "Montag;Projektmanagement,Sozialwissenschaftliche Schlüsselkompetenzen,Grundlagen Informatik",
+        "Dienstag;Grundlagen E-Government (E-Gov1),Allgemeines Verwaltungsrecht (AVR1),Grundlagen Informatik",
+        "Mittwoch;Informatik;A",
+        "Donnerstag;Recht,Verwaltungsrecht;B",
+    ])
+    directory = RecipientDirectory([
+        Recipient("Frau A", "Grundlagen Informatik", "a@h.de"),
+        Recipient("Herr B", "Wirtschaftsinformatik", "b@h.de"),
+        Recipient("Frau C", "Allgemeines Verwaltungsrecht (AVR1)", "c@h.de"),
+        Recipient("Herr D", "PROJEKTMANAGEMENT", "d@h.de"),
+        Recipient("Frau E", "Mathematik", "e@h.de"),
+        Recipient("Herr F", "", "f@h.de"),
+        Recipient("Frau A", "Grundlagen E-Government (E-Gov1) und Grundlagen Informatik", "a@h.de"),
+    ])
+    index = plan.index_directory(directory)
+    assert index == _naive_index(plan, directory)
+    assert index[(2, "A")] == [directory.items[0].id, directory.items[1].id, directory.items[6].id]
@@ -0,0 +1,70 @@
+"""Kompilierte Vorlagen (template_engine.py) gegen das frühere render_template."""
+import pytest
+
+from template_engine import compile_template, render_template
+
+
+def baseline(template, context):
+    """render_template vor der Kompilierung: str.format, sonst bekannte {schluessel} ersetzen."""
+    try:
+        return template.format(**context)
+    except Exception:
+        t = template
+        for k, v in context.items():
+            t = t.replace("{" + k + "}", str(v))
+        return t
+
+
+CONTEXT = {"vorname": "Ada", "nachname": "Lovelace", "anzahl": 3, "breite": 8, "liste": ["x", "y"]}
+
+
+@pytest.mark.parametrize("template", [
+    # einfache Felder
+    "Hallo {vorname} {nachname},",
+    "",
+    "ohne Platzhalter",
+    "{anzahl} Tage",
+    # fehlende Schlüssel: Ersatz-Modus, Unbekanntes bleibt stehen
+    "Hallo {vorname} {unbekannt}",
+    "{unbekannt}",
+    "{anzahl:>4} und {fehlt}",
+    # Klammern als Text
+    "{{vorname}} heißt {vorname}",
+    "{{nicht ersetzt}}",
+    "{{vorname}} {fehlt}",
+    "einzelne } Klammer {vorname}",
+    "offene { Klammer {vorname}",
+    "{}",
+    "{0} {vorname}",
+    # Umwandlungen und Formatangaben
+    "{vorname!r} {nachname!s} {vorname!a}",
+    "{anzahl:03d}|{vorname:>6}|{nachname:.3}",
+    "{vorname!r:>10}",
+    "{vorname!x}",
+    "{anzahl:d} {vorname:d}",
+    # Indizes, Attribute, verschachtelte Angaben
+    "{liste[0]} und {liste[1]}",
+    "{liste[5]}",
+    "{anzahl.real}",
+    "{vorname:>{breite}}|",
+    "{vorname:>{fehlt}} {nachname}",
+])
+def test_matches_baseline(template):
+    assert render_template(template, CONTEXT) == baseline(template, CONTEXT)
+
+
+def test_compiled_template_is_reused():
+    template = compile_template("Hallo {vorname}")
+    assert template is compile_template("Hallo {vorname}")
+    assert render_template(template, CONTEXT) == "Hallo Ada"
+    assert render_template(template, {}) == "Hallo {vorname}"
+
+
+@pytest.mark.parametrize("template, names", [
+    ("{vorname} {nachname!r:>5}", {"vorname", "nachname"}),
+    ("{liste[0]} {anzahl.real}", {"liste", "anzahl"}),
+    ("{vorname:>{breite}}", {"vorname", "breite"}),
+    ("{vorname} {kaputt", {"vorname"}),
+])
+def test_placeholders(template, names):
+    assert compile_template(template).placeholders == names
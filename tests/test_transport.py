@@ -0,0 +1,102 @@
+"""SmtpTransport gegen einen kleinen SMTP-Ersatzserver auf localhost."""
+import socket
+import threading
+
+import pytest
+
+from transport import SmtpTransport
+
+
+class StubSmtpServer:
+    """Minimaler SMTP-Server: nimmt alles an, lehnt Adressen mit ``bad`` am Anfang mit 550 ab."""
+
+    def __init__(self, pipelining=True):
+        self.pipelining = pipelining
+        self.connections = 0
+        self.commands = []
+        self.messages = []
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen()
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn, conn.makefile("rb") as rfile:
+            def reply(text):
+                conn.sendall(text.encode("ascii") + b"\r\n")
+
+            reply("220 stub ESMTP")
+            for raw in rfile:
+                line = raw.decode("ascii").rstrip("\r\n")
+                verb = line.split(" ", 1)[0].upper()
+                self.commands.append(verb)
+                if verb == "EHLO":
+                    reply("250-stub\r\n250-PIPELINING\r\n250 8BITMIME" if self.pipelining else "250 stub")
+                elif verb == "RCPT":
+                    reply("550 unbekannt" if line[len("RCPT TO:<"):].startswith("bad") else "250 ok")
+                elif verb == "DATA":
+                    reply("354 weiter")
+                    data = []
+                    for data_line in rfile:
+                        if data_line == b".\r\n":
+                            break
+                        data.append(data_line)
+                    self.messages.append(data)
+                    reply("250 angenommen")
+                elif verb == "QUIT":
+                    reply("221 bye")
+                    return
+                else:
+                    reply("250 ok")
+
+    def close(self):
+        self._sock.close()
+
+
+@pytest.fixture(params=[True, False], ids=["pipelining", "ohne-pipelining"])
+def server(request):
+    stub = StubSmtpServer(pipelining=request.param)
+    yield stub
+    stub.close()
+
+
+def _message(to, subject="Krankmeldung"):
+    return {"to": to, "cc": [], "subject": subject, "body": "Zeile 1\nZeile 2\n", "sender": "ich@example.org"}
+
+
+def test_connection_is_reused_after_noop_check(server):
+    with SmtpTransport("127.0.0.1", server.port, starttls=False, pool_size=1) as transport:
+        assert transport.send(_message(["a@example.org"])) == {}
+        assert transport.send(_message(["b@example.org"], "Zweite")) == {}
+    assert server.connections == 1
+    assert len(server.messages) == 2
+    # Vor der zweiten Nachricht wird die wiederverwendete Verbindung mit NOOP geprüft
+    second_mail = [i for i, verb in enumerate(server.commands) if verb == "MAIL"][1]
+    assert "NOOP" in server.commands[:second_mail]
+
+
+def test_partial_refusal_returns_refused_recipients(server):
+    with SmtpTransport("127.0.0.1", server.port, starttls=False) as transport:
+        refused = transport.send(_message(["a@example.org", "bad@example.org"]))
+    assert list(refused) == ["bad@example.org"]
+    assert refused["bad@example.org"][0] == 550
+    assert len(server.messages) == 1
+
+
+def test_message_uses_crlf_line_endings(server):
+    with SmtpTransport("127.0.0.1", server.port, starttls=False) as transport:
+        transport.send(_message(["a@example.org"]))
+    lines = server.messages[0]
+    assert lines
+    assert all(line.endswith(b"\r\n") and b"\n" not in line[:-2] for line in lines)
+
@@ -0,0 +1,153 @@
+"""Tk-Textfelder auf einen neuen Inhalt bringen, ohne sie komplett zu löschen und neu zu füllen.
+
+``diff_ops`` vergleicht alten und neuen Text (erst zeilenweise, geänderte Einzelzeilen dann
+zeichenweise) und liefert nur die geänderten Bereiche. ``TextSync`` wendet sie auf ein Widget
+an: Unveränderte Teile bleiben stehen, Scrollposition und Cursor springen nicht, und bei
+gleichem Inhalt wird gar nicht geschrieben. Der Aufwand hängt an der Größe der Änderung,
+nicht an der Länge der Nachricht.
+
+Mit ``keep_edits=True`` bleiben Änderungen, die der Nutzer selbst im Feld gemacht hat, erhalten:
+Neu gerenderte Teile werden nur dort eingesetzt, wo sie seine Änderungen nicht berühren;
+leert der Nutzer das Feld, gilt wieder der gerenderte Text.
+"""
+import bisect
+from difflib import SequenceMatcher
+
+
+def _lines(text):
+    """Zeilen mit Zeilenende – nur ``\n`` trennt, wie im Tk-Text-Widget."""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def _common_affixes(a, b):
+    """Länge des gemeinsamen Anfangs und Endes zweier Sequenzen (ohne Überlappung)."""
+    n = min(len(a), len(b))
+    prefix = 0
+    while prefix < n and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def _char_op(old, new, offset):
+    prefix, suffix = _common_affixes(old, new)
+    return offset + prefix, offset + len(old) - suffix, new[prefix:len(new) - suffix]
+
+
+def diff_ops(old, new):
+    """Änderungen von ``old`` nach ``new`` als aufsteigende Liste ``(von, bis, ersatz)`` (Zeichen in ``old``)."""
+    if old == new:
+        return []
+    old_lines = _lines(old)
+    new_lines = _lines(new)
+    # Gemeinsamer Anfang und Ende vorab: der teure Zeilenvergleich sieht nur den geänderten Mittelteil
+    prefix, suffix = _common_affixes(old_lines, new_lines)
+    a = old_lines[prefix:len(old_lines) - suffix]
+    b = new_lines[prefix:len(new_lines) - suffix]
+    offset = sum(map(len, old_lines[:prefix]))
+    if len(a) <= 1 and len(b) <= 1:
+        return [_char_op("".join(a), "".join(b), offset)]
+
+    starts = [offset]
+    for line in a:
+        starts.append(starts[-1] + len(line))
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            # Zeile gegen Zeile (z. B. ein geänderter Name): nur die geänderten Zeichen ersetzen
+            for k in range(i2 - i1):
+                if a[i1 + k] != b[j1 + k]:
+                    ops.append(_char_op(a[i1 + k], b[j1 + k], starts[i1 + k]))
+        else:
+            ops.append((starts[i1], starts[i2], "".join(b[j1:j2])))
+    return ops
+
+
+def rebase_ops(ops, edits):
+    """Verschiebt ``ops`` (auf dem alten Stand) hinter die Nutzeränderungen ``edits`` (auf demselben Stand).
+
+    Ops, die eine Nutzeränderung überlappen oder berühren, fallen weg – dort gilt der Text des Nutzers.
+    """
+    result = []
+    for start, end, text in ops:
+        shift = 0
+        conflict = False
+        for e_start, e_end, e_text in edits:
+            if e_end < start:
+                shift += len(e_text) - (e_end - e_start)
+            else:
+                conflict = e_start <= end
+                break
+        if not conflict:
+            result.append((start + shift, end + shift, text))
+    return result
+
+
+class TextSync:
+    """Hält ein Text-Widget auf dem zuletzt gerenderten Stand, mit minimalen Schreibzugriffen."""
+
+    def __init__(self, widget, keep_edits=False):
+        self.widget = widget
+        self.keep_edits = keep_edits
+        self.rendered = None  # zuletzt von hier geschriebener Text
+
+    def get(self):
+        return self.widget.get("1.0", "end-1c")
+
+    @property
+    def edited(self):
+        """True, wenn der Nutzer den zuletzt gerenderten Text im Feld verändert hat."""
+        return self.rendered is not None and self.get() != self.rendered
+
+    def reset(self):
+        """Nutzeränderungen verwerfen: beim nächsten ``update`` wird der gerenderte Text übernommen."""
+        self.rendered = None
+
+    def update(self, text):
+        """Bringt das Widget auf ``text``; liefert True, wenn tatsächlich geschrieben wurde."""
+        current = self.get()
+        # Ein vom Nutzer geleertes Feld gilt als Zurücksetzen auf den gerenderten Text
+        if self.keep_edits and self.rendered is not None and current != self.rendered and current.strip():
+            ops = rebase_ops(diff_ops(self.rendered, text), diff_ops(self.rendered, current))
+        else:
+            ops = diff_ops(current, text)
+        self.rendered = text
+        if not ops:
+            return False
+        self._apply(current, ops)
+        return True
+
+    def _apply(self, current, ops):
+        widget = self.widget
+        # Zeichenposition -> Tk-Index "Zeile.Spalte"
+        line_starts = [0]
+        for line in _lines(current):
+            if line.endswith("\n"):
+                line_starts.append(line_starts[-1] + len(line))
+
+        def index(offset):
+            line = bisect.bisect_right(line_starts, offset) - 1
+            return f"{line + 1}.{offset - line_starts[line]}"
+
+        disabled = str(widget.cget("state")) == "disabled"
+        if disabled:
+            widget.configure(state="normal")
+        try:
+            # Von hinten nach vorn: frühere Positionen bleiben dabei gültig
+            for start, end, text in reversed(ops):
+                if end > start:
+                    widget.delete(index(start), index(end))
+                if text:
+                    widget.insert(index(start), text)
+        finally:
+            if disabled:
+                widget.configure(state="disabled")
@@ -0,0 +1,338 @@
+"""Versandwege für fertige Nachrichten: Outlook (Windows) und SMTP mit wiederverwendeten Verbindungen.
+
+Eine Nachricht ist ein dict wie von ``meldung.prepare_message``: ``to``, ``cc`` (Listen),
+``subject``, ``body`` und optional ``sender`` sowie ``attachments`` (Dateipfade).
+
+Welcher Weg benutzt wird, steuert ``KRANKOMAT_TRANSPORT`` (``outlook``, ``smtp`` oder ``recording``).
+``recording`` verschickt nichts und ist der lokale Ersatz für Tests und Probeläufe; mit
+``KRANKOMAT_RECORD_DIR`` legt er jede Nachricht als .eml-Datei ab.
+SMTP wird über ``KRANKOMAT_SMTP_HOST``, ``_PORT``, ``_USER``, ``_PASSWORD``, ``_STARTTLS``
+(1/0), ``_SSL`` (1/0) und ``_FROM`` eingestellt.
+"""
+import mimetypes
+import os
+import queue
+import smtplib
+import ssl
+import threading
+from email import policy
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from instrumentation import timed
+
+
+class MailTransport:
+    """Schnittstelle aller Versandwege."""
+
+    # Kann der Weg Entwürfe anlegen, die der Nutzer vor dem Abschicken noch bearbeitet?
+    supports_drafts = False
+
+    def send(self, message, send_now=True):
+        raise NotImplementedError
+
+    def send_many(self, messages):
+        for message in messages:
+            self.send(message)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class OutlookTransport(MailTransport):
+    """Legt Nachrichten über das lokale Outlook an (nur Windows, braucht pywin32)."""
+
+    supports_drafts = True
+
+    def __init__(self):
+        self._outlook = None
+        self._accounts = None
+
+    def _app(self):
+        # Outlook nur einmal pro Sitzung ansprechen
+        if self._outlook is None:
+            if threading.current_thread() is not threading.main_thread():
+                # COM muss in jedem Thread eigens initialisiert werden (Postausgang, siehe outbox.py)
+                import pythoncom
+                pythoncom.CoInitialize()
+            import win32com.client as win32
+            self._outlook = win32.Dispatch('outlook.application')
+        return self._outlook
+
+    def _account(self, sender_email):
+        if self._accounts is None:
+            self._accounts = {account.SmtpAddress.lower(): account for account in self._app().Session.Accounts}
+        return self._accounts.get(sender_email.lower())
+
+    @timed("outlook_send")
+    def send(self, message, send_now=True):
+        outlook = self._app()
+        mail = outlook.CreateItem(0)
+        to_addresses = message.get("to") or []
+        mail.To = ";".join(to_addresses) if isinstance(to_addresses, (list, tuple)) else to_addresses or ""
+        mail.CC = ";".join(message.get("cc") or [])
+        mail.Subject = message.get("subject", "")
+        mail.Body = message.get("body", "")
+        for path in message.get("attachments") or ():
+            mail.Attachments.Add(os.path.abspath(path))
+        sender_email = message.get("sender")
+        if sender_email:
+            account = self._account(sender_email)
+            if account is not None:
+                mail._oleobj_.Invoke(*(64209, 0, 8, 0, account))
+        if send_now:
+            mail.Send()
+        else:
+            mail.Save()
+            mail.Display()
+
+
+def build_email(message, default_sender=None):
+    """Baut eine RFC-5322-Nachricht aus einem Nachrichten-dict."""
+    msg = EmailMessage()
+    sender = message.get("sender") or default_sender
+    if sender:
+        msg["From"] = sender
+    if message.get("to"):
+        msg["To"] = ", ".join(message["to"])
+    if message.get("cc"):
+        msg["Cc"] = ", ".join(message["cc"])
+    msg["Subject"] = message.get("subject", "")
+    msg["Date"] = message.get("date") or formatdate(localtime=True)
+    msg["Message-ID"] = message.get("message_id") or make_msgid(domain="krankomat.local")
+    # quoted-printable hält den Text 7-bit-sauber, der Server braucht dann kein 8BITMIME
+    msg.set_content(message.get("body", ""), cte="quoted-printable")
+    for path in message.get("attachments") or ():
+        ctype, encoding = mimetypes.guess_type(path)
+        if ctype is None or encoding is not None:
+            ctype = "application/octet-stream"
+        maintype, subtype = ctype.split("/", 1)
+        with open(path, "rb") as f:
+            msg.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=os.path.basename(path))
+    return msg
+
+
+class SmtpTransport(MailTransport):
+    """Versand per SMTP über einen kleinen Pool angemeldeter Verbindungen.
+
+    Verbindungen werden über viele Nachrichten hinweg wiederverwendet. Unterstützt der Server
+    PIPELINING, gehen MAIL FROM und alle RCPT TO einer Nachricht in einem einzigen Schreibvorgang raus.
+    """
+
+    def __init__(self, host, port=587, user=None, password=None, starttls=True, use_ssl=False,
+                 sender=None, pool_size=2, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.sender = sender or user
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        conn.ehlo()
+        if self.starttls and not self.use_ssl and conn.has_extn("starttls"):
+            conn.starttls(context=ssl.create_default_context())
+            conn.ehlo()
+        if self.user:
+            conn.login(self.user, self.password or "")
+        return conn
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        # Wiederverwendete Verbindung kurz prüfen; der Server kann sie inzwischen geschlossen haben
+        try:
+            if conn.noop()[0] == 250:
+                return conn
+        except smtplib.SMTPException:
+            pass
+        except OSError:
+            pass
+        self._quietly_close(conn)
+        return self._connect()
+
+    def _release(self, conn, broken=False):
+        try:
+            if broken:
+                self._quietly_close(conn)
+            else:
+                try:
+                    self._pool.put_nowait(conn)
+                except queue.Full:
+                    self._quietly_close(conn)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _quietly_close(conn):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    @timed("smtp_send")
+    def send(self, message, send_now=True):
+        """Verschickt eine Nachricht; liefert abgelehnte Empfänger als dict (wie ``sendmail``)."""
+        conn = self._acquire()
+        try:
+            refused = self._send_on(conn, message)
+        except smtplib.SMTPRecipientsRefused:
+            self._release(conn)
+            raise
+        except (smtplib.SMTPException, OSError):
+            self._release(conn, broken=True)
+            raise
+        self._release(conn)
+        return refused
+
+    @timed("smtp_send_many")
+    def send_many(self, messages):
+        """Verschickt viele Nachrichten über dieselbe Verbindung."""
+        conn = self._acquire()
+        broken = False
+        try:
+            return [self._send_on(conn, message) for message in messages]
+        except (smtplib.SMTPException, OSError) as e:
+            broken = not isinstance(e, smtplib.SMTPRecipientsRefused)
+            raise
+        finally:
+            self._release(conn, broken=broken)
+
+    def _send_on(self, conn, message):
+        msg = build_email(message, default_sender=self.sender)
+        sender = message.get("sender") or self.sender or ""
+        recipients = list(message.get("to") or []) + list(message.get("cc") or [])
+        if not recipients:
+            raise smtplib.SMTPRecipientsRefused({})
+        # Auf der Leitung CRLF als Zeilenende (RFC 5321); smtplib korrigiert bytes nicht selbst
+        payload = msg.as_bytes(policy=policy.SMTP)
+        if not conn.has_extn("pipelining"):
+            return conn.sendmail(sender, recipients, payload)
+
+        # PIPELINING (RFC 2920): Umschlag in einem Rutsch senden, Antworten danach der Reihe nach lesen
+        commands = [f"MAIL FROM:<{sender}>"] + [f"RCPT TO:<{rcpt}>" for rcpt in recipients]
+        conn.send("".join(cmd + "\r\n" for cmd in commands))
+        code, resp = conn.getreply()
+        rcpt_replies = [conn.getreply() for _ in recipients]
+        if code != 250:
+            conn.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, sender)
+        refused = {rcpt: reply for rcpt, reply in zip(recipients, rcpt_replies) if reply[0] not in (250, 251)}
+        if len(refused) == len(recipients):
+            conn.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, resp = conn.data(payload)
+        if code != 250:
+            conn.rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            self._quietly_close(conn)
+
+
+class RecordingTransport(MailTransport):
+    """Verschickt nichts, sondern merkt sich jede Nachricht – für Tests und Probeläufe.
+
+    ``fail`` lässt die nächsten so vielen Versuche mit ``error`` scheitern; mit ``directory``
+    wird jede Nachricht zusätzlich als .eml-Datei abgelegt.
+    """
+
+    supports_drafts = True
+
+    def __init__(self, directory=None, fail=0, error=None):
+        self.directory = directory
+        self.fail = fail
+        self.error = error
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, message, send_now=True):
+        with self._lock:
+            if self.fail > 0:
+                self.fail -= 1
+                raise self.error or smtplib.SMTPServerDisconnected("Versuch absichtlich gescheitert")
+            self.sent.append((dict(message), send_now))
+            number = len(self.sent)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{number:05d}.eml"), "wb") as f:
+                f.write(build_email(message).as_bytes())
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "ja", "true", "yes")
+
+
+def smtp_transport_from_env():
+    host = os.environ.get("KRANKOMAT_SMTP_HOST")
+    if not host:
+        raise RuntimeError("KRANKOMAT_SMTP_HOST ist nicht gesetzt.")
+    use_ssl = _env_flag("KRANKOMAT_SMTP_SSL", False)
+    return SmtpTransport(
+        host,
+        port=int(os.environ.get("KRANKOMAT_SMTP_PORT", "465" if use_ssl else "587")),
+        user=os.environ.get("KRANKOMAT_SMTP_USER"),
+        password=os.environ.get("KRANKOMAT_SMTP_PASSWORD"),
+        starttls=_env_flag("KRANKOMAT_SMTP_STARTTLS", True),
+        use_ssl=use_ssl,
+        sender=os.environ.get("KRANKOMAT_SMTP_FROM"),
+    )
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def transport_name(name=None):
+    """Name des Versandwegs; ohne Angabe aus KRANKOMAT_TRANSPORT (Standard: outlook)."""
+    return (name or os.environ.get("KRANKOMAT_TRANSPORT") or "outlook").lower()
+
+
+def new_transport(name=None):
+    """Legt einen neuen Versandweg an – z. B. für einen eigenen Thread, der ihn allein benutzt."""
+    name = transport_name(name)
+    if name == "outlook":
+        return OutlookTransport()
+    if name == "smtp":
+        return smtp_transport_from_env()
+    if name == "recording":
+        return RecordingTransport(os.environ.get("KRANKOMAT_RECORD_DIR"))
+    raise ValueError(f"Unbekannter Versandweg: {name}")
+
+
+def get_transport(name=None):
+    """Liefert den (pro Prozess einmal angelegten) Versandweg; Standard aus KRANKOMAT_TRANSPORT."""
+    name = transport_name(name)
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            transport = _transports[name] = new_transport(name)
+        return transport
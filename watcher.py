@@ -0,0 +1,186 @@
+"""Beobachtet Konfigurations- und Vorlagendateien in einem Hintergrund-Thread.
+
+Unter Linux über inotify (per ctypes, ohne Zusatzpaket), sonst durch Abfragen von
+Änderungszeit und Größe im Sekundentakt. Geänderte Pfade landen in einer Queue, die die GUI
+mit ``after()`` im Tk-Thread abholt – der Hintergrund-Thread fasst keine Widgets an.
+
+Eine Meldung gibt es nur, wenn sich ``file_stamp`` (mtime, Größe) tatsächlich geändert hat;
+mehrere Ereignisse eines Speichervorgangs ergeben so eine einzige Meldung.
+"""
+import os
+import queue
+import select
+import struct
+import threading
+
+from template_engine import file_stamp
+
+POLL_INTERVAL_S = 1.0
+# So lange nach dem letzten inotify-Ereignis warten, bis ein Speichervorgang als fertig gilt
+SETTLE_S = 0.1
+
+# inotify-Masken (linux/inotify.h)
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Dünne Hülle um inotify_init1/inotify_add_watch aus der libc."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self._ctypes = ctypes
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self._dirs = {}  # wd -> Ordner
+
+    def add_dir(self, directory):
+        if directory in self._dirs.values():
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._ctypes.get_errno(), f"inotify_add_watch fehlgeschlagen: {directory}")
+        self._dirs[wd] = directory
+
+    def read_paths(self):
+        """Alle anstehenden Ereignisse lesen; liefert die betroffenen Pfade."""
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return paths
+            if not data:
+                return paths
+            offset = 0
+            while offset < len(data):
+                wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                directory = self._dirs.get(wd)
+                if directory is not None and name:
+                    paths.add(os.path.join(directory, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Meldet geänderte Dateien über ``changes()``; ``watch`` und ``unwatch`` gehen jederzeit."""
+
+    def __init__(self, paths=(), interval=POLL_INTERVAL_S, use_inotify=True):
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self.backend = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._watched = {}  # absoluter Pfad -> (Pfad wie übergeben, letzter Stempel)
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        for path in paths:
+            self.watch(path)
+
+    def watch(self, path):
+        full = os.path.abspath(path)
+        with self._lock:
+            if full in self._watched:
+                return
+            self._watched[full] = (path, file_stamp(path))
+        if self._inotify is not None:
+            try:
+                self._inotify.add_dir(os.path.dirname(full))
+            except OSError as e:
+                print("Dateiüberwachung:", e)
+
+    def unwatch(self, path):
+        with self._lock:
+            self._watched.pop(os.path.abspath(path), None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.use_inotify and os.path.exists("/proc/sys/fs/inotify"):
+            try:
+                self._inotify = _Inotify()
+                for full in list(self._watched):
+                    self._inotify.add_dir(os.path.dirname(full))
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                print("inotify nicht verfügbar, Dateien werden abgefragt:", e)
+                self._close_inotify()
+        if self._inotify is None:
+            self.backend = "polling"
+        self._thread = threading.Thread(target=self._run, name="krankomat-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * self.interval)
+            self._thread = None
+        self._close_inotify()
+
+    def _close_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def changes(self):
+        """Seit dem letzten Aufruf geänderte Pfade (wie bei ``watch`` übergeben), ohne Doppelte."""
+        paths = {}
+        while True:
+            try:
+                paths[self._queue.get_nowait()] = None
+            except queue.Empty:
+                return list(paths)
+
+    def _check(self, fulls):
+        with self._lock:
+            for full in fulls:
+                entry = self._watched.get(full)
+                if entry is None:
+                    continue
+                path, stamp = entry
+                current = file_stamp(path)
+                if current != stamp:
+                    self._watched[full] = (path, current)
+                    self._queue.put(path)
+
+    def _run(self):
+        if self._inotify is not None:
+            self._run_inotify()
+        else:
+            while not self._stop.wait(self.interval):
+                with self._lock:
+                    fulls = list(self._watched)
+                self._check(fulls)
+
+    def _run_inotify(self):
+        pending = set()
+        fd = self._inotify.fd
+        while not self._stop.is_set():
+            # Mit offenen Ereignissen kurz warten, bis der Speichervorgang abgeschlossen ist
+            timeout = SETTLE_S if pending else self.interval
+            try:
+                readable, _, _ = select.select([fd], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            if readable:
+                pending |= self._inotify.read_paths()
+            elif pending:
+                self._check(pending)
+                pending = set()